@@ -1,11 +1,17 @@
-from prompts import research_agent_prompt, compress_research_system_prompt, compress_research_human_message
+import re
+import time
+import asyncio
+from prompts import research_agent_prompt, research_digest_section, compress_research_system_prompt, compress_research_human_message, update_compression_prompt
 from pydantic import BaseModel, Field
-from typing_extensions import Literal
+from typing_extensions import Literal, Optional, Sequence, Union
 from state import ResearcherState, ResearcherOutputState
 from tools import tavily_search, think_tool
-from utils_agent import get_today_str
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage, filter_messages
-from langchain.chat_models import init_chat_model
+from utils_agent import get_today_str, estimate_tokens, digest_tool_output
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage, BaseMessage, filter_messages, get_buffer_string
+from models import get_model, get_model_with_tools
+from ledger import spend_cap_reached
+from blob_store import hydrate_messages, offload_message, store_note
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 
 # ===== CONFIGURATION =====
@@ -14,78 +20,365 @@ from langgraph.graph import StateGraph, START, END
 tools = [tavily_search, think_tool]
 tools_by_name = {tool.name: tool for tool in tools}
 
-# Initialize models
-model = init_chat_model(model="gemini-2.5-flash", model_provider="google-genai")
-model_with_tools = model.bind_tools(tools)
-# summarization_model = init_chat_model(model="gemini-2.5-flash-lite")
-compress_model = init_chat_model(model="gemini-2.5-flash", model_provider="google-genai", max_tokens=32000) 
+# Models are created on first use by the registry (roles "researcher" and "compressor")
+
+# Context management for the researcher loop: "full" resends the whole history on
+# every turn, "budgeted" folds older tool outputs into a digest once over budget
+researcher_context_mode = "budgeted"
+# Approximate prompt token budget before older tool outputs are folded
+researcher_context_token_budget = 12000
+# Number of most recent tool-calling turns that are always kept verbatim
+researcher_recent_turns = 2
+
+# Content left in a tool message whose output was folded into the digest
+folded_tool_output = "[Output condensed into the Research Digest in the system prompt.]"
+
+# Compression of the findings: "rolling" writes down the findings of every
+# tool_node step as it completes, and compress_research assembles them without
+# a model call (unless a step is still missing); "final" compresses the whole
+# history once at the end. A rolling update runs in the same step as the next
+# llm_call and the next tool_node waits for both, so rolling mode is slower
+# only when the compressor is slower than the researcher model
+researcher_compression_mode = "rolling"
+
+# Headings of the findings document assembled by rolling compression
+queries_heading = "**List of Queries and Tool Calls Made**"
+findings_heading = "**Fully Comprehensive Findings**"
+sources_heading = "**List of All Relevant Sources (with citations in the report)**"
+final_answer_heading = "**Researcher's Final Answer**"
+
+# Sources in search tool outputs (see utils_agent.format_search_output)
+search_output_source = re.compile(r"--- SOURCE \d+: (.*?) ---\nURL: (\S+)")
+
+# Default per-researcher budget. Override per run through config["configurable"]
+# with the keys researcher_max_searches, researcher_max_iterations, researcher_max_tokens
+# and researcher_max_seconds
+researcher_budget_defaults = {
+    "max_searches": 8,       # tavily_search calls
+    "max_iterations": 20,    # tool-calling turns, think_tool turns included
+    "max_tokens": 250_000,   # prompt + completion tokens of the researcher model
+    "max_seconds": 300,      # wall time since the researcher started
+}
+
+# Tools that count towards the search budget
+search_tool_names = {"tavily_search"}
+
+# Content of a tool message whose call was not run because the run hit a spend cap
+skipped_tool_output = "[Not run: the research run reached its spend cap.]"
+# Content of a tool message whose search was not run because the researcher's search budget is used up
+skipped_search_output = "[Not run: the researcher's search budget is used up. Answer with the findings so far.]"
+
+# ===== BUDGET CONTROL =====
+
+def get_researcher_budget(config: Optional[RunnableConfig]) -> dict:
+    """Resolve the researcher budget for this run from the run config."""
+    configurable = (config or {}).get("configurable", {})
+    return {
+        name: configurable.get(f"researcher_{name}", default)
+        for name, default in researcher_budget_defaults.items()
+    }
+
+def check_researcher_budget(state: ResearcherState, config: Optional[RunnableConfig]) -> Optional[str]:
+    """Return the reason the researcher must stop, or None while within budget.
+
+    Besides the researcher's own budget, a spend cap reached by the whole run
+    (see ledger.py) stops it with reason "run_<cap>".
+    """
+    run_cap = spend_cap_reached()
+    if run_cap:
+        return f"run_{run_cap}"
+    budget = get_researcher_budget(config)
+    tokens_used = state.get("prompt_tokens", 0) + state.get("completion_tokens", 0)
+    started_at = state.get("research_started_at")
+
+    if budget["max_searches"] is not None and state.get("search_count", 0) >= budget["max_searches"]:
+        return "max_searches"
+    if budget["max_iterations"] is not None and state.get("tool_call_iterations", 0) >= budget["max_iterations"]:
+        return "max_iterations"
+    if budget["max_tokens"] is not None and tokens_used >= budget["max_tokens"]:
+        return "max_tokens"
+    if budget["max_seconds"] is not None and started_at and time.time() - started_at >= budget["max_seconds"]:
+        return "max_seconds"
+    return None
+
+# ===== CONTEXT MANAGEMENT =====
+
+def build_researcher_context(messages: list[BaseMessage]) -> tuple[list[BaseMessage], str, int]:
+    """Fit the researcher history into the configured token budget.
+
+    While the history is within researcher_context_token_budget (or the mode is
+    "full") it is returned unchanged. Otherwise tool outputs older than the last
+    researcher_recent_turns tool-calling turns are replaced by a short
+    placeholder and condensed into a digest. Tool messages are kept, so every
+    tool call still has its response.
+
+    Args:
+        messages: Full researcher message history
+
+    Returns:
+        Tuple of the messages to send, the digest text and the estimated tokens saved
+    """
+    messages = list(messages)
+    tokens_before = sum(estimate_tokens(str(m.content)) for m in messages)
+    if researcher_context_mode != "budgeted" or tokens_before <= researcher_context_token_budget:
+        return messages, "", 0
+
+    # Keep the most recent tool-calling turns verbatim
+    turn_starts = [
+        i for i, m in enumerate(messages) if isinstance(m, AIMessage) and m.tool_calls
+    ]
+    if len(turn_starts) <= researcher_recent_turns:
+        return messages, "", 0
+    cutoff = turn_starts[-researcher_recent_turns] if researcher_recent_turns else len(messages)
+
+    context = []
+    digest_entries = []
+    for message in messages[:cutoff]:
+        if isinstance(message, ToolMessage):
+            digest_entries.append(digest_tool_output(message.name, str(message.content)))
+            message = message.model_copy(update={"content": folded_tool_output})
+        context.append(message)
+    context.extend(messages[cutoff:])
+
+    digest = "\n\n".join(digest_entries)
+    tokens_after = sum(estimate_tokens(str(m.content)) for m in context) + estimate_tokens(digest)
+    return context, digest, max(0, tokens_before - tokens_after)
+
+# ===== ROLLING COMPRESSION =====
+
+def compression_delta(messages: Sequence[BaseMessage]) -> list[BaseMessage]:
+    """Return the messages worth compressing, without think_tool calls and reflections."""
+    delta = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and message.name == "think_tool":
+            continue
+        if isinstance(message, AIMessage) and message.tool_calls:
+            tool_calls = [tool_call for tool_call in message.tool_calls if tool_call["name"] != "think_tool"]
+            if not tool_calls and not message.content:
+                continue
+            message = message.model_copy(update={"tool_calls": tool_calls})
+        delta.append(message)
+    return delta
+
+def describe_tool_calls(messages: Sequence[BaseMessage]) -> list[str]:
+    """Return one line per tool call of the messages, e.g. 'tavily_search: "ITC revenue"'."""
+    return [
+        f"{tool_call['name']}: " + ", ".join(f'"{value}"' if isinstance(value, str) else str(value) for value in tool_call["args"].values())
+        for message in messages if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+    ]
+
+def number_sources(messages: Sequence[BaseMessage], sources: dict[str, str]) -> tuple[dict[str, str], dict[str, int]]:
+    """Give the sources found in tool outputs citation numbers following the known ones.
+
+    Args:
+        messages: Messages whose tool outputs may name sources
+        sources: Known sources, mapping URLs to titles in citation order
+
+    Returns:
+        Tuple of all sources in citation order and the numbers of the sources
+        named in messages
+    """
+    sources = dict(sources)
+    cited = {}
+    for message in messages:
+        if not isinstance(message, ToolMessage):
+            continue
+        for title, url in search_output_source.findall(str(message.content)):
+            sources.setdefault(url, title)
+            cited[url] = list(sources).index(url) + 1
+    return sources, cited
+
+async def compress_delta(state: ResearcherState, delta: list[BaseMessage]) -> dict:
+    """Write down the findings of the delta messages and merge them into the rolling compression.
+
+    The compressor only sees the delta and writes only its findings; queries,
+    findings and numbered sources are merged here, so an update costs the same
+    however much was found before.
+
+    Returns:
+        State update with the merged rolling_queries, rolling_findings and rolling_sources
+    """
+    sources, cited = number_sources(delta, state.get("rolling_sources") or {})
+    prompt = update_compression_prompt.format(
+        date=get_today_str(),
+        research_topic=state.get("research_topic", ""),
+        new_messages=get_buffer_string(delta),
+        sources="\n".join(f"[{number}] {sources[url]}: {url}" for url, number in cited.items()) or "(none)",
+    )
+    response = await get_model("compressor").ainvoke([HumanMessage(content=prompt)])
+    findings = str(response.content).strip()
+    return {
+        "rolling_queries": (state.get("rolling_queries") or []) + describe_tool_calls(delta),
+        "rolling_findings": (state.get("rolling_findings") or []) + ([findings] if findings else []),
+        "rolling_sources": sources,
+    }
+
+def assemble_compression(rolling: dict, final_answer: Optional[str] = None) -> str:
+    """Assemble the findings document from the rolling queries, findings and sources."""
+    queries = "\n".join(f"- {query}" for query in rolling.get("rolling_queries") or []) or "- (none)"
+    findings = "\n\n".join(rolling.get("rolling_findings") or []) or "(none)"
+    sources = "\n".join(
+        f"[{number}] {title}: {url}"
+        for number, (url, title) in enumerate((rolling.get("rolling_sources") or {}).items(), 1)
+    )
+    document = f"{queries_heading}\n{queries}\n\n{findings_heading}\n{findings}\n\n{sources_heading}\n### Sources\n{sources}"
+    if final_answer:
+        document += f"\n\n{final_answer_heading}\n{final_answer}"
+    return document
 
 # ===== AGENT NODES =====
 
-def llm_call(state: ResearcherState):
+async def llm_call(state: ResearcherState):
     """Analyze current state and decide on next actions.
     
     The model analyzes the current conversation state and decides whether to:
     1. Call search tools to gather more information
     2. Provide a final answer based on gathered information
     
+    Tool outputs held in the blob store are hydrated first. Older tool outputs
+    are folded into a research digest when the history exceeds the context
+    budget (see build_researcher_context). Token usage of the response is
+    added to the researcher's budget counters.
+    
     Returns updated state with the model's response.
     """
+    context, digest, tokens_saved = build_researcher_context(hydrate_messages(state["researcher_messages"]))
+
+    system_prompt = research_agent_prompt
+    if digest:
+        system_prompt += research_digest_section.format(digest=digest)
+
+    response = await get_model_with_tools("researcher", tools).ainvoke(
+        [SystemMessage(content=system_prompt)] + context
+    )
+    usage = getattr(response, "usage_metadata", None) or {}
+
     return {
-        "researcher_messages": [
-            model_with_tools.invoke(
-                [SystemMessage(content=research_agent_prompt)] + state["researcher_messages"]
-            )
-        ]
+        "researcher_messages": [response],
+        "research_digest": digest,
+        "context_tokens_saved": [tokens_saved],
+        "research_started_at": state.get("research_started_at") or time.time(),
+        "prompt_tokens": state.get("prompt_tokens", 0) + usage.get("input_tokens", 0),
+        "completion_tokens": state.get("completion_tokens", 0) + usage.get("output_tokens", 0),
     }
 
-def tool_node(state: ResearcherState):
+async def tool_node(state: ResearcherState, config: RunnableConfig):
     """Execute all tool calls from the previous LLM response.
     
-    Executes all tool calls from the previous LLM responses.
-    Returns updated state with tool execution results.
+    Executes all tool calls from the previous LLM responses concurrently.
+    Returns updated state with tool execution results, in tool call order,
+    the updated iteration and search counters, and the reason to stop if the
+    researcher's budget is now exhausted. Search calls beyond the searches
+    left in the budget are answered without being run, so one turn cannot
+    overshoot max_searches. Once the run has reached a spend cap all calls
+    are answered without being run, and the researcher stops.
     """
     tool_calls = state["researcher_messages"][-1].tool_calls
- 
-    # Execute all tool calls
-    observations = []
-    for tool_call in tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observations.append(tool.invoke(tool_call["args"]))
+    max_searches = get_researcher_budget(config)["max_searches"]
+    searches_left = None if max_searches is None else max(0, max_searches - state.get("search_count", 0))
+
+    if spend_cap_reached():
+        # The run is over its spend cap: answer the calls without running them
+        observations = [skipped_tool_output] * len(tool_calls)
+    else:
+        # Searches beyond the budget are refused, in call order
+        allowed = []
+        for tool_call in tool_calls:
+            if tool_call["name"] in search_tool_names and searches_left is not None:
+                allowed.append(searches_left > 0)
+                searches_left = max(0, searches_left - 1)
+            else:
+                allowed.append(True)
+        # Execute the allowed tool calls concurrently (gather preserves the call order)
+        results = iter(await asyncio.gather(*(
+            tools_by_name[tool_call["name"]].ainvoke(tool_call["args"])
+            for tool_call, is_allowed in zip(tool_calls, allowed) if is_allowed
+        )))
+        observations = [next(results) if is_allowed else skipped_search_output for is_allowed in allowed]
             
-    # Create tool message outputs
+    # Create tool message outputs, keeping large outputs in the blob store
     tool_outputs = [
-        ToolMessage(
+        offload_message(ToolMessage(
             content=observation,
             name=tool_call["name"],
             tool_call_id=tool_call["id"]
-        ) for observation, tool_call in zip(observations, tool_calls)
+        )) for observation, tool_call in zip(observations, tool_calls)
     ]
+
+    counters = {
+        "tool_call_iterations": state.get("tool_call_iterations", 0) + 1,
+        "search_count": state.get("search_count", 0) + sum(
+            1 for tool_call, observation in zip(tool_calls, observations)
+            if tool_call["name"] in search_tool_names and observation not in (skipped_tool_output, skipped_search_output)
+        ),
+    }
+    stop_reason = check_researcher_budget({**state, **counters}, config)
     
-    return {"researcher_messages": tool_outputs}
+    return {
+        "researcher_messages": tool_outputs,
+        **counters,
+        **({"stop_reason": stop_reason} if stop_reason else {}),
+    }
+
+async def update_compression(state: ResearcherState) -> dict:
+    """Write down the findings of the research messages since the last update.
+
+    Runs after each tool_node step in the same step as the next llm_call. The
+    next tool_node waits for both, so a compressor slower than the researcher
+    model delays the research loop. If an update fails, its messages are left
+    for the next update (or for compress_research) to write down.
+    """
+    messages = state.get("researcher_messages", [])
+    start = state.get("compressed_message_count", 0)
+    try:
+        update = await compress_delta(state, compression_delta(hydrate_messages(messages[start:])))
+    except Exception as e:
+        print(f"Rolling compression update failed, retrying with the next update: {str(e)}")
+        return {}
 
-def compress_research(state: ResearcherState) -> dict:
+    return {**update, "compressed_message_count": len(messages)}
+
+async def compress_research(state: ResearcherState) -> dict:
     """Compress research findings into a concise summary.
     
     Takes all the research messages and tool outputs and creates
     a compressed summary suitable for the supervisor's decision-making.
+    With rolling compression, the findings written down after each tool step
+    are assembled with the researcher's final answer, without a model call;
+    only tool outputs no update has covered yet (e.g. after a failed update)
+    are written down first. The raw notes are returned as a reference into
+    the blob store.
     """
-    
-    system_message = compress_research_system_prompt.format(date=get_today_str())
-    messages = [SystemMessage(content=system_message)] + state.get("researcher_messages", []) + [HumanMessage(content=compress_research_human_message)]
-    response = compress_model.invoke(messages)
+    messages = hydrate_messages(state.get("researcher_messages", []))
+    start = state.get("compressed_message_count", 0)
+
+    if researcher_compression_mode == "rolling" and start:
+        delta = compression_delta(messages[start:])
+        rolling = dict(state)
+        if any(isinstance(m, ToolMessage) for m in delta):
+            rolling.update(await compress_delta(state, delta))
+        final_answers = [str(m.content) for m in delta if isinstance(m, AIMessage) and not m.tool_calls and m.content]
+        compressed_research = assemble_compression(rolling, final_answers[-1] if final_answers else None)
+    else:
+        system_message = compress_research_system_prompt.format(date=get_today_str())
+        response = await get_model("compressor").ainvoke(
+            [SystemMessage(content=system_message)] + list(messages) + [HumanMessage(content=compress_research_human_message)]
+        )
+        compressed_research = str(response.content)
     
     # Extract raw notes from tool and AI messages
     raw_notes = [
         str(m.content) for m in filter_messages(
-            state["researcher_messages"], 
+            messages, 
             include_types=["tool", "ai"]
         )
     ]
     
     return {
-        "compressed_research": str(response.content),
-        "raw_notes": ["\n".join(raw_notes)]
+        "compressed_research": compressed_research,
+        "raw_notes": [store_note("\n".join(raw_notes))],
+        "stop_reason": state.get("stop_reason") or "completed",
     }
 
 # ===== ROUTING LOGIC =====
@@ -109,6 +402,20 @@ def should_continue(state: ResearcherState) -> Literal["tool_node", "compress_re
     # Otherwise, we have a final answer
     return "compress_research"
 
+def should_continue_after_tools(state: ResearcherState) -> Union[Literal["llm_call", "compress_research"], list[str]]:
+    """Determine whether to keep researching after executing tool calls.
+    
+    Returns:
+        "llm_call": Budget remains, continue the research loop
+        ["llm_call", "update_compression"]: Same, updating the rolling compression in parallel
+        "compress_research": A budget limit was hit, stop and compress research
+    """
+    if state.get("stop_reason"):
+        return "compress_research"
+    if researcher_compression_mode == "rolling":
+        return ["llm_call", "update_compression"]
+    return "llm_call"
+
 # ===== GRAPH CONSTRUCTION =====
 
 # Build the agent workflow
@@ -118,6 +425,7 @@ agent_builder = StateGraph(ResearcherState, output_schema=ResearcherOutputState)
 agent_builder.add_node("llm_call", llm_call)
 agent_builder.add_node("tool_node", tool_node)
 agent_builder.add_node("compress_research", compress_research)
+agent_builder.add_node("update_compression", update_compression)
 
 # Add edges to connect nodes
 agent_builder.add_edge(START, "llm_call")
@@ -129,7 +437,16 @@ agent_builder.add_conditional_edges(
         "compress_research": "compress_research", # Provide final answer
     },
 )
-agent_builder.add_edge("tool_node", "llm_call") # Loop back for more research
+agent_builder.add_conditional_edges(
+    "tool_node",
+    should_continue_after_tools,
+    {
+        "llm_call": "llm_call", # Loop back for more research
+        "update_compression": "update_compression", # Rolling compression, alongside llm_call
+        "compress_research": "compress_research", # Budget exhausted
+    },
+)
+agent_builder.add_edge("update_compression", END) # Ends its branch only; the loop goes on
 agent_builder.add_edge("compress_research", END)
 
 # Compile the agent
@@ -143,5 +460,5 @@ researcher_agent = agent_builder.compile()
 # Return up to 10 relevant datasets/models with title, description, size, license, and direct link.
 # """
 
-# result = researcher_agent.invoke({"researcher_messages": [HumanMessage(content=f"{research_brief}.")]})
+# result = asyncio.run(researcher_agent.ainvoke({"researcher_messages": [HumanMessage(content=f"{research_brief}.")]}))
 # format_messages(result['researcher_messages'])
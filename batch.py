@@ -0,0 +1,289 @@
+"""
+Batch Research Runs for Research Agent
+
+This module runs the full research agent over a list of companies or queries
+read from a CSV or JSONL file. Items run concurrently on one event loop, so
+they share the search and summary caches and the researcher concurrency cap,
+which is raised to max_concurrent_researchers per concurrent item.
+Each report and its metadata are written as soon as the item completes, and a
+batch that was interrupted can be run again to finish only the missing items.
+"""
+
+import asyncio
+import csv
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing_extensions import Any, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+from langchain_core.outputs import LLMResult
+
+from final_report import open_full_agent, finish_thread
+from run_context import research_run_scope
+from supervisor_agent import max_concurrent_researchers, researcher_scheduler
+from streaming import ResearchProgress, stream_research
+from tracing import get_tracer, write_trace
+
+# ===== CONFIGURATION =====
+
+# Research runs executing at the same time unless overridden on the command line
+default_batch_concurrency = 2
+# Directory that receives <id>.md reports and <id>.json metadata
+default_output_dir = Path("reports")
+# Recursion limit of every research run
+batch_recursion_limit = 50
+
+# Query used for items that only name a company
+company_query_template = """Conduct comprehensive market research and AI/GenAI use case generation for {company}.
+
+Your analysis should include:
+1. **Industry Research**: Research {company}'s industry segments, market position, key offerings, and strategic focus areas
+2. **Use Case Generation**: Generate relevant AI, ML, and GenAI use cases that can improve {company}'s operations, customer experience, and business processes
+3. **Resource Collection**: Find relevant datasets, tools, and resources from Kaggle, HuggingFace, and GitHub that support the proposed use cases
+4. **Final Proposal**: Create a comprehensive proposal with prioritized use cases and clickable resource links
+
+The final deliverable should be a professional market research report suitable for executive presentation, including:
+- Industry Overview and Company Analysis
+- Top AI/GenAI Use Cases ranked by priority and impact
+- Resource Assets with clickable links to datasets
+
+Focus on practical, high-impact AI solutions that align with {company}'s business model and industry requirements."""
+
+# ===== INPUT =====
+
+def slugify(text: str, max_length: int = 60) -> str:
+    """Turn free text into a short lowercase identifier usable as a file name."""
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_length].rstrip("-") or "item"
+
+def load_batch_items(path: Path) -> List[dict]:
+    """Read batch items from a CSV or JSONL file.
+
+    Each row needs a "query" or a "company" column/key; an optional "id" names
+    the output files. Rows naming only a company get company_query_template.
+    Ids default to a slug of the company or query and are made unique.
+
+    Args:
+        path: CSV (.csv) or JSON Lines (.jsonl) file
+
+    Returns:
+        List of items with "id", "query" and, when given, "company"
+    """
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    seen_ids = set()
+    for line_number, row in enumerate(rows, start=1):
+        company = (row.get("company") or "").strip()
+        query = (row.get("query") or "").strip()
+        if not query and company:
+            query = company_query_template.format(company=company)
+        if not query:
+            print(f"Skipping batch row {line_number}: it has neither a query nor a company")
+            continue
+
+        base_id = slugify(str(row.get("id") or company or query))
+        item_id, suffix = base_id, 2
+        while item_id in seen_ids:
+            item_id, suffix = f"{base_id}-{suffix}", suffix + 1
+        seen_ids.add(item_id)
+
+        items.append({"id": item_id, "query": query, **({"company": company} if company else {})})
+    return items
+
+# ===== TOKEN USAGE =====
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Callback handler summing the token usage of every chat model call in a run,
+    per model.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self.usage: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                model = (getattr(message, "response_metadata", None) or {}).get("model_name", "unknown")
+                with self._lock:
+                    totals = self.usage.setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+                    totals["calls"] += 1
+                    totals["input_tokens"] += usage.get("input_tokens", 0)
+                    totals["output_tokens"] += usage.get("output_tokens", 0)
+
+    def totals(self) -> dict:
+        """Return token totals over all models, plus the per-model breakdown."""
+        with self._lock:
+            return {
+                "input_tokens": sum(model["input_tokens"] for model in self.usage.values()),
+                "output_tokens": sum(model["output_tokens"] for model in self.usage.values()),
+                "by_model": {name: dict(model) for name, model in self.usage.items()},
+            }
+
+# ===== BATCH EXECUTION =====
+
+def read_metadata(output_dir: Path, item_id: str) -> Optional[dict]:
+    """Return the metadata written for an item, if any."""
+    path = output_dir / f"{item_id}.json"
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable metadata {path}: {str(e)}")
+        return None
+
+def write_json(path: Path, data: dict) -> None:
+    """Write JSON atomically, so an interrupted batch never leaves a partial file."""
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    temp_path.write_text(json.dumps(data, indent=2, default=str), encoding="utf-8")
+    temp_path.replace(path)
+
+async def select_batch_thread(full_agent, item_id: str) -> tuple[str, bool]:
+    """Return the thread to run an item on and whether it resumes an interrupted run.
+
+    Attempts run on the threads batch-<id>, batch-<id>.2, batch-<id>.3 and so on
+    (item ids never contain dots, see slugify).
+    An attempt interrupted mid-run is resumed. An attempt that finished
+    (without a report, or the item would have been skipped) is left alone,
+    and the next attempt starts on a fresh thread.
+    """
+    attempt = 1
+    while True:
+        thread_id = f"batch-{item_id}" if attempt == 1 else f"batch-{item_id}.{attempt}"
+        snapshot = await full_agent.aget_state({"configurable": {"thread_id": thread_id}})
+        if snapshot.next:
+            return thread_id, True
+        if not snapshot.values:
+            return thread_id, False
+        attempt += 1
+
+async def run_batch_item(full_agent, item: dict, output_dir: Path, spend_caps: Optional[dict] = None) -> dict:
+    """Run (or resume) one batch item and write its report and metadata.
+
+    The item runs on a checkpointed thread (see select_batch_thread), so an
+    item interrupted mid-run continues from its last completed node.
+
+    Args:
+        full_agent: Full agent compiled with the durable checkpointer
+        item: Batch item with "id" and "query"
+        output_dir: Directory receiving the report and metadata
+        spend_caps: Spend caps of the item's run (see ledger.default_spend_caps)
+
+    Returns:
+        Metadata of the item
+    """
+    thread_id, resumed = await select_batch_thread(full_agent, item["id"])
+    usage = TokenUsageCallback()
+    thread = {
+        "configurable": {"thread_id": thread_id},
+        "recursion_limit": batch_recursion_limit,
+        "callbacks": [usage],
+    }
+    progress = ResearchProgress()
+    agent_input = None if resumed else {"messages": [HumanMessage(content=item["query"])]}
+
+    metadata = {**item, "thread_id": thread_id, "resumed": resumed, "started_at": time.time()}
+    result = None
+    tracer = None
+    try:
+        with research_run_scope(spend_caps):
+            tracer = get_tracer()
+            async for event in stream_research(full_agent, agent_input, thread, progress):
+                if event["type"] == "final_state":
+                    result = event["state"] or {}
+        await finish_thread(full_agent, thread)
+
+        report = result.get("final_report", "")
+        (output_dir / f"{item['id']}.md").write_text(report, encoding="utf-8")
+        metadata["status"] = "completed" if report else "failed"
+        if not report:
+            metadata["error"] = "No final report was generated"
+    except Exception as e:
+        print(f"Batch item {item['id']} failed: {str(e)}")
+        metadata["status"] = "failed"
+        metadata["error"] = str(e)
+
+    snapshot = progress.snapshot()
+    metadata.update({
+        "finished_at": time.time(),
+        "wall_seconds": round(snapshot["elapsed_seconds"], 1),
+        "stage_timings": snapshot["stage_timings"],
+        "researchers": snapshot["researchers_spawned"],
+        "searches": snapshot["searches_issued"],
+        "sources": snapshot["sources_found"],
+        "tokens": usage.totals(),
+        "cost": (result or {}).get("cost_ledger", {}),
+        "researcher_runs": (result or {}).get("researcher_runs", []),
+    })
+    if tracer is not None:
+        # Spans of this run (<id>.trace.json) and their metrics (<id>.trace.prom)
+        write_trace(tracer, output_dir / f"{item['id']}.trace.json")
+    write_json(output_dir / f"{item['id']}.json", metadata)
+    return metadata
+
+async def run_batch(
+    input_path: Path,
+    output_dir: Path = default_output_dir,
+    concurrency: int = default_batch_concurrency,
+    spend_caps: Optional[dict] = None,
+) -> List[dict]:
+    """Run every item of a batch file that has not completed yet.
+
+    Items whose metadata already records a completed run are skipped, so an
+    interrupted batch can be finished by running the same command again.
+
+    Args:
+        input_path: CSV or JSONL file of batch items
+        output_dir: Directory receiving reports and metadata
+        concurrency: Maximum number of items researched at the same time
+        spend_caps: Spend caps applied to each item's run
+
+    Returns:
+        Metadata of the items run in this invocation
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    items = load_batch_items(input_path)
+    pending = [
+        item for item in items
+        if (read_metadata(output_dir, item["id"]) or {}).get("status") != "completed"
+    ]
+    print(f"Batch: {len(items)} items, {len(items) - len(pending)} already completed, {len(pending)} to run")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    finished = 0
+
+    # Let every concurrent item run as many researchers as a single run would
+    researcher_scheduler.set_capacity(max_concurrent_researchers * max(1, concurrency))
+
+    async with open_full_agent() as full_agent:
+        async def run_limited(item: dict) -> dict:
+            nonlocal finished
+            async with semaphore:
+                metadata = await run_batch_item(full_agent, item, output_dir, spend_caps)
+            finished += 1
+            print(
+                f"[{finished}/{len(pending)}] {item['id']}: {metadata['status']} "
+                f"in {metadata['wall_seconds']}s ({metadata['sources']} sources)"
+            )
+            return metadata
+
+        return await asyncio.gather(*(run_limited(item) for item in pending))
@@ -0,0 +1,221 @@
+"""
+Offline Benchmark for Research Agent
+
+Runs the research graphs against the local fakes in fakes.py (scripted models
+and a canned search corpus with simulated latency), so performance can be
+measured with no network or API keys. For every scenario it reports end-to-end
+latency, per-node latency (from the run's trace, see tracing.py), model and
+search call counts and peak memory.
+
+    python benchmark.py                                 # all scenarios
+    python benchmark.py --scenario full-4-researchers --repeat 3
+    python benchmark.py --json benchmark.json           # machine-readable results
+    python benchmark.py --trace-dir traces              # JSON trace and metrics per scenario
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing_extensions import Any, Iterator, List, Optional
+
+from langchain_core.messages import HumanMessage
+
+from fakes import CorpusSearchClient, default_llm_latency, default_search_latency, fake_models
+from ledger import default_spend_caps
+from models import override_models
+from rate_limits import tavily_rate_limiter
+from run_context import research_run_scope
+from tracing import get_tracer, write_trace
+from utils_agent import cache_stats, isolated_caches
+
+# ===== SCENARIOS =====
+
+@dataclass
+class Scenario:
+    """
+    One benchmark configuration: which graph to drive and the shape of the
+    simulated workload.
+    """
+    name: str
+    graph: str = "full"               # "full", "supervisor" or "researcher"
+    researchers: int = 2              # research topics delegated per supervisor round
+    supervisor_rounds: int = 1
+    researcher_iterations: int = 2    # searches per researcher before it answers
+    page_words: int = 800             # size of every search result page
+    llm_latency: float = default_llm_latency
+    search_latency: float = default_search_latency
+    query: Optional[str] = None       # request of the run, defaults to benchmark_query
+    compression_mode: Optional[str] = None  # agent.researcher_compression_mode, defaults to the agent's
+
+scenarios = [
+    Scenario("researcher", graph="researcher", researcher_iterations=3),
+    Scenario("supervisor-2-researchers", graph="supervisor", researchers=2),
+    Scenario("full-1-researcher", researchers=1),
+    Scenario("full-2-researchers", researchers=2),
+    Scenario("full-4-researchers", researchers=4),
+    Scenario("large-pages", researchers=2, page_words=30_000),
+    Scenario("many-iterations", researchers=2, supervisor_rounds=3, researcher_iterations=8),
+    # Baseline for rolling compression: one compressor call over the whole history per researcher
+    Scenario("many-iterations-final", researchers=2, supervisor_rounds=3, researcher_iterations=8, compression_mode="final"),
+    # Names a company, so the brief triggers the speculative prefetch (prefetch.py)
+    Scenario("full-prefetch", researchers=2, query="Conduct market research and AI use case generation for ITC Limited."),
+]
+
+# Names no company, so no prefetch runs
+benchmark_query = "Conduct market research and AI use case generation for a diversified FMCG company."
+
+# ===== INSTRUMENTATION =====
+
+def node_timings(trace_summary: dict) -> dict:
+    """Return count, total, p95 and max seconds per graph node (and of the prefetch) from a trace summary."""
+    return {
+        group["name"]: {
+            "count": group["count"],
+            "total_seconds": group["total_seconds"],
+            "p95_seconds": group["p95_seconds"],
+            "max_seconds": group["max_seconds"],
+        }
+        for group in trace_summary.values() if group["kind"] in ("node", "prefetch")
+    }
+
+# ===== EXECUTION =====
+
+@contextmanager
+def compression_mode(mode: Optional[str]) -> Iterator[None]:
+    """Use the given researcher compression mode for the enclosed block (None keeps the agent's)."""
+    import agent
+    previous = agent.researcher_compression_mode
+    agent.researcher_compression_mode = mode or previous
+    try:
+        yield
+    finally:
+        agent.researcher_compression_mode = previous
+
+def scenario_graph(scenario: Scenario) -> tuple[Any, dict]:
+    """Return the compiled graph a scenario drives and its input."""
+    query = scenario.query or benchmark_query
+    if scenario.graph == "researcher":
+        from agent import researcher_agent
+        topic = "Topic 1.1: market analysis of a diversified FMCG company"
+        return researcher_agent, {"researcher_messages": [HumanMessage(content=topic)], "research_topic": topic}
+    if scenario.graph == "supervisor":
+        from supervisor_agent import supervisor_agent
+        return supervisor_agent, {"supervisor_messages": [HumanMessage(content=query)], "research_brief": query}
+    if scenario.graph == "full":
+        from final_report import full_agent
+        return full_agent, {"messages": [HumanMessage(content=query)]}
+    raise ValueError(f"Unknown graph '{scenario.graph}' in scenario {scenario.name}")
+
+async def run_scenario(scenario: Scenario, measure_memory: bool = True, trace_dir: Optional[Path] = None) -> dict:
+    """Run a scenario once with cold caches and return its measurements.
+
+    With trace_dir, the run's JSON trace and Prometheus metrics are written
+    there as <scenario>.json and <scenario>.prom.
+    """
+    graph, graph_input = scenario_graph(scenario)
+    models = fake_models(
+        researchers=scenario.researchers,
+        supervisor_rounds=scenario.supervisor_rounds,
+        researcher_iterations=scenario.researcher_iterations,
+        latency_seconds=scenario.llm_latency,
+    )
+    search_client = CorpusSearchClient(page_words=scenario.page_words, latency_seconds=scenario.search_latency)
+    config = {
+        "configurable": {"thread_id": f"benchmark-{scenario.name}-{time.time_ns()}"},
+        "recursion_limit": 200,
+    }
+
+    with override_models(models, search_client=search_client), isolated_caches(), tavily_rate_limiter.unlimited(), \
+            compression_mode(scenario.compression_mode):
+        if measure_memory:
+            tracemalloc.start()
+        started_at = time.perf_counter()
+        # Spend caps disabled, so every scenario runs its full workload
+        with research_run_scope(spend_caps=dict.fromkeys(default_spend_caps, 0)):
+            tracer = get_tracer()
+            await graph.ainvoke(graph_input, config=config)
+        wall_seconds = time.perf_counter() - started_at
+        caches = cache_stats()
+        peak_bytes = tracemalloc.get_traced_memory()[1] if measure_memory else None
+        if measure_memory:
+            tracemalloc.stop()
+
+    if trace_dir:
+        write_trace(tracer, Path(trace_dir) / f"{scenario.name}.json")
+    return {
+        "scenario": scenario.name,
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_memory_mb": round(peak_bytes / 2**20, 2) if peak_bytes is not None else None,
+        "llm_calls": {role: model.call_count for role, model in models.items() if model.call_count},
+        "search_calls": search_client.call_count,
+        "caches": caches,
+        "nodes": node_timings(tracer.summary()),
+    }
+
+async def run_benchmark(selected: List[Scenario], repeat: int = 1, measure_memory: bool = True, trace_dir: Optional[Path] = None) -> List[dict]:
+    """Run every selected scenario `repeat` times and keep the median run of each."""
+    results = []
+    for scenario in selected:
+        runs = [await run_scenario(scenario, measure_memory, trace_dir) for _ in range(repeat)]
+        median_wall = statistics.median(run["wall_seconds"] for run in runs)
+        result = min(runs, key=lambda run: abs(run["wall_seconds"] - median_wall))
+        result["runs_wall_seconds"] = [run["wall_seconds"] for run in runs]
+        result["config"] = asdict(scenario)
+        results.append(result)
+        print_result(result)
+    return results
+
+def format_cache_stats(caches: dict) -> str:
+    """Format cache hit counters, e.g. "summaries 12/40 (30%), searches 0/8 (0%)"."""
+    return ", ".join(
+        f"{name} {stats['hits']}/{stats['hits'] + stats['misses']} ({stats['hit_rate']:.0%})"
+        for name, stats in caches.items()
+    )
+
+def print_result(result: dict) -> None:
+    """Print one scenario's measurements."""
+    llm_calls = ", ".join(f"{role} {count}" for role, count in result["llm_calls"].items())
+    memory = f", peak {result['peak_memory_mb']} MB" if result["peak_memory_mb"] is not None else ""
+    print(f"\n{result['scenario']}: {result['wall_seconds']:.2f}s{memory}")
+    print(f"  LLM calls: {sum(result['llm_calls'].values())} ({llm_calls}); search calls: {result['search_calls']}")
+    print("  Cache hits: " + format_cache_stats(result["caches"]))
+    for node, timing in result["nodes"].items():
+        print(f"  {node:28} x{timing['count']:<3} total {timing['total_seconds']:7.3f}s  p95 {timing['p95_seconds']:6.3f}s  max {timing['max_seconds']:6.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the research agent offline against local fakes.")
+    parser.add_argument("--scenario", action="append", choices=[s.name for s in scenarios], help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the median run is reported")
+    parser.add_argument("--llm-latency", type=float, default=None, help="Override simulated seconds per model call")
+    parser.add_argument("--search-latency", type=float, default=None, help="Override simulated seconds per search")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc, which slows allocation-heavy runs")
+    parser.add_argument("--json", default=None, help="Write results to this JSON file")
+    parser.add_argument("--trace-dir", default=None, help="Write the JSON trace and Prometheus metrics of every run to this directory")
+    args = parser.parse_args()
+
+    selected = [s for s in scenarios if not args.scenario or s.name in args.scenario]
+    for scenario in selected:
+        if args.llm_latency is not None:
+            scenario.llm_latency = args.llm_latency
+        if args.search_latency is not None:
+            scenario.search_latency = args.search_latency
+
+    try:
+        results = asyncio.run(run_benchmark(selected, repeat=max(1, args.repeat), measure_memory=not args.no_memory, trace_dir=args.trace_dir))
+    except Exception as e:
+        print(f"Benchmark failed: {str(e)}")
+        sys.exit(1)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Blob Store for Research Agent
+
+Raw research notes and search outputs are by far the largest values in the
+graph state, and the state is copied into every checkpoint. This module keeps
+them out of band: the text is written once to a content-addressed file under
+.cache/blobs, and the state holds only a compact reference with its size,
+e.g. "blob:sha256:9f86d0...:48213". Readers hydrate references back to text
+when they need it.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing_extensions import Iterable, List, Optional
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from utils_agent import cache_dir
+
+# ===== CONFIGURATION =====
+
+# Directory holding the blobs (override with MARKET_RESEARCH_BLOB_DIR)
+blob_dir = Path(os.getenv("MARKET_RESEARCH_BLOB_DIR", cache_dir / "blobs"))
+# Set MARKET_RESEARCH_BLOB_STORE=0 to keep raw notes and tool outputs in the state
+blob_store_enabled = os.getenv("MARKET_RESEARCH_BLOB_STORE", "1") != "0"
+# Tool outputs longer than this many characters are stored as blobs
+blob_threshold_chars = 4000
+# Blobs not written or read for this long are deleted, as are the least
+# recently used ones beyond max_blob_bytes (see prune_blobs)
+blob_retention_days = 7
+max_blob_bytes = 1024 ** 3
+
+blob_reference_pattern = re.compile(r"^blob:sha256:([0-9a-f]{64}):(\d+)$")
+
+# ===== STORE =====
+
+def blob_path(digest: str) -> Path:
+    """Return the file holding the blob with this sha256 digest."""
+    return blob_dir / digest[:2] / digest
+
+def put_blob(text: str) -> str:
+    """Store text in the blob store and return its reference.
+
+    Identical texts share one file. Writes go through a temporary file, so a
+    concurrent reader never sees a partial blob.
+
+    Args:
+        text: Text to store
+
+    Returns:
+        Reference of the form "blob:sha256:<digest>:<characters>"
+    """
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if path.exists():
+        # Refresh the access time used by prune_blobs
+        os.utime(path)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+    return f"blob:sha256:{digest}:{len(text)}"
+
+def is_blob_reference(value: object) -> bool:
+    """Return whether a value is a blob reference."""
+    return isinstance(value, str) and blob_reference_pattern.match(value) is not None
+
+def get_blob(reference: str) -> str:
+    """Return the text behind a blob reference.
+
+    A blob that has been pruned is replaced by a short notice rather than
+    failing the run.
+    """
+    digest, size = blob_reference_pattern.match(reference).groups()  # type: ignore
+    path = blob_path(digest)
+    try:
+        text = path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        print(f"Blob {digest[:12]} ({size} characters) is no longer in the blob store")
+        return f"[Content no longer available: {size} characters pruned from the blob store]"
+    os.utime(path)
+    return text
+
+def hydrate(value: str) -> str:
+    """Return the text behind a value that may be a blob reference."""
+    return get_blob(value) if is_blob_reference(value) else value
+
+# ===== MESSAGES AND NOTES =====
+
+def offload_message(message: ToolMessage) -> ToolMessage:
+    """Move a large tool output to the blob store, leaving its reference as content."""
+    content = message.content
+    if not blob_store_enabled or not isinstance(content, str) or len(content) <= blob_threshold_chars:
+        return message
+    return message.model_copy(update={"content": put_blob(content)})
+
+def hydrate_messages(messages: Iterable[BaseMessage]) -> List[BaseMessage]:
+    """Return the messages with every blob reference content replaced by its text."""
+    return [
+        message.model_copy(update={"content": get_blob(message.content)})  # type: ignore
+        if is_blob_reference(message.content) else message
+        for message in messages
+    ]
+
+def store_note(text: str) -> str:
+    """Return the reference of a raw note, or the note itself if the store is disabled."""
+    return put_blob(text) if blob_store_enabled else text
+
+# ===== MAINTENANCE =====
+
+def prune_blobs(retention_days: float = blob_retention_days, max_bytes: Optional[int] = max_blob_bytes) -> int:
+    """Delete blobs unused for retention_days, then the least recently used beyond max_bytes.
+
+    Blob retention should be at least the checkpoint retention, so a resumed
+    run still finds the blobs its state refers to.
+
+    Returns:
+        Number of blobs deleted
+    """
+    if not blob_dir.exists():
+        return 0
+    blobs = sorted(
+        ((path.stat().st_mtime, path.stat().st_size, path) for path in blob_dir.glob("*/*") if path.is_file()),
+        reverse=True,
+    )
+    cutoff = time.time() - retention_days * 24 * 3600
+    kept_bytes = 0
+    deleted = 0
+    for modified_at, size, path in blobs:
+        if modified_at < cutoff or (max_bytes and kept_bytes + size > max_bytes):
+            path.unlink(missing_ok=True)
+            deleted += 1
+        else:
+            kept_bytes += size
+    return deleted
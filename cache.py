@@ -0,0 +1,184 @@
+"""
+Disk-backed Caches for Research Agent
+
+This module provides a small SQLite key-value store with LRU eviction and
+optional expiry, used to reuse expensive results (such as webpage summaries)
+across researchers and across runs.
+"""
+
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing_extensions import Any, Optional
+
+# ===== CACHE =====
+
+class SQLiteCache:
+    """
+    Persistent key-value cache stored in a single SQLite file.
+
+    Values are stored as JSON. The cache holds at most max_entries rows and
+    evicts the least recently used ones beyond that. Entries can expire after
+    ttl_seconds (None keeps them until evicted). Hit and miss counters are kept
+    per process and reported by stats().
+
+    Hits do not write to the database. Their access times are buffered and
+    written in one statement every touch_batch_size hits, before every set
+    (so eviction sees them) and when the cache is flushed or closed.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 5000,
+        ttl_seconds: Optional[float] = None,
+        touch_batch_size: int = 64,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.touch_batch_size = touch_batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Access times of hits not written yet, by key
+        self._pending_touches: dict[str, float] = {}
+        atexit.register(self.flush)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a stable cache key by hashing the given parts."""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use and create the table if needed."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, "
+                "expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    self._pending_touches.pop(key, None)
+                    conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+
+            self._pending_touches[key] = now
+            if len(self._pending_touches) >= self.touch_batch_size:
+                self._write_touches(conn)
+                conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def _write_touches(self, conn: sqlite3.Connection) -> None:
+        """Write the buffered access times (the caller holds the lock and commits)."""
+        if self._pending_touches:
+            conn.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._pending_touches.items()],
+            )
+            self._pending_touches.clear()
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store value under key, evicting least recently used entries if full.
+
+        Args:
+            key: Cache key, usually built with make_key
+            value: JSON-serializable value to store
+            ttl_seconds: Expiry for this entry, defaults to the cache-wide TTL
+        """
+        now = time.time()
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = now + ttl if ttl is not None else None
+
+        with self._lock:
+            conn = self._connect()
+            self._write_touches(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), now, now, expires_at),
+            )
+
+            # Evict least recently used entries beyond the size bound
+            (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            conn.commit()
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+            self._pending_touches.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def flush(self) -> None:
+        """Write the buffered access times of recent hits."""
+        with self._lock:
+            if self._conn is None or not self._pending_touches:
+                return
+            try:
+                self._write_touches(self._conn)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Failed to flush cache access times to {self.path}: {str(e)}")
+                self._pending_touches.clear()
+
+    def close(self) -> None:
+        """Flush buffered access times and close the database."""
+        self.flush()
+        atexit.unregister(self.flush)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            (size,) = self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
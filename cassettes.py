@@ -0,0 +1,335 @@
+"""
+Record and Replay for Research Agent
+
+In record mode every model call (brief, supervisor, researcher, compressor,
+summarizer and writer) and every Tavily search of a run is written to a local
+cassette file. In replay mode those responses are served back with no network
+and no API keys, so a real run can be reproduced at full speed for profiling
+or turned into a performance regression test.
+
+Requests are matched by a hash of their content that ignores message and
+tool call ids. When a request has no exact match (e.g. the date in a prompt
+changed), the next unused response recorded for the same role is served.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing_extensions import Any, AsyncIterator, Callable, ContextManager, Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import Field
+
+from models import create_search_client, get_model, model_roles, override_models
+from rate_limits import tavily_rate_limiter
+from utils_agent import isolated_caches, normalize_search_query
+
+# ===== CONFIGURATION =====
+
+# Cassette file and mode ("record" or "replay") when not given on the command line
+cassette_path_env_var = "MARKET_RESEARCH_CASSETTE"
+cassette_mode_env_var = "MARKET_RESEARCH_CASSETTE_MODE"
+cassette_modes = ("record", "replay")
+
+# The wrapper reports every call to the run's callbacks itself, so the inner
+# model runs without them to avoid counting and streaming each call twice
+inner_call_config = {"callbacks": []}
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no recorded response is left for a request."""
+
+# ===== REQUEST HASHING =====
+
+def message_fingerprint(message: BaseMessage) -> dict:
+    """Return the parts of a message that identify a request, without ids."""
+    return {
+        "type": message.type,
+        "content": message.content,
+        "name": getattr(message, "name", None),
+        "tool_calls": [
+            {"name": tool_call["name"], "args": tool_call["args"]}
+            for tool_call in getattr(message, "tool_calls", None) or []
+        ],
+    }
+
+def request_key(*parts: Any) -> str:
+    """Hash JSON-serializable request parts into a cassette key."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# ===== CASSETTE =====
+
+class Cassette:
+    """
+    JSON Lines file of recorded responses.
+
+    In record mode every response is appended as soon as it arrives, so an
+    interrupted run keeps what it recorded. In replay mode responses are
+    served by request hash, falling back to recording order per role.
+    """
+
+    def __init__(self, path: Path, mode: str):
+        if mode not in cassette_modes:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {cassette_modes}")
+        self.path = Path(path)
+        self.mode = mode
+        self.hits = 0
+        self.fallbacks = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries: List[dict] = []
+        self._by_key: dict[tuple, List[int]] = defaultdict(list)
+        self._by_role: dict[tuple, List[int]] = defaultdict(list)
+        self._file = None
+
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+        else:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add_entry(json.loads(line))
+
+    def _add_entry(self, entry: dict) -> None:
+        index = len(self._entries)
+        entry["used"] = False
+        self._entries.append(entry)
+        self._by_key[(entry["kind"], entry["key"])].append(index)
+        self._by_role[(entry["kind"], entry["role"])].append(index)
+
+    def record(self, kind: str, role: str, key: str, response: Any) -> None:
+        """Append a response to the cassette file."""
+        line = json.dumps({"kind": kind, "role": role, "key": key, "response": response}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def replay(self, kind: str, role: str, key: str) -> Any:
+        """Return the recorded response for a request.
+
+        Args:
+            kind: "model" or "search"
+            role: Model role, or "search"
+            key: Request hash
+
+        Returns:
+            The recorded response
+
+        Raises:
+            CassetteMissError: If every response recorded for the role was already served
+        """
+        with self._lock:
+            for index in self._by_key.get((kind, key), []):
+                if not self._entries[index]["used"]:
+                    self.hits += 1
+                    return self._take(index)
+            for index in self._by_role.get((kind, role), []):
+                if not self._entries[index]["used"]:
+                    self.fallbacks += 1
+                    return self._take(index)
+        raise CassetteMissError(f"No recorded {kind} response left for {role} in {self.path}")
+
+    def _take(self, index: int) -> Any:
+        self._entries[index]["used"] = True
+        return self._entries[index]["response"]
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        """Return how many responses were recorded or served, and how."""
+        return {
+            "mode": self.mode,
+            "path": str(self.path),
+            "recorded": self.recorded,
+            "replayed_by_hash": self.hits,
+            "replayed_in_order": self.fallbacks,
+            "unused": sum(1 for entry in self._entries if not entry["used"]),
+        }
+
+# ===== MODEL AND SEARCH WRAPPERS =====
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records the responses of an inner model, or replays them.
+
+    Tools bound with bind_tools and structured output schemas are part of the
+    request hash, and are applied to the inner model when recording.
+    """
+    role: str
+    cassette: Any = Field(exclude=True)
+    inner: Optional[BaseChatModel] = Field(default=None, exclude=True)
+    tools: List[Any] = Field(default_factory=list, exclude=True)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable:
+        return self.model_copy(update={"tools": list(tools)}).bind(**kwargs)
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Runnable:
+        return self.bind(structured_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content)
+        )
+
+    def _key(self, messages: List[BaseMessage], schema: Any) -> str:
+        tool_names = [getattr(tool, "name", None) or getattr(tool, "__name__", repr(tool)) for tool in self.tools]
+        return request_key(
+            self.role, [message_fingerprint(message) for message in messages],
+            tool_names, getattr(schema, "__name__", None),
+        )
+
+    def _replay(self, messages: List[BaseMessage], schema: Any) -> AIMessage:
+        response = self.cassette.replay("model", self.role, self._key(messages, schema))
+        return messages_from_dict([response])[0]
+
+    def _record(self, messages: List[BaseMessage], schema: Any, message: BaseMessage) -> AIMessage:
+        message = message_chunk_to_message(message) if isinstance(message, AIMessageChunk) else message
+        self.cassette.record("model", self.role, self._key(messages, schema), message_to_dict(message))
+        return message
+
+    def _inner_runnable(self, schema: Any) -> Runnable:
+        if schema:
+            return self.inner.with_structured_output(schema, include_raw=True) | RunnableLambda(structured_to_message)
+        return self.inner.bind_tools(self.tools) if self.tools else self.inner
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        schema = kwargs.get("structured_schema")
+        if self.cassette.mode == "replay":
+            message = self._replay(messages, schema)
+        else:
+            message = self._record(messages, schema, self._inner_runnable(schema).invoke(messages, config=inner_call_config))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        schema = kwargs.get("structured_schema")
+        if self.cassette.mode == "replay":
+            message = self._replay(messages, schema)
+        else:
+            message = self._record(messages, schema, await self._inner_runnable(schema).ainvoke(messages, config=inner_call_config))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        schema = kwargs.get("structured_schema")
+        if self.cassette.mode == "replay" or schema or self.tools:
+            result = await self._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            yield ChatGenerationChunk(message=message_to_chunk(result.generations[0].message))
+            return
+
+        # Stream plain completions (the report writer) through while recording them
+        full_message = None
+        async for chunk in self.inner.astream(messages, config=inner_call_config):
+            full_message = chunk if full_message is None else full_message + chunk
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+        self._record(messages, schema, full_message if full_message is not None else AIMessage(content=""))
+
+def message_to_chunk(message: AIMessage) -> AIMessageChunk:
+    """Turn a complete message into a single streamed chunk, keeping its tool calls."""
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+        id=message.id,
+        tool_call_chunks=[
+            {"name": tool_call["name"], "args": json.dumps(tool_call["args"]), "id": tool_call["id"], "index": index}
+            for index, tool_call in enumerate(message.tool_calls)
+        ],
+    )
+
+def structured_to_message(output: dict) -> AIMessage:
+    """Turn include_raw structured output into a message holding the parsed object as JSON."""
+    if output.get("parsed") is None:
+        raise output.get("parsing_error") or ValueError("Structured output could not be parsed")
+    raw = output["raw"]
+    return AIMessage(
+        content=output["parsed"].model_dump_json(),
+        usage_metadata=getattr(raw, "usage_metadata", None),
+        response_metadata=getattr(raw, "response_metadata", {}),
+    )
+
+class CassetteSearchClient:
+    """
+    Async search client that records Tavily responses, or replays them.
+    """
+
+    def __init__(self, cassette: Cassette, create_client: Optional[Callable[[], Any]] = None):
+        self.cassette = cassette
+        self.create_client = create_client
+
+    async def search(self, query: str, **kwargs: Any) -> dict:
+        key = request_key("search", normalize_search_query(query), kwargs)
+        if self.cassette.mode == "replay":
+            return self.cassette.replay("search", "search", key)
+        response = await self.create_client().search(query, **kwargs)
+        self.cassette.record("search", "search", key, response)
+        return response
+
+# ===== ACTIVATION =====
+
+@contextmanager
+def use_cassette(path: Path, mode: str) -> Iterator[Cassette]:
+    """Record or replay every model call and search made in the enclosed block.
+
+    Both modes run with empty, temporary caches so that the recorded traffic
+    is complete and replay asks for exactly the same requests. Replay also
+    lifts the search rate limit, so runs replay at full speed.
+
+    Args:
+        path: Cassette file (JSON Lines)
+        mode: "record" or "replay"
+
+    Yields:
+        The open cassette
+    """
+    cassette = Cassette(path, mode)
+    recording = mode == "record"
+    models = {
+        role: CassetteChatModel(
+            role=role, cassette=cassette, inner=get_model(role) if recording else None, metadata={"model_role": role}
+        )
+        for role in model_roles
+    }
+    search_client = CassetteSearchClient(cassette, create_client=create_search_client if recording else None)
+
+    try:
+        with override_models(models, search_client=search_client), isolated_caches(), (
+            nullcontext() if recording else tavily_rate_limiter.unlimited()
+        ):
+            yield cassette
+    finally:
+        cassette.close()
+        print(f"Cassette {cassette.stats()}")
+
+def cassette_from_environment(path: Optional[str] = None, mode: Optional[str] = None) -> ContextManager:
+    """Return the cassette context for a run, or a no-op context if none is configured.
+
+    Args:
+        path: Cassette file, defaults to the MARKET_RESEARCH_CASSETTE variable
+        mode: "record" or "replay", defaults to MARKET_RESEARCH_CASSETTE_MODE (or "replay")
+    """
+    path = path or os.getenv(cassette_path_env_var)
+    if not path:
+        return nullcontext()
+    return use_cassette(Path(path), mode or os.getenv(cassette_mode_env_var, "replay"))
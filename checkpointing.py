@@ -0,0 +1,157 @@
+"""
+Durable Checkpointing for Research Agent
+
+This module stores graph checkpoints in a local SQLite file so an interrupted
+research run can be resumed from its last completed node, and keeps that file
+bounded by compacting finished threads and pruning old ones.
+"""
+
+import os
+import sqlite3
+import threading
+import uuid
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing_extensions import AsyncIterator, Callable, Optional
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from blob_store import blob_retention_days, prune_blobs
+from utils_agent import get_current_dir
+
+# ===== CONFIGURATION =====
+
+# SQLite file holding checkpoints (override with MARKET_RESEARCH_CHECKPOINT_DB)
+checkpoint_db_path = Path(os.getenv(
+    "MARKET_RESEARCH_CHECKPOINT_DB",
+    get_current_dir() / ".checkpoints" / "checkpoints.sqlite",
+))
+# Threads whose last checkpoint is older than this are deleted
+checkpoint_retention_days = 7
+# Only this many most recently active threads are kept
+max_checkpoint_threads = 200
+
+# Offset between the UUID epoch (1582-10-15) and the Unix epoch, in 100ns units
+_uuid_epoch_offset = 0x01B21DD213814000
+
+# Checkpoint files already pruned by this process, and the connections open on
+# each file (jobs and batch runs open one per thread or event loop)
+_pruned_paths: set[str] = set()
+_open_connections: dict[str, int] = {}
+_connections_lock = threading.Lock()
+
+# ===== HELPERS =====
+
+def checkpoint_timestamp(checkpoint_id: str) -> float:
+    """Return the Unix time encoded in a (UUIDv6) checkpoint id."""
+    value = uuid.UUID(checkpoint_id).int
+    timestamp = ((value >> 96) << 28) | (((value >> 80) & 0xFFFF) << 12) | ((value >> 64) & 0x0FFF)
+    return (timestamp - _uuid_epoch_offset) / 1e7
+
+@asynccontextmanager
+async def open_checkpointer(path: Optional[Path] = None) -> AsyncIterator[AsyncSqliteSaver]:
+    """Open the SQLite checkpointer, pruning old threads and blobs first.
+
+    The checkpointer is bound to the running event loop, so open it inside the
+    coroutine that runs the graph. Pruning runs on the first open of a file in
+    the process only; later opens (e.g. one per job thread) use it as is.
+
+    Args:
+        path: SQLite file to use, defaults to checkpoint_db_path
+
+    Yields:
+        Ready-to-use AsyncSqliteSaver
+    """
+    path = Path(path or checkpoint_db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    key = str(path.resolve())
+
+    async with AsyncSqliteSaver.from_conn_string(str(path)) as checkpointer:
+        await checkpointer.setup()
+        # Claimed without waiting, so concurrent opens on one event loop never block it
+        with _connections_lock:
+            _open_connections[key] = _open_connections.get(key, 0) + 1
+            should_prune = key not in _pruned_paths
+            _pruned_paths.add(key)
+        try:
+            if should_prune:
+                await prune_checkpoints(checkpointer, vacuum=lambda: _open_connections.get(key) == 1)
+                # Blobs referenced by checkpointed state (see blob_store.py) age out with them
+                prune_blobs(max(blob_retention_days, checkpoint_retention_days))
+            yield checkpointer
+        finally:
+            with _connections_lock:
+                _open_connections[key] -= 1
+
+async def prune_checkpoints(
+    checkpointer: AsyncSqliteSaver,
+    retention_days: float = checkpoint_retention_days,
+    max_threads: int = max_checkpoint_threads,
+    vacuum: Callable[[], bool] = lambda: True,
+) -> list[str]:
+    """Delete threads that are too old or beyond the most recent max_threads.
+
+    The file is vacuumed afterwards unless vacuum() says other connections are
+    using it. A vacuum that finds the file busy (e.g. in another process) is skipped.
+
+    Args:
+        checkpointer: Open SQLite checkpointer
+        retention_days: Maximum age of a thread's last checkpoint
+        max_threads: Maximum number of threads to keep
+        vacuum: Returns whether the file may be vacuumed now
+
+    Returns:
+        Ids of the deleted threads
+    """
+    async with checkpointer.lock:
+        async with checkpointer.conn.execute(
+            "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints "
+            "WHERE checkpoint_ns = '' GROUP BY thread_id"
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    # Checkpoint ids are time-ordered, so the newest thread has the largest id
+    threads = sorted(rows, key=lambda row: row[1], reverse=True)
+    cutoff = time.time() - retention_days * 24 * 3600
+    expired = [
+        thread_id for i, (thread_id, last_checkpoint_id) in enumerate(threads)
+        if i >= max_threads or checkpoint_timestamp(last_checkpoint_id) < cutoff
+    ]
+
+    for thread_id in expired:
+        await checkpointer.adelete_thread(thread_id)
+    if expired and vacuum():
+        async with checkpointer.lock:
+            try:
+                await checkpointer.conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                print(f"Skipping checkpoint vacuum: {str(e)}")
+    return expired
+
+async def compact_thread(checkpointer: AsyncSqliteSaver, thread_id: str) -> None:
+    """Drop every checkpoint of a finished thread except its latest one.
+
+    Intermediate and subgraph checkpoints are only needed to resume a run that
+    is still in progress, so call this once a thread has completed.
+
+    Args:
+        checkpointer: Open SQLite checkpointer
+        thread_id: Thread whose run has completed
+    """
+    async with checkpointer.lock:
+        async with checkpointer.conn.execute(
+            "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+            (thread_id,),
+        ) as cursor:
+            (latest_checkpoint_id,) = await cursor.fetchone()
+        if latest_checkpoint_id is None:
+            return
+
+        for table in ("checkpoints", "writes"):
+            await checkpointer.conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? "
+                "AND NOT (checkpoint_ns = '' AND checkpoint_id = ?)",
+                (thread_id, latest_checkpoint_id),
+            )
+        await checkpointer.conn.commit()
@@ -0,0 +1,282 @@
+"""
+Local Fakes for Research Agent
+
+Deterministic stand-ins for the Gemini models and the Tavily client, with
+configurable simulated latency. They let the research graphs run end to end
+with no network or API keys, which is what benchmark.py relies on.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from typing_extensions import Any, Callable, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, Field
+
+from schema import ClarifyWithUser, ResearchQuestion, Summary
+
+# ===== CONFIGURATION =====
+
+# Simulated latency of a model call and of a search request, in seconds
+default_llm_latency = 0.05
+default_search_latency = 0.05
+# Words streamed per chunk by the fake model
+stream_chunk_words = 20
+
+# Words the canned corpus and the scripted queries are made of, so that local
+# relevance filtering finds matches as it would on real pages
+corpus_vocabulary = (
+    "market share revenue growth segment customer retail supply chain digital "
+    "analytics forecasting demand pricing brand portfolio distribution agriculture "
+    "hotels packaging paperboards fmcg cigarettes exports sustainability strategy "
+    "competitors investment automation machine learning generative ai dataset "
+    "personalization inventory logistics quality inspection procurement risk"
+).split()
+
+# ===== HELPERS =====
+
+def estimate_message_tokens(messages: List[BaseMessage]) -> int:
+    """Roughly estimate prompt tokens (about 4 characters per token)."""
+    return sum(len(str(message.content)) for message in messages) // 4 + 1
+
+def first_human_text(messages: List[BaseMessage]) -> str:
+    """Return the text of the first human message of a prompt."""
+    return next((str(message.content) for message in messages if isinstance(message, HumanMessage)), "")
+
+def tool_call(name: str, **args: Any) -> dict:
+    """Build a tool call as returned by a tool-calling chat model."""
+    return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+
+# ===== CHAT MODEL =====
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Tool-calling chat model that answers from a script instead of an API.
+
+    The script receives the prompt messages (and, for structured output, the
+    requested schema) and returns an AIMessage, a string, or a pydantic object.
+    Every call sleeps latency_seconds first and reports an estimated token
+    usage, so timing and budget logic behave as with a real model.
+    """
+    script: Callable[..., Any] = Field(exclude=True)
+    latency_seconds: float = default_llm_latency
+    call_count: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable:
+        return self.bind(tool_names=[getattr(tool, "name", None) or tool.__name__ for tool in tools], **kwargs)
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs: Any) -> Runnable:
+        def parse(message: AIMessage) -> Any:
+            parsed = schema.model_validate_json(message.content)
+            return {"raw": message, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+        return self.bind(structured_schema=schema) | RunnableLambda(parse)
+
+    def _respond(self, messages: List[BaseMessage], **kwargs: Any) -> AIMessage:
+        """Run the script and wrap its answer in an AIMessage with usage metadata."""
+        self.call_count += 1
+        schema = kwargs.get("structured_schema")
+        answer = self.script(messages, schema=schema) if schema else self.script(messages)
+        if isinstance(answer, str):
+            answer = AIMessage(content=answer)
+        elif not isinstance(answer, AIMessage) and isinstance(answer, BaseModel):
+            answer = AIMessage(content=answer.model_dump_json())
+        answer.usage_metadata = {
+            "input_tokens": estimate_message_tokens(messages),
+            "output_tokens": len(str(answer.content)) // 4 + 1,
+            "total_tokens": estimate_message_tokens(messages) + len(str(answer.content)) // 4 + 1,
+        }
+        answer.response_metadata = {"model_name": "scripted"}
+        return answer
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, **kwargs))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, **kwargs))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_seconds)
+        yield from self._chunks(self._respond(messages, **kwargs))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_seconds)
+        for chunk in self._chunks(self._respond(messages, **kwargs)):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(0)
+
+    def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        """Split an answer into streamed chunks, the last carrying tool calls and usage."""
+        words = str(message.content).split(" ")
+        pieces = [" ".join(words[i:i + stream_chunk_words]) for i in range(0, len(words), stream_chunk_words)]
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=piece + ("" if last else " "),
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                    for index, call in enumerate(message.tool_calls)
+                ] if last else [],
+                usage_metadata=message.usage_metadata if last else None,
+            ))
+
+# ===== SCRIPTS =====
+
+def brief_script(messages: List[BaseMessage], schema: Any = None) -> Any:
+    """Never ask for clarification and turn the request into a research brief."""
+    if schema is ClarifyWithUser:
+        return ClarifyWithUser(need_clarification=False, question="", verification="Starting research now.")
+    # The prompt quotes the conversation, starting with the user's request
+    prompt = first_human_text(messages)
+    match = re.search(r"<Messages>\s*Human: (.*?)\s*(?:\nAI: |</Messages>)", prompt, flags=re.DOTALL)
+    return ResearchQuestion(research_brief=f"Research brief: {(match.group(1) if match else prompt)[:300]}")
+
+def make_supervisor_script(researchers: int = 2, rounds: int = 1) -> Callable:
+    """Delegate `researchers` topics per round for `rounds` rounds, then finish."""
+    def supervisor_script(messages: List[BaseMessage]) -> AIMessage:
+        rounds_done = sum(
+            1 for message in messages
+            if isinstance(message, AIMessage) and any(call["name"] == "ConductResearch" for call in message.tool_calls)
+        )
+        if rounds_done >= rounds:
+            return AIMessage(content="", tool_calls=[tool_call("ResearchComplete")])
+        return AIMessage(content="", tool_calls=[
+            tool_call("ConductResearch", research_topic=f"Topic {rounds_done + 1}.{i + 1}: {corpus_vocabulary[(rounds_done * researchers + i) % len(corpus_vocabulary)]} research")
+            for i in range(researchers)
+        ])
+    return supervisor_script
+
+def make_researcher_script(iterations: int = 2, queries_per_turn: int = 1) -> Callable:
+    """Search `iterations` times per research topic, then answer.
+
+    The researcher's context may be folded, so progress is tracked per topic
+    in the script rather than read back from the prompt.
+    """
+    turns_by_topic: dict[str, int] = {}
+
+    def researcher_script(messages: List[BaseMessage]) -> AIMessage:
+        topic = first_human_text(messages)
+        turn = turns_by_topic.get(topic, 0)
+        turns_by_topic[topic] = turn + 1
+        if turn >= iterations:
+            return AIMessage(content=f"Findings for {topic}: research complete.")
+        return AIMessage(content="", tool_calls=[
+            tool_call("tavily_search", query=f"{topic} {corpus_vocabulary[(turn * queries_per_turn + q) % len(corpus_vocabulary)]} analysis")
+            for q in range(queries_per_turn)
+        ])
+    return researcher_script
+
+def compressor_script(messages: List[BaseMessage]) -> str:
+    """Compress research into a fixed-shape summary of the tool results."""
+    sources = sum(str(message.content).count("URL: ") for message in messages if isinstance(message, ToolMessage))
+    return f"Compressed research over {len(messages)} messages and {sources} sources.\n" + "Finding. " * 50
+
+def summarizer_script(messages: List[BaseMessage], schema: Any = None) -> Any:
+    """Summarize a page as an excerpt of the summarization prompt."""
+    text = str(messages[-1].content)
+    if schema is Summary or schema is None:
+        return Summary(summary=text[-600:], key_excerpts=text[-200:])
+    return schema()
+
+def writer_script(messages: List[BaseMessage]) -> str:
+    """Write a long markdown report."""
+    sections = "\n\n".join(
+        f"## Section {i + 1}\n\n" + " ".join(corpus_vocabulary[(i + j) % len(corpus_vocabulary)] for j in range(150))
+        for i in range(8)
+    )
+    return f"# Market Research Report\n\n{sections}\n\n### Sources\n[1] https://example.com/page/1\n"
+
+def fake_models(
+    researchers: int = 2,
+    supervisor_rounds: int = 1,
+    researcher_iterations: int = 2,
+    latency_seconds: float = default_llm_latency,
+) -> dict[str, ScriptedChatModel]:
+    """Build a scripted model for every role of the model registry."""
+    scripts = {
+        "brief": brief_script,
+        "supervisor": make_supervisor_script(researchers, supervisor_rounds),
+        "researcher": make_researcher_script(researcher_iterations),
+        "compressor": compressor_script,
+        "summarizer": summarizer_script,
+        "writer": writer_script,
+    }
+    return {
+        role: ScriptedChatModel(script=script, latency_seconds=latency_seconds, metadata={"model_role": role})
+        for role, script in scripts.items()
+    }
+
+# ===== SEARCH CLIENT =====
+
+class CorpusSearchClient:
+    """
+    Async search client serving results from a canned, deterministic corpus.
+
+    The same query always returns the same pages, and different queries share
+    pages, so deduplication and caching behave as with real search results.
+    Matches the AsyncTavilyClient.search interface used by the agent.
+    """
+
+    def __init__(
+        self,
+        corpus_size: int = 200,
+        page_words: int = 800,
+        latency_seconds: float = default_search_latency,
+        seed: int = 0,
+    ):
+        self.corpus_size = corpus_size
+        self.page_words = page_words
+        self.latency_seconds = latency_seconds
+        self.seed = seed
+        self.call_count = 0
+        self._pages: dict[int, str] = {}
+
+    def page(self, index: int) -> str:
+        """Return the raw content of a corpus page, generated on first use."""
+        if index not in self._pages:
+            rng = random.Random(self.seed * 1_000_003 + index)
+            paragraphs = []
+            for start in range(0, self.page_words, 100):
+                paragraphs.append(" ".join(rng.choice(corpus_vocabulary) for _ in range(min(100, self.page_words - start))))
+            self._pages[index] = "\n\n".join(paragraphs)
+        return self._pages[index]
+
+    async def search(
+        self,
+        query: str,
+        max_results: int = 5,
+        include_raw_content: bool = True,
+        topic: str = "general",
+        **kwargs: Any,
+    ) -> dict:
+        await asyncio.sleep(self.latency_seconds)
+        self.call_count += 1
+
+        query_seed = int(hashlib.sha256(re.sub(r"\s+", " ", query.lower()).encode()).hexdigest()[:8], 16)
+        indices = random.Random(query_seed).sample(range(self.corpus_size), min(max_results, self.corpus_size))
+        results = []
+        for rank, index in enumerate(indices):
+            content = self.page(index)
+            results.append({
+                "title": f"Corpus page {index}",
+                "url": f"https://example.com/corpus/{index}",
+                "content": " ".join(content.split()[:60]),
+                "score": round(1 - rank / (max_results + 1), 3),
+                "raw_content": content if include_raw_content else None,
+            })
+        return {"query": query, "results": results, "response_time": self.latency_seconds}
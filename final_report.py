@@ -1,6 +1,12 @@
-from langchain.chat_models import init_chat_model
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing_extensions import AsyncIterator, Optional
+
+from models import get_model
+from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.checkpoint.memory import InMemorySaver
 
 from utils_agent import get_today_str
@@ -8,14 +14,17 @@ from prompts import final_report_generation_prompt
 from state import AgentState, AgentInputState
 from reserach_brief import clarify_with_user, write_research_brief
 from supervisor_agent import supervisor_agent
-
-writer_model = init_chat_model(model="gemini-2.5-flash", model_provider="google-genai")
+from checkpointing import open_checkpointer, compact_thread
+from ledger import get_ledger
 
 async def final_report_generation(state: AgentState):
     """
     Final report generation node.
     
-    Synthesizes all research findings into a comprehensive final report
+    Synthesizes all research findings into a comprehensive final report.
+    The writer model is streamed, so callers using stream_mode="messages"
+    (see streaming.stream_research) receive the report token by token. The
+    run's cost ledger, including the report itself, is returned alongside it.
     """
     
     notes = state.get("notes", [])
@@ -28,11 +37,16 @@ async def final_report_generation(state: AgentState):
         date=get_today_str()
     )
     
-    final_report = await writer_model.ainvoke([HumanMessage(content=final_report_prompt)])
+    # Stream the report so tokens surface as they arrive; chunks add up to the full message
+    final_report = None
+    async for chunk in get_model("writer").astream([HumanMessage(content=final_report_prompt)]):
+        final_report = chunk if final_report is None else final_report + chunk
     
+    ledger = get_ledger()
     return {
         "final_report": final_report.content, 
         "messages": ["Here is the final report: " + final_report.content], # type: ignore
+        **({"cost_ledger": ledger.snapshot()} if ledger else {}),
     }
 
 # ===== GRAPH CONSTRUCTION =====
@@ -51,6 +65,51 @@ deep_researcher_builder.add_edge("write_research_brief", "supervisor_subgraph")
 deep_researcher_builder.add_edge("supervisor_subgraph", "final_report_generation")
 deep_researcher_builder.add_edge("final_report_generation", END)
 
-# Compile the full workflow
+# Compile the full workflow with an in-memory checkpointer (notebooks and quick
+# experiments). Long runs should use open_full_agent, which persists to disk.
 checkpointer = InMemorySaver()
-full_agent = deep_researcher_builder.compile(checkpointer=checkpointer)
\ No newline at end of file
+full_agent = deep_researcher_builder.compile(checkpointer=checkpointer)
+
+# ===== DURABLE EXECUTION =====
+
+@asynccontextmanager
+async def open_full_agent(checkpoint_path: Optional[Path] = None) -> AsyncIterator[CompiledStateGraph]:
+    """Compile the full workflow against the durable SQLite checkpointer.
+
+    Every completed node is checkpointed to disk, so a crashed or restarted run
+    can be continued with resume_research using the same thread_id.
+
+    Args:
+        checkpoint_path: SQLite file to use, defaults to checkpointing.checkpoint_db_path
+
+    Yields:
+        Compiled full agent backed by the durable checkpointer
+    """
+    async with open_checkpointer(checkpoint_path) as durable_checkpointer:
+        yield deep_researcher_builder.compile(checkpointer=durable_checkpointer)
+
+async def has_pending_work(agent: CompiledStateGraph, config: RunnableConfig) -> bool:
+    """Return True if the thread in config was interrupted before finishing."""
+    snapshot = await agent.aget_state(config)
+    return bool(snapshot.next)
+
+async def finish_thread(agent: CompiledStateGraph, config: RunnableConfig) -> None:
+    """Compact the checkpoints of a thread whose run has completed."""
+    await compact_thread(agent.checkpointer, config["configurable"]["thread_id"])
+
+async def resume_research(agent: CompiledStateGraph, config: RunnableConfig) -> dict:
+    """Continue an interrupted thread from its last completed node.
+
+    Args:
+        agent: Full agent compiled with a durable checkpointer (see open_full_agent)
+        config: Run config holding the thread_id of the interrupted run
+
+    Returns:
+        Final state of the thread
+    """
+    if not await has_pending_work(agent, config):
+        return (await agent.aget_state(config)).values
+
+    result = await agent.ainvoke(None, config=config)
+    await finish_thread(agent, config)
+    return result
\ No newline at end of file
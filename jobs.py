@@ -0,0 +1,155 @@
+"""
+Background Research Jobs for Research Agent
+
+This module runs research in a pool of worker threads so a front end such as
+the Streamlit app never blocks on a run. Each job gets its own checkpointed
+thread and event loop; the front end polls a job's status, live progress and
+partial report, and can reattach to a job after a page refresh.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing_extensions import Optional
+
+from langchain_core.messages import HumanMessage
+
+from final_report import open_full_agent, finish_thread
+from run_context import research_run_scope
+from streaming import stream_research
+
+# ===== CONFIGURATION =====
+
+# Research runs executing at the same time; further jobs wait in the queue
+max_concurrent_jobs = 4
+# Finished jobs kept for polling and reattaching before the oldest are dropped
+max_finished_jobs = 100
+# Recursion limit of every research run
+job_recursion_limit = 50
+
+# ===== JOBS =====
+
+@dataclass
+class ResearchJob:
+    """
+    A research run submitted to the job manager.
+
+    Status moves from "queued" to "running" and then to "completed" or
+    "failed". The report and progress fill in while the job runs.
+    """
+    job_id: str
+    thread_id: str
+    query: str
+    resume: bool = False
+    status: str = "queued"
+    report: str = ""
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+async def run_research_job(job: ResearchJob) -> None:
+    """Run (or resume) the research of a job, recording progress on the job as it streams.
+
+    Args:
+        job: Job to run; its status, report, progress and result are updated in place
+    """
+    thread = {"configurable": {"thread_id": job.thread_id}, "recursion_limit": job_recursion_limit}
+    # Resuming passes no input, continuing from the last checkpoint
+    agent_input = None if job.resume else {"messages": [HumanMessage(content=job.query)]}
+
+    async with open_full_agent() as full_agent:
+        with research_run_scope():
+            async for event in stream_research(full_agent, agent_input, thread):
+                if event["type"] == "progress":
+                    job.progress = event["progress"]
+                elif event["type"] == "report_token":
+                    job.report += event["text"]
+                elif event["type"] == "final_state":
+                    job.progress = event["progress"]
+                    job.result = event["state"]
+            await finish_thread(full_agent, thread)
+
+class ResearchJobManager:
+    """
+    Runs research jobs on a thread pool and keeps track of them by id.
+
+    One manager is shared by every session of a deployment, so jobs submitted
+    by different users run side by side, each on its own checkpointed thread.
+    """
+
+    def __init__(self, max_workers: int = max_concurrent_jobs, max_finished: int = max_finished_jobs):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="research-job")
+        self._jobs: dict[str, ResearchJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, query: str, thread_id: Optional[str] = None, resume: bool = False) -> ResearchJob:
+        """Queue a research run.
+
+        Args:
+            query: Research query (ignored when resuming)
+            thread_id: Checkpointed thread to run on, a new one is created if omitted
+            resume: Continue the interrupted run of thread_id instead of starting over
+
+        Returns:
+            The submitted job
+        """
+        job = ResearchJob(
+            job_id=uuid.uuid4().hex,
+            thread_id=thread_id or f"job-{uuid.uuid4().hex}",
+            query=query,
+            resume=resume,
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: Optional[str]) -> Optional[ResearchJob]:
+        """Return the job with the given id, if it is still known."""
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def active_job_for_thread(self, thread_id: str) -> Optional[ResearchJob]:
+        """Return the queued or running job of a checkpointed thread, if any."""
+        with self._lock:
+            return next(
+                (job for job in self._jobs.values() if job.thread_id == thread_id and not job.done),
+                None,
+            )
+
+    def _run(self, job: ResearchJob) -> None:
+        """Run a job on a worker thread, with its own event loop."""
+        job.status = "running"
+        try:
+            asyncio.run(run_research_job(job))
+            job.status = "completed"
+        except Exception as e:
+            print(f"Research job {job.job_id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond max_finished."""
+        finished = sorted(
+            (job for job in self._jobs.values() if job.done),
+            key=lambda job: job.finished_at or 0,
+        )
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.job_id]
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and optionally wait for running ones to finish."""
+        self._executor.shutdown(wait=wait)
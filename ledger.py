@@ -0,0 +1,260 @@
+"""
+Cost Ledger for Research Agent
+
+This module accounts for what a research run spends: the tokens of every model
+call and the Tavily credits of every search, by model, role, graph node and
+researcher, priced with a configurable price table. The ledger also enforces
+hard spend caps. Once a cap is reached the researchers and the supervisor stop
+gracefully, and the report is written from the notes gathered so far.
+
+A ledger is active inside ledger_scope(), which research_run_scope() enters
+for every run; the final state of a run holds its snapshot under cost_ledger.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing_extensions import Any, Iterator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tracers.context import register_configure_hook
+
+from tracing import get_researcher_id
+
+# ===== CONFIGURATION =====
+
+# USD per million input/output tokens by model; models not listed use "default".
+# Replace the whole table with a JSON file named by MARKET_RESEARCH_PRICE_TABLE,
+# e.g. {"models": {"gemini-2.5-flash": {"input": 0.3, "output": 2.5}}, "tavily_credit_usd": 0.008}
+model_prices = {
+    "gemini-2.5-pro": {"input": 1.25, "output": 10.00},
+    "gemini-2.5-flash": {"input": 0.30, "output": 2.50},
+    "gemini-2.5-flash-lite": {"input": 0.10, "output": 0.40},
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40},
+    "gemini-1.5-flash": {"input": 0.075, "output": 0.30},
+    "default": {"input": 0.30, "output": 2.50},
+}
+# USD per Tavily API credit, and credits charged per (basic depth) search
+tavily_credit_usd = 0.008
+credits_per_search = 1
+
+def env_spend_cap(name: str, cast: type) -> Optional[float]:
+    """Return the spend cap set in environment variable name, or None if unset."""
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+# Hard caps per run, all off unless set; None or 0 disables a cap. Override per
+# run with research_run_scope(spend_caps=...)
+default_spend_caps = {
+    "max_cost_usd": env_spend_cap("MARKET_RESEARCH_MAX_COST_USD", float),
+    "max_tokens": env_spend_cap("MARKET_RESEARCH_MAX_TOKENS", int),
+    "max_search_credits": env_spend_cap("MARKET_RESEARCH_MAX_SEARCH_CREDITS", int),
+}
+
+def load_price_table() -> None:
+    """Replace the price table with the JSON file named by MARKET_RESEARCH_PRICE_TABLE, if set."""
+    global model_prices, tavily_credit_usd
+    path = os.getenv("MARKET_RESEARCH_PRICE_TABLE")
+    if not path:
+        return
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    model_prices = {**model_prices, **table.get("models", {})}
+    tavily_credit_usd = table.get("tavily_credit_usd", tavily_credit_usd)
+
+load_price_table()
+
+def model_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Return the USD cost of a model call from the price table."""
+    prices = model_prices.get(model) or model_prices["default"]
+    return (input_tokens * prices["input"] + output_tokens * prices["output"]) / 1_000_000
+
+# ===== LEDGER =====
+
+class CostLedger:
+    """
+    Running account of the tokens, search credits and cost of one research run.
+
+    Usage is accumulated in total and broken down by model, role, node and
+    researcher. Safe to update from several threads and event loops.
+    """
+
+    def __init__(self, spend_caps: Optional[dict] = None):
+        self.spend_caps = {**default_spend_caps, **(spend_caps or {})}
+        self.totals = {"model_calls": 0, "input_tokens": 0, "output_tokens": 0, "searches": 0, "search_credits": 0, "cost_usd": 0.0}
+        self.breakdown: dict[str, dict[str, dict]] = {"model": {}, "role": {}, "node": {}, "researcher": {}}
+        self.cap_reached: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _add(self, keys: dict, **amounts: Any) -> None:
+        """Add amounts to the totals and to every breakdown named in keys (lock held)."""
+        for name, value in amounts.items():
+            self.totals[name] += value
+        for dimension, key in keys.items():
+            entry = self.breakdown[dimension].setdefault(key or "unattributed", {})
+            for name, value in amounts.items():
+                entry[name] = entry.get(name, 0) + value
+        self._check_caps()
+
+    def record_model_call(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        role: Optional[str] = None,
+        node: Optional[str] = None,
+        researcher_id: Optional[str] = None,
+    ) -> None:
+        """Account for one model call."""
+        with self._lock:
+            self._add(
+                {"model": model, "role": role, "node": node, "researcher": researcher_id},
+                model_calls=1,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cost_usd=model_cost(model, input_tokens, output_tokens),
+            )
+
+    def record_search(self, credits: int = credits_per_search, node: Optional[str] = None, researcher_id: Optional[str] = None) -> None:
+        """Account for one search request sent to Tavily (cache hits are free)."""
+        with self._lock:
+            self._add(
+                {"node": node, "researcher": researcher_id},
+                searches=1,
+                search_credits=credits,
+                cost_usd=credits * tavily_credit_usd,
+            )
+
+    def _check_caps(self) -> None:
+        if self.cap_reached:
+            return
+        usage = {
+            "max_cost_usd": self.totals["cost_usd"],
+            "max_tokens": self.totals["input_tokens"] + self.totals["output_tokens"],
+            "max_search_credits": self.totals["search_credits"],
+        }
+        for cap, used in usage.items():
+            limit = self.spend_caps.get(cap)
+            if limit and used >= limit:
+                self.cap_reached = cap
+                print(f"Spend cap {cap}={limit} reached ({used:g} used); stopping research and writing the report from the notes so far")
+                return
+
+    def snapshot(self) -> dict:
+        """Return the totals, the breakdowns and the cap status as plain data."""
+        with self._lock:
+            return {
+                **{name: round(value, 6) if name == "cost_usd" else value for name, value in self.totals.items()},
+                **{
+                    f"by_{dimension}": {
+                        key: {name: round(value, 6) if name == "cost_usd" else value for name, value in entry.items()}
+                        for key, entry in entries.items()
+                    }
+                    for dimension, entries in self.breakdown.items()
+                },
+                "spend_caps": dict(self.spend_caps),
+                "cap_reached": self.cap_reached,
+            }
+
+# ===== CALLBACK HANDLER =====
+
+class CostLedgerCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler recording the token usage of every chat model call in
+    the ledger, attributed to the model, role, node and researcher.
+    """
+    run_inline = True
+
+    def __init__(self, ledger: CostLedger):
+        self.ledger = ledger
+        self._calls: dict[Any, dict] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: Any, metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        with self._lock:
+            self._calls[run_id] = {
+                "model": metadata.get("ls_model_name"),
+                "role": metadata.get("model_role"),
+                "node": metadata.get("langgraph_node"),
+                "researcher_id": get_researcher_id(),
+            }
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        with self._lock:
+            call = self._calls.pop(run_id, None) or {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                model = call.get("model") or (getattr(message, "response_metadata", None) or {}).get("model_name", "unknown")
+                self.ledger.record_model_call(
+                    model,
+                    usage.get("input_tokens", 0),
+                    usage.get("output_tokens", 0),
+                    role=call.get("role"),
+                    node=call.get("node"),
+                    researcher_id=call.get("researcher_id"),
+                )
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        with self._lock:
+            self._calls.pop(run_id, None)
+
+# ===== CONTEXT =====
+
+_current_ledger: ContextVar[Optional[CostLedger]] = ContextVar("cost_ledger", default=None)
+_current_handler: ContextVar[Optional[CostLedgerCallbackHandler]] = ContextVar("cost_ledger_handler", default=None)
+
+# Attach the scope's handler to every graph and model run started inside it
+register_configure_hook(_current_handler, inheritable=True)
+
+def get_ledger() -> Optional[CostLedger]:
+    """Return the cost ledger of the current run, if one is active."""
+    return _current_ledger.get()
+
+def spend_cap_reached() -> Optional[str]:
+    """Return the spend cap the current run has reached, or None."""
+    ledger = _current_ledger.get()
+    return ledger.cap_reached if ledger else None
+
+def record_search_cost(credits: int = credits_per_search) -> None:
+    """Charge a search request to the current run's ledger, if one is active."""
+    ledger = _current_ledger.get()
+    if ledger is None:
+        return
+    config = var_child_runnable_config.get() or {}
+    ledger.record_search(credits, node=(config.get("metadata") or {}).get("langgraph_node"), researcher_id=get_researcher_id())
+
+@contextmanager
+def ledger_scope(spend_caps: Optional[dict] = None) -> Iterator[CostLedger]:
+    """Account for every model call and search in the enclosed block.
+
+    Reuses the ledger of an enclosing scope, so nested scopes add to the same
+    ledger.
+
+    Args:
+        spend_caps: Caps overriding default_spend_caps (max_cost_usd, max_tokens, max_search_credits)
+
+    Yields:
+        Ledger of the run
+    """
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        yield ledger
+        return
+
+    ledger = CostLedger(spend_caps)
+    ledger_token = _current_ledger.set(ledger)
+    handler_token = _current_handler.set(CostLedgerCallbackHandler(ledger))
+    try:
+        yield ledger
+    finally:
+        _current_handler.reset(handler_token)
+        _current_ledger.reset(ledger_token)
@@ -0,0 +1,74 @@
+"""
+Import Time Measurement for Research Agent
+
+Measures how long importing the agent takes in a fresh interpreter, using
+Python's -X importtime, and lists the modules that cost the most. Run it to
+check that cold starts (the Streamlit worker, batch subprocesses) stay cheap:
+
+    python measure_import_time.py                 # import final_report
+    python measure_import_time.py streamlit_app --top 30
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Lines of -X importtime output: "import time: <self us> | <cumulative us> | <module>"
+import_time_line = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure_import(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Import module in a fresh interpreter and collect per-module import times.
+
+    Args:
+        module: Module to import, e.g. "final_report"
+
+    Returns:
+        Tuple of the wall time of the interpreter in seconds and a list of
+        (module, self microseconds, cumulative microseconds) per imported module
+    """
+    started_at = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        # Resolved here rather than through utils_agent, which would load the agent into this process too
+        cwd=Path(__file__).resolve().parent,
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - started_at
+    if process.returncode != 0:
+        print(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "Import failed")
+        sys.exit(process.returncode)
+
+    timings = []
+    for line in process.stderr.splitlines():
+        match = import_time_line.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            timings.append((name, int(self_us), int(cumulative_us)))
+    return wall_seconds, timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the research agent.")
+    parser.add_argument("module", nargs="?", default="final_report", help="Module to import (default: final_report)")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest packages to list")
+    args = parser.parse_args()
+
+    wall_seconds, timings = measure_import(args.module)
+    total_us = next((cumulative_us for name, _, cumulative_us in timings if name == args.module), 0)
+
+    # Attribute every module's own import time to its top-level package
+    by_package: dict[str, int] = {}
+    for name, self_us, _ in timings:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+
+    print(f"import {args.module}: {total_us / 1e6:.2f}s, {wall_seconds:.2f}s interpreter wall time")
+    print(f"{len(timings)} modules imported\n\nSlowest packages (own import time):")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1e3:9.1f} ms  {package}")
+
+if __name__ == "__main__":
+    main()
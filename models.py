@@ -0,0 +1,178 @@
+"""
+Model Registry for Research Agent
+
+This module creates the chat models and search clients used by the agent on
+first use instead of at import time, and shares them between modules. Each
+part of the agent asks for its model by role, so the model behind a role is
+configured in one place (or through the environment).
+"""
+
+import itertools
+import os
+import threading
+from contextlib import contextmanager
+from typing_extensions import Any, Iterator, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+from rate_limits import google_api_keys, init_gemini_model, tavily_api_keys
+
+# ===== CONFIGURATION =====
+
+# Model and options of every role. The model of a role can be overridden with
+# MARKET_RESEARCH_<ROLE>_MODEL, e.g. MARKET_RESEARCH_WRITER_MODEL=gemini-2.5-pro
+model_roles = {
+    "brief": {"model": "gemini-2.5-flash"},
+    "supervisor": {"model": "gemini-2.5-flash"},
+    "researcher": {"model": "gemini-2.5-flash"},
+    "compressor": {"model": "gemini-2.5-flash", "max_tokens": 32000},
+    "summarizer": {"model": "gemini-1.5-flash"},
+    "writer": {"model": "gemini-2.5-flash"},
+}
+
+# Models of every role, one per Gemini API key, and the rotation through them
+_models: dict[str, list[BaseChatModel]] = {}
+_model_rotations: dict[str, Iterator[BaseChatModel]] = {}
+_bound_models: dict[tuple, tuple[Any, Runnable]] = {}
+_search_clients: dict[Optional[str], Any] = {}
+# Models and search client served instead of the configured ones (see override_models)
+_model_overrides: dict[str, Any] = {}
+_search_client_override: Optional[Any] = None
+_lock = threading.RLock()
+_environment_loaded = False
+
+# ===== ENVIRONMENT =====
+
+def load_environment() -> None:
+    """Load .env into the environment once, before the first client needs it."""
+    global _environment_loaded
+    if not _environment_loaded:
+        load_dotenv()
+        _environment_loaded = True
+
+# ===== MODELS =====
+
+def model_config(role: str) -> dict:
+    """Return the model name and options of a role, with environment overrides applied."""
+    if role not in model_roles:
+        raise ValueError(f"Unknown model role '{role}', expected one of {sorted(model_roles)}")
+    load_environment()
+    config = dict(model_roles[role])
+    config["model"] = os.getenv(f"MARKET_RESEARCH_{role.upper()}_MODEL", config["model"])
+    return config
+
+def model_name(role: str) -> str:
+    """Return the name of the model serving a role, without creating it."""
+    return model_config(role)["model"]
+
+def get_model(role: str) -> BaseChatModel:
+    """Return the chat model of a role, creating it on first use.
+
+    With several keys in GOOGLE_API_KEYS, one model is created per key and
+    each call returns the next one, so requests (including the one after a
+    429) rotate through the keys.
+
+    Args:
+        role: One of model_roles
+
+    Returns:
+        Chat model shared by every caller asking for this role
+    """
+    with _lock:
+        if role in _model_overrides:
+            return _model_overrides[role]
+        if role not in _models:
+            config = model_config(role)
+            model = config.pop("model")
+            # The role is passed to callbacks, e.g. to name the model's tracing spans
+            _models[role] = [
+                init_gemini_model(model, api_key=api_key, metadata={"model_role": role}, **config)
+                for api_key in google_api_keys.keys or [None]
+            ]
+            _model_rotations[role] = itertools.cycle(_models[role])
+        return next(_model_rotations[role])
+
+def get_structured_model(role: str, schema: type) -> Runnable:
+    """Return the model of a role with structured output, built once per schema."""
+    with _lock:
+        model = get_model(role)
+        key = ("structured", role, schema, id(model))
+        # Rebuild when the model behind the role was overridden since
+        if key not in _bound_models or _bound_models[key][0] is not model:
+            _bound_models[key] = (model, model.with_structured_output(schema))
+        return _bound_models[key][1]
+
+def get_model_with_tools(role: str, tools: Sequence[Any]) -> Runnable:
+    """Return the model of a role bound to tools, built once per tool set."""
+    tool_names = tuple(getattr(tool, "name", None) or getattr(tool, "__name__", repr(tool)) for tool in tools)
+    with _lock:
+        model = get_model(role)
+        key = ("tools", role, tool_names, id(model))
+        if key not in _bound_models or _bound_models[key][0] is not model:
+            _bound_models[key] = (model, model.bind_tools(tools))
+        return _bound_models[key][1]
+
+# ===== SEARCH CLIENTS =====
+
+def get_search_client() -> Any:
+    """Return the async search client to use, honouring override_models.
+
+    Returns:
+        AsyncTavilyClient (or its override)
+    """
+    if _search_client_override is not None:
+        return _search_client_override
+    return create_search_client()
+
+def create_search_client() -> Any:
+    """Return an AsyncTavilyClient for the next API key in rotation.
+
+    Clients are created on first use of each key and reused afterwards.
+
+    Returns:
+        Tavily client
+    """
+    load_environment()
+    # Imported here so importing the agent does not pay for the Tavily SDK
+    from tavily import AsyncTavilyClient
+
+    api_key = tavily_api_keys.next_key()
+    with _lock:
+        if api_key not in _search_clients:
+            _search_clients[api_key] = AsyncTavilyClient(api_key=api_key)
+        return _search_clients[api_key]
+
+# ===== OVERRIDES =====
+
+@contextmanager
+def override_models(models: Optional[dict[str, Any]] = None, search_client: Optional[Any] = None) -> Iterator[None]:
+    """Serve the given models and search client instead of the configured ones.
+
+    Used by benchmarks and record/replay to run the agent against local fakes.
+    Overrides apply process-wide until the block exits.
+
+    Args:
+        models: Dictionary mapping roles to chat models
+        search_client: Async client used for every search, with an AsyncTavilyClient.search method
+    """
+    global _search_client_override
+    models = models or {}
+    unknown_roles = set(models) - set(model_roles)
+    if unknown_roles:
+        raise ValueError(f"Unknown model roles {sorted(unknown_roles)}, expected some of {sorted(model_roles)}")
+
+    with _lock:
+        previous_models = dict(_model_overrides)
+        previous_search_client = _search_client_override
+        _model_overrides.update(models)
+        if search_client is not None:
+            _search_client_override = search_client
+    try:
+        yield
+    finally:
+        with _lock:
+            _model_overrides.clear()
+            _model_overrides.update(previous_models)
+            _search_client_override = previous_search_client
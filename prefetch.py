@@ -0,0 +1,162 @@
+"""
+Speculative Prefetch for Research Agent
+
+Between the research brief being written and the first researcher searching,
+the supervisor and then the researcher each take a model turn while no search
+runs. This module uses that idle time. As soon as the brief is written, it
+derives a few likely queries from the brief locally (company overview,
+business segments, competitors, recent news) and searches and summarizes
+them in the background. The summaries land in the run's URL registry and in
+the caches, so the researchers' first searches find many pages already
+summarized, or being summarized. Prefetch requests run at background
+priority, so they never hold up the supervisor's or researchers' model calls
+and searches (see rate_limits.background_priority).
+"""
+
+import asyncio
+import os
+import re
+from collections import Counter
+from typing_extensions import List, Optional
+
+from langchain_core.runnables.config import var_child_runnable_config
+
+from ledger import spend_cap_reached
+from rate_limits import background_priority
+from run_context import get_url_registry, run_in_background
+from tracing import trace_span
+from utils_agent import asearch_and_summarize
+
+# ===== CONFIGURATION =====
+
+# Set MARKET_RESEARCH_PREFETCH=0 to disable the prefetch
+prefetch_enabled = os.getenv("MARKET_RESEARCH_PREFETCH", "1") != "0"
+
+# Queries searched for the subject of the brief, with their Tavily topic
+prefetch_query_templates = [
+    ("{subject} company overview business model", "general"),
+    ("{subject} business segments revenue market position", "general"),
+    ("{subject} competitors market share", "general"),
+    ("{subject} latest news strategy", "news"),
+]
+# Results per prefetch query, as for the researchers' tavily_search
+prefetch_results_per_query = 3
+
+# Capitalized words that start sentences or name the task rather than its subject
+subject_stopwords = {
+    "a", "an", "the", "this", "these", "that", "those", "i", "we", "you", "your", "our", "my", "it", "its",
+    "and", "or", "for", "of", "in", "on", "to", "with", "by", "from", "also", "please", "all",
+    "conduct", "research", "analyze", "analysis", "identify", "generate", "generation", "create", "find",
+    "focus", "include", "including", "provide", "collect", "evaluate", "compare", "determine", "investigate",
+    "study", "understand", "explore", "assess", "examine", "review", "describe", "list", "summarize",
+    "market", "industry", "company", "companies", "business", "use", "case", "cases", "final", "proposal",
+    "top", "resource", "resources", "report", "overview", "key", "brief", "question", "questions",
+    "ai", "genai", "ml", "llm", "llms", "fmcg", "b2b", "b2c", "kaggle", "huggingface", "github", "executive", "summary",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+}
+# Places, which briefs name as the market of the subject rather than the subject;
+# only chosen when the brief names nothing else
+subject_locations = {
+    "india", "china", "japan", "usa", "us", "u.s", "uk", "u.k", "united states", "united kingdom", "america",
+    "north america", "south america", "latin america", "europe", "asia", "africa", "middle east", "germany",
+    "france", "brazil", "canada", "australia", "singapore", "indonesia", "global", "apac", "emea",
+}
+# Sentence boundaries: punctuation followed by whitespace, or line breaks
+sentence_boundary = re.compile(r"[.!?;:]+(?:\s+|$)|\n+")
+# Runs of capitalized words, dots only inside words (e.g. "U.S")
+capitalized_run = re.compile(r"\b[A-Z][\w&-]*(?:\.[\w&-]+)*(?:\s+(?:&\s+)?[A-Z][\w&-]*(?:\.[\w&-]+)*)*")
+
+# ===== QUERY DERIVATION =====
+
+def extract_subject(research_brief: str) -> Optional[str]:
+    """Guess the company or topic a brief is about, without a model call.
+
+    Takes runs of capitalized words within each sentence and trims generic
+    words from their ends. Of the most frequently named entity (places only
+    if nothing else is named, ties going to the first named) it returns the
+    fullest form named more than once (e.g. "ITC Limited" over "ITC" and
+    "Kaggle").
+
+    Args:
+        research_brief: Research brief written for the run
+
+    Returns:
+        The subject, or None if the brief names none
+    """
+    phrases = []
+    for sentence in sentence_boundary.split(research_brief):
+        for match in capitalized_run.finditer(sentence):
+            words = [re.sub(r"'s$", "", word) for word in match.group(0).split()]
+            while words and words[0].lower() in subject_stopwords:
+                words.pop(0)
+            while words and words[-1].lower() in subject_stopwords:
+                words.pop()
+            if words:
+                phrases.append(" ".join(words))
+    phrases = [phrase for phrase in phrases if phrase.lower() not in subject_locations] or phrases
+    if not phrases:
+        return None
+
+    # most_common keeps first-named order among equally frequent entities
+    leading_word = Counter(phrase.split()[0] for phrase in phrases).most_common(1)[0][0]
+    forms = Counter(phrase for phrase in phrases if phrase.split()[0] == leading_word)
+    # Prefer forms named more than once, then the longest ("ITC Limited" over "ITC")
+    return max(forms, key=lambda phrase: (forms[phrase] > 1, len(phrase.split()), forms[phrase]))
+
+def derive_prefetch_queries(research_brief: str) -> List[tuple[str, str]]:
+    """Return the (query, topic) pairs to prefetch for a brief, or none if it names no subject."""
+    subject = extract_subject(research_brief)
+    if not subject:
+        return []
+    return [(template.format(subject=subject), topic) for template, topic in prefetch_query_templates]
+
+# ===== PREFETCH =====
+
+async def prefetch_searches(queries: List[tuple[str, str]]) -> dict:
+    """Search and summarize queries to warm the caches and the URL registry.
+
+    Failures are reported and ignored: the prefetch is only an optimization.
+
+    Returns:
+        Number of queries and of pages summarized
+    """
+    # Detach from the config of the node that started the prefetch, whose run
+    # (and stream) may be over before the prefetch is; costs are charged to "prefetch"
+    var_child_runnable_config.set({"metadata": {"langgraph_node": "prefetch"}})
+
+    # Yield the rate limits to the supervisor and researchers this work runs alongside
+    with trace_span("prefetch", "prefetch", queries=len(queries)), background_priority():
+        results = await asyncio.gather(
+            *(
+                asearch_and_summarize([query], relevance_query=query, max_results=prefetch_results_per_query, topic=topic)
+                for query, topic in queries
+            ),
+            return_exceptions=True,
+        )
+
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        print(f"Prefetch: {len(failures)} of {len(queries)} searches failed: {str(failures[0])}")
+    return {"queries": len(queries), "pages": sum(len(result) for result in results if isinstance(result, dict))}
+
+def start_prefetch(research_brief: str) -> Optional[asyncio.Task]:
+    """Start prefetching likely searches for a brief in the background.
+
+    Only runs inside research_run_scope, whose URL registry lets researchers
+    reuse (or wait for) the prefetched summaries, and which cancels the
+    prefetch if the run ends first. Skipped when disabled or when the run is
+    already over a spend cap.
+
+    Args:
+        research_brief: Research brief written for the run
+
+    Returns:
+        The prefetch task, or None if no prefetch was started
+    """
+    if not prefetch_enabled or get_url_registry() is None or spend_cap_reached():
+        return None
+    queries = derive_prefetch_queries(research_brief)
+    if not queries:
+        return None
+    return run_in_background(prefetch_searches(queries))
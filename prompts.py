@@ -44,6 +44,15 @@ After each search tool call, use think_tool to analyze the results:
 </Show Your Thinking>
 """
 
+research_digest_section = """
+
+<Research Digest>
+To save context, the full results of your earlier tool calls have been condensed below. The corresponding tool messages in the conversation have been shortened. Treat this digest as results you have already gathered and do not repeat those searches.
+
+{digest}
+</Research Digest>
+"""
+
 summarize_webpage_prompt = """You are tasked with summarizing the raw content of a webpage retrieved from a web search. Your goal is to create a summary that preserves the most important information from the original web page. This summary will be used by a downstream research agent, so it's crucial to maintain the key details without losing essential information.
 
 Here is the raw content of the webpage:
@@ -103,6 +112,34 @@ Remember, your goal is to create a summary that can be easily understood and uti
 Today's date is {date}.
 """
 
+merge_webpage_summaries_prompt = """You are tasked with merging the partial summaries of a long webpage retrieved from a web search. The webpage was too long to summarize at once, so it was split into consecutive sections and each section was summarized separately. Your goal is to combine them into one summary of the whole webpage for a downstream research agent.
+
+Here are the section summaries, in the order the sections appear on the webpage:
+
+<section_summaries>
+{section_summaries}
+</section_summaries>
+
+Please follow these guidelines to create your summary:
+
+1. Identify and preserve the main topic or purpose of the webpage as a whole.
+2. Retain key facts, statistics, and data points from every section; do not drop a section just because it is short.
+3. Remove information repeated across sections.
+4. Keep the order in which information appears on the webpage when it matters (for example, chronology or financial statements by period).
+5. Choose the most important quotes or excerpts across all sections, up to a maximum of 5.
+
+Present your summary in the following format:
+
+```
+{{
+   "summary": "Your merged summary here, structured with appropriate paragraphs or bullet points as needed",
+   "key_excerpts": "First important quote or excerpt, Second important quote or excerpt, ...Add more excerpts as needed, up to a maximum of 5"
+}}
+```
+
+Today's date is {date}.
+"""
+
 compress_research_system_prompt = """You are a research assistant that has conducted research on a topic by calling several tools and web searches. Your job is now to clean up the findings, but preserve all of the relevant statements and information that the researcher has gathered. For context, today's date is {date}.
 
 <Task>
@@ -166,6 +203,31 @@ CRITICAL REQUIREMENTS:
 
 The cleaned findings will be used for final report generation, so comprehensiveness is critical."""
 
+update_compression_prompt = """You are a research assistant keeping a running, cleaned-up record of the findings of a researcher who is still calling tools and web searches. For context, today's date is {date}.
+
+<Research Topic>
+{research_topic}
+</Research Topic>
+
+<New Research Messages>
+{new_messages}
+</New Research Messages>
+
+<Sources>
+{sources}
+</Sources>
+
+<Task>
+Write down everything relevant to the research topic from the new research messages, and only from them. The findings of earlier messages are already recorded and must not be repeated.
+- Keep every statement, fact, name and number verbatim; do not shorten or paraphrase them
+- Merge duplicates within the new messages (e.g. "These three sources all stated X")
+- Cite sources inline with their numbers from <Sources>, e.g. [3]; never renumber them
+- Do not list the queries made or the sources: they are recorded separately
+- Ignore think_tool calls and reflections: they are internal to the research process
+- If the new messages hold nothing relevant, return nothing
+</Task>
+"""
+
 
 lead_researcher_prompt = """You are a research supervisor. Your job is to conduct research by calling the "ConductResearch" tool. For context, today's date is {date}.
 
@@ -0,0 +1,368 @@
+"""
+Rate Limiting for Research Agent
+
+This module coordinates request rates to the model and search providers across
+every researcher in the process. Each provider has one shared token-bucket
+limiter that slows down when the provider answers 429 (honouring Retry-After
+when given) and speeds back up as requests succeed. Background requests (the
+speculative prefetch) only get a token when no other request is waiting for
+one. API keys can be rotated round-robin when several are configured.
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing_extensions import Any, Awaitable, Callable, Iterator, List, Optional, TypeVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from tracing import record_queue_wait
+
+T = TypeVar("T")
+
+# ===== CONFIGURATION =====
+
+# Sustained request rates per provider (override with environment variables)
+gemini_requests_per_second = float(os.getenv("GEMINI_REQUESTS_PER_SECOND", "2"))
+tavily_requests_per_second = float(os.getenv("TAVILY_REQUESTS_PER_SECOND", "5"))
+# Requests that may be sent back to back after an idle period
+rate_limit_burst = 4
+# Factor applied to the rate on every 429, and the floor as a fraction of the base rate
+rate_decrease_factor = 0.5
+min_rate_fraction = 1 / 16
+# Fraction of the base rate recovered after every successful request
+rate_recovery_fraction = 0.05
+# Backoff used when a 429 carries no Retry-After, doubled on consecutive 429s
+initial_backoff_seconds = 1.0
+max_backoff_seconds = 60.0
+# Tokens background requests leave in the bucket for other requests
+background_reserved_tokens = 1
+# Retries of a search request rejected with 429
+max_rate_limit_retries = 4
+# Attempts of a Gemini request inside the Google SDK, which retries 429s itself
+# with a fixed backoff; the limiter only hears of 429s that outlast them. Lower
+# it to let the limiter adapt sooner, at the risk of failed calls (1 = no retry)
+gemini_max_attempts = int(os.getenv("GEMINI_MAX_ATTEMPTS", "6"))
+
+# ===== RATE LIMIT ERRORS =====
+
+rate_limit_error_names = {"ResourceExhausted", "TooManyRequests", "RateLimitError", "UsageLimitExceededError"}
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Return True if error means the provider rejected the request with 429."""
+    if type(error).__name__ in rate_limit_error_names:
+        return True
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "status_code", None), getattr(error, "code", None), getattr(response, "status_code", None)):
+        if status == 429:
+            return True
+    message = str(error).lower()
+    return re.search(r"\b429\b", message) is not None or "rate limit" in message or "resource_exhausted" in message
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Return the delay the provider asked for before retrying, if it gave one."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = getattr(error, "retry_after", None) or headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+
+    # Gemini puts the delay in the error message instead of a header
+    match = re.search(r"retry in (\d+(?:\.\d+)?)\s*s", str(error), flags=re.IGNORECASE) or re.search(
+        r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error)
+    )
+    return float(match.group(1)) if match else None
+
+# ===== ADAPTIVE RATE LIMITER =====
+
+_background_requests: ContextVar[bool] = ContextVar("background_requests", default=False)
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Send the requests of the enclosed block, and of tasks it starts, at background priority.
+
+    A background request waits while any other request is waiting for the same
+    limiter, and leaves background_reserved_tokens in the bucket, so
+    speculative work never delays the requests of the critical path.
+    """
+    token = _background_requests.set(True)
+    try:
+        yield
+    finally:
+        _background_requests.reset(token)
+
+class AdaptiveRateLimiter(BaseRateLimiter):
+    """
+    Thread-safe token-bucket rate limiter that adapts to 429 responses.
+
+    Tokens refill at the current rate up to max_bucket_size and every request
+    takes one. A 429 multiplies the rate by rate_decrease_factor and blocks all
+    requests for Retry-After seconds (or an exponential backoff); successful
+    requests recover the rate additively up to the base rate. Requests made
+    under background_priority yield to every other request. One instance is
+    shared by all event loops and threads that call the same provider.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        max_bucket_size: float = rate_limit_burst,
+        check_every_n_seconds: float = 0.05,
+        name: str = "",
+    ):
+        self.name = name
+        self.base_rate = requests_per_second
+        self.rate = requests_per_second
+        self.min_rate = requests_per_second * min_rate_fraction
+        self.max_bucket_size = max_bucket_size
+        self.check_every_n_seconds = check_every_n_seconds
+        self.available_tokens = max_bucket_size
+        self.backoff_seconds = initial_backoff_seconds
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self._waiting_requests = 0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _consume(self, background: bool = False) -> bool:
+        """Take a token if one is available and the limiter is not backing off.
+
+        A background request also needs no other request to be waiting and
+        background_reserved_tokens to be left after it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.available_tokens = min(
+                self.max_bucket_size, self.available_tokens + (now - self._last_refill) * self.rate
+            )
+            self._last_refill = now
+            if now < self.blocked_until or self.available_tokens < 1:
+                return False
+            # The reserve never takes the whole bucket, so background requests still get through
+            reserve = min(background_reserved_tokens, self.max_bucket_size - 1)
+            if background and (self._waiting_requests or self.available_tokens < 1 + reserve):
+                return False
+            self.available_tokens -= 1
+            self.requests += 1
+            return True
+
+    @contextmanager
+    def _waiting(self, background: bool) -> Iterator[None]:
+        """Count the enclosed wait for a token, unless it is a background request's."""
+        if background:
+            yield
+            return
+        with self._lock:
+            self._waiting_requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._waiting_requests -= 1
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        background = _background_requests.get()
+        if not blocking:
+            return self._consume(background)
+        waiting_since = time.perf_counter()
+        with self._waiting(background):
+            while not self._consume(background):
+                time.sleep(self.check_every_n_seconds)
+        # Counted as queue wait of the traced request (model call or search)
+        record_queue_wait(time.perf_counter() - waiting_since)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        background = _background_requests.get()
+        if not blocking:
+            return self._consume(background)
+        waiting_since = time.perf_counter()
+        with self._waiting(background):
+            while not self._consume(background):
+                await asyncio.sleep(self.check_every_n_seconds)
+        record_queue_wait(time.perf_counter() - waiting_since)
+        return True
+
+    def penalize(self, retry_after: Optional[float] = None) -> float:
+        """Slow down after a 429 and block requests for the backoff delay.
+
+        Args:
+            retry_after: Delay requested by the provider, if any
+
+        Returns:
+            Seconds until requests are allowed again
+        """
+        with self._lock:
+            self.rate_limited += 1
+            self.rate = max(self.min_rate, self.rate * rate_decrease_factor)
+            if retry_after is None:
+                # Jitter so waiting callers do not retry in lockstep
+                delay = self.backoff_seconds * random.uniform(1.0, 1.5)
+                self.backoff_seconds = min(max_backoff_seconds, self.backoff_seconds * 2)
+            else:
+                delay = retry_after
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.available_tokens = 0
+            return delay
+
+    def reward(self) -> None:
+        """Recover part of the rate after a successful request."""
+        with self._lock:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * rate_recovery_fraction)
+            self.backoff_seconds = initial_backoff_seconds
+
+    @contextmanager
+    def unlimited(self) -> Iterator[None]:
+        """Lift the limit for the enclosed block, e.g. when requests are served locally."""
+        with self._lock:
+            previous = self.base_rate, self.rate, self.max_bucket_size
+            self.base_rate = self.rate = self.max_bucket_size = 1e9
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.base_rate, self.rate, self.max_bucket_size = previous
+                self.available_tokens = min(self.available_tokens, self.max_bucket_size)
+
+    def stats(self) -> dict:
+        """Return the current rate and request/429 counters."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests_per_second": round(self.rate, 3),
+                "base_requests_per_second": self.base_rate,
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "blocked_for_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            }
+
+class RateLimitFeedbackHandler(BaseCallbackHandler):
+    """
+    Callback handler that reports the outcome of every model call to its
+    provider's limiter: success recovers the rate, a 429 slows it down.
+    """
+    run_inline = True
+
+    def __init__(self, limiter: AdaptiveRateLimiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.limiter.reward()
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        if is_rate_limit_error(error):
+            delay = self.limiter.penalize(get_retry_after(error))
+            print(f"{self.limiter.name} rate limited, slowing down and pausing for {delay:.1f}s")
+
+async def arun_with_rate_limit(
+    limiter: AdaptiveRateLimiter,
+    call: Callable[[], Awaitable[T]],
+    max_retries: int = max_rate_limit_retries,
+) -> T:
+    """Run an async provider request through limiter, retrying it on 429.
+
+    Args:
+        limiter: Limiter of the provider
+        call: Coroutine factory sending the request
+        max_retries: Retries after a 429 before the error is raised
+
+    Returns:
+        Result of the request
+    """
+    for attempt in range(max_retries + 1):
+        await limiter.aacquire()
+        try:
+            result = await call()
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            delay = limiter.penalize(get_retry_after(e))
+            print(f"{limiter.name} rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            continue
+        limiter.reward()
+        return result
+
+# ===== API KEYS =====
+
+class CredentialPool:
+    """
+    Round-robin pool of API keys for one provider.
+
+    Keys come from a comma-separated environment variable (e.g.
+    GOOGLE_API_KEYS), falling back to the provider's single-key variable.
+    Keys are read on first use, after .env has been loaded.
+    """
+
+    def __init__(self, keys_env_var: str, key_env_var: str):
+        self.keys_env_var = keys_env_var
+        self.key_env_var = key_env_var
+        self._keys: Optional[List[str]] = None
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    @property
+    def keys(self) -> List[str]:
+        """Configured keys, possibly empty."""
+        with self._lock:
+            if self._keys is None:
+                raw_keys = os.getenv(self.keys_env_var) or os.getenv(self.key_env_var) or ""
+                self._keys = [key.strip() for key in raw_keys.split(",") if key.strip()]
+                self._cycle = itertools.cycle(self._keys)
+            return self._keys
+
+    def next_key(self) -> Optional[str]:
+        """Return the next key in rotation, or None if none are configured."""
+        if not self.keys:
+            return None
+        with self._lock:
+            return next(self._cycle)
+
+# ===== PROVIDERS =====
+
+gemini_rate_limiter = AdaptiveRateLimiter(gemini_requests_per_second, name="Gemini")
+tavily_rate_limiter = AdaptiveRateLimiter(tavily_requests_per_second, name="Tavily")
+
+google_api_keys = CredentialPool("GOOGLE_API_KEYS", "GOOGLE_API_KEY")
+tavily_api_keys = CredentialPool("TAVILY_API_KEYS", "TAVILY_API_KEY")
+
+def init_gemini_model(model: str, api_key: Optional[str] = None, **kwargs: Any) -> BaseChatModel:
+    """Create a Gemini chat model that goes through the shared Gemini limiter.
+
+    A model is bound to one API key. The model registry creates one model per
+    key in GOOGLE_API_KEYS and rotates through them per request (see
+    models.get_model).
+
+    Args:
+        model: Gemini model name
+        api_key: API key of the model, defaults to the next key in rotation
+        **kwargs: Further arguments for init_chat_model
+
+    Returns:
+        Chat model
+    """
+    # Imported here so the provider SDK is only loaded once a model is needed
+    from langchain.chat_models import init_chat_model
+
+    api_key = api_key or google_api_keys.next_key()
+    if api_key:
+        kwargs.setdefault("google_api_key", api_key)
+    kwargs.setdefault("max_retries", gemini_max_attempts)
+    return init_chat_model(
+        model=model,
+        model_provider="google-genai",
+        rate_limiter=gemini_rate_limiter,
+        callbacks=[RateLimitFeedbackHandler(gemini_rate_limiter)],
+        **kwargs,
+    )
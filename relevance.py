@@ -0,0 +1,178 @@
+"""
+Relevance Filtering for Research Agent
+
+This module scores webpage passages against a search query with BM25, entirely
+locally, so pages unrelated to the query are not sent to the summarization
+model, and long pages are reduced to the passages that relate to the query
+before they are summarized.
+"""
+
+import math
+import re
+from collections import Counter
+from typing_extensions import List
+
+# ===== CONFIGURATION =====
+
+# Approximate number of words per passage when splitting a page
+passage_words = 150
+# Pages longer than this many words are reduced to their most relevant passages,
+# so the summarizer sees at most this much of a page for a query. Pages only
+# reach the chunked summarization (utils_agent.summary_chunk_threshold_tokens)
+# when no query is given or none of its terms occur on the page
+max_relevant_words = 3000
+# Pages whose best passage scores below this fraction of the best page are dropped
+min_relevance_ratio = 0.2
+# BM25 parameters
+bm25_k1 = 1.5
+bm25_b = 0.75
+
+# Common words that carry no relevance signal
+stopwords = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were",
+    "will", "with", "what", "which", "who", "how", "this", "these", "those",
+}
+
+# ===== TEXT PROCESSING =====
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text and split it into word tokens without stopwords."""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in stopwords]
+
+def split_passages(text: str, words_per_passage: int = passage_words) -> List[str]:
+    """Split text into passages of roughly words_per_passage words.
+
+    Short paragraphs are merged and long ones are cut, so passages have
+    comparable lengths for scoring.
+
+    Args:
+        text: Raw webpage content
+        words_per_passage: Target passage length in words
+
+    Returns:
+        List of passages in document order
+    """
+    passages = []
+    current: List[str] = []
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        while words:
+            space = words_per_passage - len(current)
+            current.extend(words[:space])
+            words = words[space:]
+            if len(current) >= words_per_passage:
+                passages.append(" ".join(current))
+                current = []
+        # Keep paragraph boundaries once a passage is reasonably full
+        if len(current) >= words_per_passage // 2:
+            passages.append(" ".join(current))
+            current = []
+
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+# ===== SCORING =====
+
+class BM25:
+    """
+    Okapi BM25 index over a small in-memory corpus of tokenized passages.
+    """
+
+    def __init__(self, documents: List[List[str]], k1: float = bm25_k1, b: float = bm25_b):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0.0
+
+        document_frequencies = Counter(term for document in documents for term in set(document))
+        n = len(documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequencies.items()
+        }
+
+    def scores(self, query_tokens: List[str]) -> List[float]:
+        """Return the BM25 score of every document for the query."""
+        scores = []
+        for frequencies, length in zip(self.term_frequencies, self.lengths):
+            normalization = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            score = 0.0
+            for term in query_tokens:
+                frequency = frequencies.get(term, 0)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + normalization)
+            scores.append(score)
+        return scores
+
+def select_relevant_pages(query: str, pages: dict) -> dict:
+    """Keep only the pages relevant to a query.
+
+    Passages of all pages are scored together against the query. A page whose
+    best passage scores below min_relevance_ratio of the best page is dropped.
+    Kept pages are returned unchanged, so their summaries can be cached and
+    shared by URL and content regardless of the query. If no page matches any
+    query term, all pages are kept.
+
+    Args:
+        query: Search query the pages were retrieved for
+        pages: Dictionary mapping URLs to raw webpage content
+
+    Returns:
+        Dictionary mapping the URLs of kept pages to their raw content
+    """
+    query_tokens = tokenize(query)
+    if not pages or not query_tokens:
+        return dict(pages)
+
+    passages_by_url = {url: split_passages(content) for url, content in pages.items()}
+    corpus = [
+        (url, passage) for url, passages in passages_by_url.items() for passage in passages
+    ]
+    scores = BM25([tokenize(passage) for _, passage in corpus]).scores(query_tokens)
+
+    best_by_url = {url: 0.0 for url in pages}
+    for (url, _), score in zip(corpus, scores):
+        best_by_url[url] = max(best_by_url[url], score)
+
+    best_score = max(best_by_url.values(), default=0.0)
+    if best_score <= 0:
+        return dict(pages)
+    return {url: pages[url] for url in pages if best_by_url[url] >= min_relevance_ratio * best_score}
+
+def select_relevant_passages(query: str, content: str, max_words: int = max_relevant_words) -> str:
+    """Reduce a page longer than max_words to its passages most relevant to a query.
+
+    Passages are scored with BM25 and the best ones are kept, in document
+    order, up to max_words. Pages within max_words, and pages that match no
+    query term, are returned unchanged.
+
+    Args:
+        query: Search query the page was retrieved for
+        content: Raw webpage content
+        max_words: Word budget of the reduced page
+
+    Returns:
+        Content to summarize
+    """
+    query_tokens = tokenize(query)
+    if len(content.split()) <= max_words or not query_tokens:
+        return content
+
+    passages = split_passages(content)
+    scores = BM25([tokenize(passage) for passage in passages]).scores(query_tokens)
+    if max(scores, default=0.0) <= 0:
+        return content
+
+    selected = []
+    words = 0
+    for i in sorted(range(len(passages)), key=lambda i: scores[i], reverse=True):
+        passage_length = len(passages[i].split())
+        if words + passage_length > max_words:
+            break
+        selected.append(i)
+        words += passage_length
+    return "\n\n...\n\n".join(passages[i] for i in sorted(selected))
@@ -1,6 +1,6 @@
 from typing_extensions import Literal
 
-from langchain.chat_models import init_chat_model
+from models import get_structured_model
 from langchain_core.messages import HumanMessage, AIMessage, get_buffer_string
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
@@ -8,11 +8,7 @@ from state import AgentState
 from schema import ClarifyWithUser, ResearchQuestion
 from prompts import clarify_with_user_instructions, transform_messages_into_research_topic_prompt
 from utils_agent import get_today_str
-
-# ===== CONFIGURATION =====
-
-# Initialize model
-model = init_chat_model(model="gemini-2.5-flash", model_provider="google-genai")
+from prefetch import start_prefetch
 
 # ===== WORKFLOW NODES =====
 
@@ -24,7 +20,7 @@ def clarify_with_user(state: AgentState) -> Command[Literal["write_research_brie
     Routes to either research brief generation or ends with a clarification question.
     """
     # Set up structured output model
-    structured_output_model = model.with_structured_output(ClarifyWithUser)
+    structured_output_model = get_structured_model("brief", ClarifyWithUser)
 
     # Invoke the model with clarification instructions
     response = structured_output_model.invoke([
@@ -46,23 +42,28 @@ def clarify_with_user(state: AgentState) -> Command[Literal["write_research_brie
             update={"messages": [AIMessage(content=response.verification)]} # type: ignore
         )
 
-def write_research_brief(state: AgentState):
+async def write_research_brief(state: AgentState):
     """
     Transform the conversation history into a comprehensive research brief.
     
     Uses structured output to ensure the brief follows the required format
-    and contains all necessary details for effective research.
+    and contains all necessary details for effective research. Once the brief
+    is written, likely searches are prefetched in the background (see
+    prefetch.py) while the supervisor plans the research.
     """
     # Set up structured output model
-    structured_output_model = model.with_structured_output(ResearchQuestion)
+    structured_output_model = get_structured_model("brief", ResearchQuestion)
     
     # Generate research brief from conversation history
-    response = structured_output_model.invoke([
+    response = await structured_output_model.ainvoke([
         HumanMessage(content=transform_messages_into_research_topic_prompt.format(
             messages=get_buffer_string(state.get("messages", [])),
             date=get_today_str()
         ))
     ])
+
+    # Warm the caches for the researchers' first searches during the supervisor's turn
+    start_prefetch(response.research_brief) # type: ignore
     
     # Update state with generated research brief and pass it to the supervisor
     return {
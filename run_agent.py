@@ -1,10 +1,22 @@
 import asyncio
+import argparse
+import uuid
+from typing_extensions import Optional
+from dotenv import load_dotenv
+load_dotenv()  # before the agent modules read their settings from the environment
 from supervisor_agent import supervisor_agent
 from utils_display import format_messages
 from rich.markdown import Markdown
 from rich.console import Console
+from rich.live import Live
 from langchain_core.messages import HumanMessage
-from final_report import full_agent
+from final_report import open_full_agent, has_pending_work, finish_thread
+from run_context import research_run_scope
+from streaming import stream_research
+from batch import run_batch, default_batch_concurrency, default_output_dir
+from cassettes import cassette_from_environment
+from tracing import get_tracer, write_trace
+from utils_agent import cache_stats
 
 # Example research brief for coffee shops (kept for reference)
 # research_brief = """I want to identify and evaluate the coffee shops in San Francisco..."""
@@ -26,24 +38,128 @@ Focus on practical, high-impact AI solutions that align with ITC's business mode
 
 # Legacy code - using new market research system instead
 
-async def main():
+async def run_with_live_report(full_agent, agent_input, thread: dict, console: Console) -> dict:
+    """Run (or resume, with agent_input=None) a thread, rendering the report as it streams.
+
+    A report that was not streamed (e.g. written before the run was resumed)
+    is rendered once the run completes, so the report is always shown here.
+    """
+    report = ""
+    result = None
+
+    with Live(Markdown(report), console=console, refresh_per_second=8, vertical_overflow="visible") as live:
+        async for event in stream_research(full_agent, agent_input, thread):
+            if event["type"] == "report_token":
+                report += event["text"]
+                live.update(Markdown(report))
+            elif event["type"] == "final_state":
+                result = event["state"]
+                if not report and result.get("final_report"):
+                    live.update(Markdown(result["final_report"]))
+
+    await finish_thread(full_agent, thread)
+    return result
+
+def print_cost(console: Console, cost_ledger: dict) -> None:
+    """Print the cost of a run and its breakdown by model role."""
+    console.print(
+        f"\n💰 Cost: ${cost_ledger['cost_usd']:.4f} "
+        f"({cost_ledger['input_tokens'] + cost_ledger['output_tokens']:,} tokens, {cost_ledger['search_credits']} search credits)",
+        style="bold blue",
+    )
+    for role, usage in cost_ledger["by_role"].items():
+        console.print(f"   {role}: ${usage['cost_usd']:.4f} over {usage['model_calls']} calls")
+    active_caps = {cap: limit for cap, limit in cost_ledger["spend_caps"].items() if limit}
+    if active_caps:
+        console.print("   Spend caps: " + ", ".join(f"{cap}={limit:g}" for cap, limit in active_caps.items()))
+    if cost_ledger["cap_reached"]:
+        console.print(f"   Research stopped early: spend cap {cost_ledger['cap_reached']} reached", style="bold yellow")
+
+def print_cache_stats(console: Console, caches: dict) -> None:
+    """Print the hit rate of the summary and search caches over this run."""
+    console.print(
+        "🗄️  Cache hits: " + ", ".join(
+            f"{name} {stats['hits']}/{stats['hits'] + stats['misses']} ({stats['hit_rate']:.0%}, {stats['entries']} entries)"
+            for name, stats in caches.items()
+        ),
+        style="bold blue",
+    )
+
+async def main(thread_id: str, resume: bool = False, trace_path: Optional[str] = None, spend_caps: Optional[dict] = None):
     console = Console()
     
-    console.print("\n🚀 Starting Market Research & Use Case Generation for ITC Limited...", style="bold blue")
-    console.print("This comprehensive analysis will include industry research, AI use case generation, resource collection, and final proposal synthesis.\n")
-    
     # Execute the market research process
 
-    thread = {"configurable": {"thread_id": "1", "recursion_limit": 50}}
+    thread = {"configurable": {"thread_id": thread_id, "recursion_limit": 50}}
+
+    async with open_full_agent() as full_agent:
+        with research_run_scope(spend_caps):
+            tracer = get_tracer()
+            if resume:
+                if not await has_pending_work(full_agent, thread):
+                    console.print(f"\nThread {thread_id} has no interrupted run to resume.", style="bold yellow")
+                    return
+                console.print(f"\n🔁 Resuming interrupted research thread {thread_id}...", style="bold blue")
+                result = await run_with_live_report(full_agent, None, thread, console)
+            else:
+                console.print("\n🚀 Starting Market Research & Use Case Generation for ITC Limited...", style="bold blue")
+                console.print("This comprehensive analysis will include industry research, AI use case generation, resource collection, and final proposal synthesis.")
+                console.print(f"Thread id: {thread_id} (resume with --resume --thread-id {thread_id})\n")
+                result = await run_with_live_report(
+                    full_agent, {"messages": [HumanMessage(content=market_research_query)]}, thread, console
+                )
 
-    result = await full_agent.ainvoke({"messages": [HumanMessage(content=market_research_query)]}, config=thread)
-    format_messages(result['messages'])
+    if trace_path:
+        json_path, metrics_path = write_trace(tracer, trace_path)
+        console.print(f"\nTrace written to {json_path} (metrics: {metrics_path})", style="bold blue")
 
-    Markdown(result["final_report"])
+    # The report was already rendered live, so only the conversation leading to it is printed
+    final_report = result.get("final_report")
+    format_messages([
+        message for message in result['messages']
+        if not (final_report and isinstance(message.content, str) and message.content.endswith(final_report))
+    ])
+    if result.get("cost_ledger"):
+        print_cost(console, result["cost_ledger"])
+    print_cache_stats(console, cache_stats())
     
     console.print("\n✅ Market Research & Use Case Generation Complete!", style="bold green")
 
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the market research agent.")
+    parser.add_argument("--thread-id", default=None, help="Thread id used to checkpoint the run (default: a new id)")
+    parser.add_argument("--resume", action="store_true", help="Resume the interrupted run of --thread-id from its last completed node")
+    parser.add_argument("--batch", default=None, help="CSV or JSONL file of companies/queries to research in batch")
+    parser.add_argument("--concurrency", type=int, default=default_batch_concurrency, help="Batch items researched at the same time")
+    parser.add_argument("--output-dir", default=str(default_output_dir), help="Directory for batch reports and metadata")
+    parser.add_argument("--max-cost", type=float, default=None, metavar="USD", help="Stop researching once the run has cost this much and write the report from the notes so far")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Same, once the run has used this many model tokens")
+    parser.add_argument("--max-search-credits", type=int, default=None, help="Same, once the run has used this many Tavily credits")
+    parser.add_argument("--trace", default=None, metavar="PATH", help="Write the run's JSON trace to PATH and its Prometheus metrics next to it (.prom)")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", default=None, metavar="CASSETTE", help="Record every model call and search of the run to this file")
+    cassette_group.add_argument("--replay", default=None, metavar="CASSETTE", help="Replay a recorded run offline from this file")
+    args = parser.parse_args()
+
+    if args.resume and not args.thread_id:
+        parser.error("--resume requires --thread-id")
+
+    # Caps given on the command line override the MARKET_RESEARCH_MAX_* environment variables
+    spend_caps = {
+        cap: limit for cap, limit in {
+            "max_cost_usd": args.max_cost,
+            "max_tokens": args.max_tokens,
+            "max_search_credits": args.max_search_credits,
+        }.items() if limit is not None
+    }
+
+    cassette_mode = "record" if args.record else "replay" if args.replay else None
+    with cassette_from_environment(args.record or args.replay, cassette_mode):
+        if args.batch:
+            # Re-running the same batch skips completed items and resumes interrupted ones
+            asyncio.run(run_batch(args.batch, output_dir=args.output_dir, concurrency=args.concurrency, spend_caps=spend_caps))
+        else:
+            asyncio.run(main(args.thread_id or f"cli-{uuid.uuid4().hex[:8]}", resume=args.resume, trace_path=args.trace,
+                             spend_caps=spend_caps))
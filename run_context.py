@@ -0,0 +1,172 @@
+"""
+Run-scoped Context for Research Agent
+
+This module holds state that is shared by every researcher taking part in a
+single run, such as the registry of webpages already fetched. The state lives
+in context variables, so it follows the run into every graph node and
+parallel researcher without being stored in graph state or checkpoints.
+"""
+
+import asyncio
+from collections.abc import Coroutine
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing_extensions import Awaitable, Callable, Iterator, Optional
+
+from ledger import ledger_scope
+from tracing import tracing_scope
+
+# ===== URL REGISTRY =====
+
+class SummaryAbandoned(Exception):
+    """Raised to researchers waiting for a page whose summarizing researcher was cancelled."""
+
+class UrlRegistry:
+    """
+    Registry of the webpages summarized during one research run.
+
+    Pages are keyed by canonical URL, plus a hash of the passages summarized
+    when a long page was reduced for a query. The first researcher to request a page
+    summarizes it; any researcher asking for the same page later, or while the
+    summary is still in progress, awaits that same summary instead of fetching
+    and summarizing the page again. If the summarizing researcher fails, the
+    waiters get its error; if it is cancelled, the first waiter summarizes
+    the page itself.
+    """
+
+    def __init__(self):
+        self._pages: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._pages
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    async def get_or_summarize(self, url: str, summarize: Callable[[], Awaitable[str]]) -> str:
+        """Return the registered summary for url, producing it at most once per run.
+
+        Args:
+            url: Canonical URL of the webpage
+            summarize: Coroutine factory that summarizes the page
+
+        Returns:
+            Summary content for the page
+        """
+        while (future := self._pages.get(url)) is not None:
+            try:
+                # Shield so a cancelled waiter does not cancel the shared summary
+                content = await asyncio.shield(future)
+            except SummaryAbandoned:
+                # The summarizing researcher was cancelled: summarize the page here
+                continue
+            self.hits += 1
+            return content
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Mark the error as retrieved, for when no researcher was waiting
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._pages[url] = future
+        try:
+            content = await summarize()
+        except BaseException as e:
+            # Let a later request retry the page instead of waiting forever
+            del self._pages[url]
+            future.set_exception(SummaryAbandoned() if isinstance(e, asyncio.CancelledError) else e)
+            raise
+
+        future.set_result(content)
+        return content
+
+    def stats(self) -> dict:
+        """Return the number of registered pages and registry hits/misses."""
+        return {"pages": len(self._pages), "hits": self.hits, "misses": self.misses}
+
+_current_url_registry: ContextVar[Optional[UrlRegistry]] = ContextVar("url_registry", default=None)
+
+def get_url_registry() -> Optional[UrlRegistry]:
+    """Return the URL registry of the current run, if one is active."""
+    return _current_url_registry.get()
+
+@contextmanager
+def ensure_url_registry() -> Iterator[UrlRegistry]:
+    """Use the current run's URL registry, or start one for the enclosed block."""
+    registry = _current_url_registry.get()
+    if registry is not None:
+        yield registry
+        return
+
+    token = _current_url_registry.set(UrlRegistry())
+    try:
+        yield _current_url_registry.get()
+    finally:
+        _current_url_registry.reset(token)
+
+# ===== BACKGROUND TASKS =====
+
+_current_background_tasks: ContextVar[Optional[set]] = ContextVar("background_tasks", default=None)
+
+def run_in_background(coro: Coroutine) -> Optional[asyncio.Task]:
+    """Start a task that belongs to the current run, such as a prefetch.
+
+    A task still running when the run scope exits is cancelled, so it never
+    outlives the run (or the models and caches the run was started with).
+
+    Args:
+        coro: Coroutine to run
+
+    Returns:
+        The task, or None outside a run scope, where the coroutine is not run
+    """
+    tasks = _current_background_tasks.get()
+    if tasks is None:
+        coro.close()
+        return None
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+def cancel_background_tasks(tasks: set) -> None:
+    """Cancel the unfinished tasks of a run, from any thread."""
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    for task in list(tasks):
+        loop = task.get_loop()
+        if task.done() or loop.is_closed():
+            continue
+        if loop is running_loop:
+            task.cancel()
+        else:
+            loop.call_soon_threadsafe(task.cancel)
+
+# ===== RUN SCOPE =====
+
+@contextmanager
+def research_run_scope(spend_caps: Optional[dict] = None) -> Iterator[None]:
+    """Scope a full research run so all of its researchers share run-wide state.
+
+    Wrap each invocation of the research graphs in this context manager; every
+    node and researcher started inside it sees the same URL registry, is
+    traced by the run's tracer (see tracing.get_tracer) and charged to the
+    run's cost ledger (see ledger.get_ledger). Background tasks started with
+    run_in_background are cancelled when the scope exits.
+
+    Args:
+        spend_caps: Spend caps of the run, overriding ledger.default_spend_caps
+    """
+    token = _current_url_registry.set(UrlRegistry())
+    background_tasks = set()
+    tasks_token = _current_background_tasks.set(background_tasks)
+    try:
+        with tracing_scope(), ledger_scope(spend_caps):
+            yield
+    finally:
+        cancel_background_tasks(background_tasks)
+        _current_background_tasks.reset(tasks_token)
+        _current_url_registry.reset(token)
@@ -0,0 +1,106 @@
+"""
+Researcher Scheduler for Research Agent
+
+This module caps how many researcher subgraphs run at the same time. Research
+tasks beyond the cap wait in a queue until a slot frees up, and the scheduler
+records how long each researcher queued and ran.
+"""
+
+import asyncio
+import time
+import weakref
+from collections import deque
+from typing_extensions import Any, Awaitable, Callable
+
+from tracing import record_queue_wait, trace_researcher
+
+# ===== SCHEDULER =====
+
+class ResearcherScheduler:
+    """
+    Bounded scheduler for researcher subgraphs.
+
+    At most max_concurrent researchers run at once on each event loop (so the
+    cap holds across runs sharing a process and loop, such as batch jobs);
+    the overflow waits in FIFO order. Current queue depth and recent
+    per-researcher timings are available from stats().
+    """
+
+    def __init__(self, max_concurrent: int, history_size: int = 100):
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        self.queued = 0
+        self.history: deque[dict] = deque(maxlen=history_size)
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Return the semaphore bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def set_capacity(self, max_concurrent: int) -> None:
+        """Set the cap of the running event loop, e.g. for a batch running several runs on it.
+
+        Call before any researcher runs on the loop; researchers already
+        holding a slot of the previous cap are not counted against the new one.
+        """
+        self._semaphores[asyncio.get_running_loop()] = asyncio.Semaphore(max_concurrent)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of researchers waiting for a free slot."""
+        return self.queued
+
+    async def run(self, research_topic: str, start_researcher: Callable[[], Awaitable[Any]]) -> tuple[Any, dict]:
+        """Run one researcher once a slot is free.
+
+        Args:
+            research_topic: Topic of the researcher, recorded with its timings
+            start_researcher: Coroutine factory that runs the researcher subgraph
+
+        Returns:
+            Tuple of the researcher result and its timing record
+        """
+        semaphore = self._semaphore()
+        submitted_at = time.perf_counter()
+        record = {
+            "research_topic": research_topic,
+            "queue_depth_at_submit": self.queued,
+            "status": "completed",
+        }
+
+        # Traced as one researcher span; everything it runs carries its researcher id
+        with trace_researcher(research_topic):
+            self.queued += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self.queued -= 1
+
+            started_at = time.perf_counter()
+            record["queued_seconds"] = round(started_at - submitted_at, 3)
+            record_queue_wait(started_at - submitted_at)
+            self.running += 1
+            try:
+                return await start_researcher(), record
+            except BaseException:
+                record["status"] = "failed"
+                raise
+            finally:
+                self.running -= 1
+                semaphore.release()
+                record["wall_seconds"] = round(time.perf_counter() - started_at, 3)
+                self.history.append(record)
+
+    def stats(self) -> dict:
+        """Return the current load and the most recent researcher timings."""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": self.running,
+            "queued": self.queued,
+            "recent_runs": list(self.history),
+        }
@@ -20,13 +20,31 @@ class ResearcherState(TypedDict):
     
     This state tracks the researcher's conversation, iteration count for limiting
     tool calls, the research topic being investigated, compressed findings,
-    and raw research notes for detailed analysis.
+    raw research notes for detailed analysis, and context management details.
     """
     researcher_messages: Annotated[Sequence[BaseMessage], add_messages]
     tool_call_iterations: int
     research_topic: str
     compressed_research: str
     raw_notes: Annotated[List[str], operator.add]
+    # Condensed older tool outputs used when the context budget is exceeded
+    research_digest: str
+    # Estimated prompt tokens saved by context management on each LLM turn
+    context_tokens_saved: Annotated[List[int], operator.add]
+    # Budget counters: searches issued, researcher model tokens and start time
+    search_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    research_started_at: float
+    # Why the researcher stopped ("completed" or the budget limit that was hit)
+    stop_reason: str
+    # Rolling compression written after each tool step: the tool calls made,
+    # the findings of each step, the sources cited (URL to title, in citation
+    # order) and the number of researcher messages covered (see agent.update_compression)
+    rolling_queries: List[str]
+    rolling_findings: List[str]
+    rolling_sources: dict[str, str]
+    compressed_message_count: int
 
 class ResearcherOutputState(TypedDict):
     """
@@ -38,6 +56,11 @@ class ResearcherOutputState(TypedDict):
     compressed_research: str
     raw_notes: Annotated[List[str], operator.add]
     researcher_messages: Annotated[Sequence[BaseMessage], add_messages]
+    context_tokens_saved: Annotated[List[int], operator.add]
+    search_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    stop_reason: str
 
 # --- Supervisor Layer State ---
 
@@ -59,6 +82,8 @@ class SupervisorState(TypedDict):
     research_iterations: int = 0
     # Raw unprocessed research notes collected from sub-agent research
     raw_notes: Annotated[list[str], operator.add] = []
+    # Queue wait and wall time of every researcher launched by the supervisor
+    researcher_runs: Annotated[list[dict], operator.add] = []
 
 class AgentState(MessagesState):
     """
@@ -79,6 +104,10 @@ class AgentState(MessagesState):
     notes: Annotated[list[str], operator.add] = []
     # Final formatted research report
     final_report: str
+    # Queue wait and wall time of every researcher launched by the supervisor
+    researcher_runs: Annotated[list[dict], operator.add] = []
+    # Tokens, search credits and cost of the run (see ledger.CostLedger.snapshot)
+    cost_ledger: dict
 
 class AgentInputState(MessagesState):
     """Input state for the full agent - only contains messages from user input."""
@@ -0,0 +1,178 @@
+"""
+Streaming Helpers for Research Agent
+
+This module runs the full research graph in streaming mode and turns the raw
+LangGraph stream into simple events that the CLI and Streamlit front ends can
+render as they arrive: live progress (current node, researchers, searches,
+sources and per-stage timings) and the tokens of the final report.
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing_extensions import Any, AsyncIterator, Optional
+
+from langchain_core.messages import AIMessageChunk, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+
+from blob_store import hydrate
+
+# Node whose model tokens make up the final report
+report_node = "final_report_generation"
+
+# Top-level stages of the full agent, in execution order
+research_stages = [
+    "clarify_with_user",
+    "write_research_brief",
+    "supervisor_subgraph",
+    "final_report_generation",
+]
+
+# ===== HELPERS =====
+
+def message_text(content: Any) -> str:
+    """Extract the plain text of a message or chunk content."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block if isinstance(block, str) else block.get("text", "")
+            for block in content
+            if isinstance(block, str) or block.get("type") == "text"
+        )
+    return str(content)
+
+# ===== PROGRESS TRACKING =====
+
+@dataclass
+class ResearchProgress:
+    """
+    Live progress of a research run, built from LangGraph update events.
+
+    Tracks the stage and node currently running, the researchers spawned by
+    the supervisor, searches issued, unique sources found and the wall time of
+    every completed top-level stage.
+    """
+    started_at: float = field(default_factory=time.time)
+    current_stage: str = research_stages[0]
+    current_node: str = ""
+    research_topics: list[str] = field(default_factory=list)
+    active_researchers: set[str] = field(default_factory=set)
+    searches_issued: int = 0
+    sources: set[str] = field(default_factory=set)
+    stage_timings: dict[str, float] = field(default_factory=dict)
+    _stage_started_at: float = field(default_factory=time.time)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Wall time since the run started."""
+        return time.time() - self.started_at
+
+    @property
+    def stage_elapsed_seconds(self) -> float:
+        """Wall time spent so far in the current stage."""
+        return time.time() - self._stage_started_at
+
+    def update(self, namespace: tuple, node: str, update: Optional[dict]) -> None:
+        """Fold one LangGraph update event into the progress.
+
+        Args:
+            namespace: Subgraph namespace of the event (empty for the top level)
+            node: Name of the node that produced the update
+            update: State update returned by the node
+        """
+        self.current_node = node
+        update = update or {}
+
+        if not namespace:
+            # Top-level stages run one after another, so a stage ends when its update arrives
+            now = time.time()
+            self.stage_timings[node] = round(now - self._stage_started_at, 3)
+            self._stage_started_at = now
+            if node in research_stages and research_stages.index(node) + 1 < len(research_stages):
+                self.current_stage = research_stages[research_stages.index(node) + 1]
+            return
+
+        self.current_stage = namespace[0].split(":")[0]
+        researcher_id = "|".join(namespace) if len(namespace) > 1 else None
+
+        for message in update.get("supervisor_messages", []) or []:
+            for tool_call in getattr(message, "tool_calls", None) or []:
+                if tool_call["name"] == "ConductResearch":
+                    self.research_topics.append(tool_call["args"].get("research_topic", ""))
+
+        for message in update.get("researcher_messages", []) or []:
+            for tool_call in getattr(message, "tool_calls", None) or []:
+                if tool_call["name"] == "tavily_search":
+                    self.searches_issued += 1
+            if isinstance(message, ToolMessage):
+                self.sources.update(re.findall(r"^URL: (\S+)$", hydrate(str(message.content)), flags=re.MULTILINE))
+
+        if researcher_id:
+            if node == "compress_research":
+                self.active_researchers.discard(researcher_id)
+            else:
+                self.active_researchers.add(researcher_id)
+
+    def snapshot(self) -> dict:
+        """Return a plain-dict view of the progress for display or storage."""
+        return {
+            "current_stage": self.current_stage,
+            "current_node": self.current_node,
+            "elapsed_seconds": round(self.elapsed_seconds, 1),
+            "stage_elapsed_seconds": round(self.stage_elapsed_seconds, 1),
+            "researchers_spawned": len(self.research_topics),
+            "researchers_active": len(self.active_researchers),
+            "research_topics": list(self.research_topics),
+            "searches_issued": self.searches_issued,
+            "sources_found": len(self.sources),
+            "stage_timings": dict(self.stage_timings),
+        }
+
+# ===== STREAMING =====
+
+async def stream_research(
+    agent: CompiledStateGraph,
+    agent_input: Optional[dict],
+    config: RunnableConfig,
+    progress: Optional[ResearchProgress] = None,
+) -> AsyncIterator[dict]:
+    """Run the full agent and yield events as the run progresses.
+
+    Events are dictionaries with a "type" key:
+    - "progress": {"node": ..., "progress": ...} after every node of every
+      graph (including supervisor and researcher subgraphs)
+    - "report_token": {"text": ...} for each token of the final report
+    - "final_state": {"state": ..., "progress": ...} once, with the final graph
+      state and the final progress including per-stage timings
+
+    Args:
+        agent: Compiled full agent
+        agent_input: Graph input, or None to resume an interrupted thread
+        config: Run config with the thread_id
+        progress: Progress tracker to update, a new one is created if omitted
+
+    Yields:
+        Progress events in the order they occur
+    """
+    progress = progress or ResearchProgress()
+    final_state = None
+
+    async for namespace, mode, payload in agent.astream(
+        agent_input, config=config, stream_mode=["updates", "messages", "values"], subgraphs=True
+    ):
+        if mode == "updates":
+            for node, update in payload.items():
+                progress.update(namespace, node, update if isinstance(update, dict) else None)
+                yield {"type": "progress", "node": node, "progress": progress.snapshot()}
+        elif mode == "messages":
+            chunk, metadata = payload
+            if not namespace and metadata.get("langgraph_node") == report_node and isinstance(chunk, AIMessageChunk):
+                text = message_text(chunk.content)
+                if text:
+                    yield {"type": "report_token", "text": text}
+        elif mode == "values" and not namespace:
+            final_state = payload
+
+    yield {"type": "final_state", "state": final_state, "progress": progress.snapshot()}
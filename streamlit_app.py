@@ -1,11 +1,18 @@
 import streamlit as st
 import asyncio
 import re
+import time
+import uuid
 from datetime import datetime
+from dotenv import load_dotenv
+load_dotenv()  # before the agent modules read their settings from the environment
 
 # Import your existing agent modules
-from final_report import full_agent
-from langchain_core.messages import HumanMessage
+from final_report import open_full_agent, has_pending_work
+from jobs import ResearchJobManager
+
+# Seconds between refreshes of the page while a research job is running
+job_poll_interval = 1.0
 
 # ===== STREAMLIT CONFIGURATION =====
 st.set_page_config(
@@ -57,6 +64,22 @@ if 'research_results' not in st.session_state:
     st.session_state.research_results = None
 if 'research_in_progress' not in st.session_state:
     st.session_state.research_in_progress = False
+if 'research_progress' not in st.session_state:
+    st.session_state.research_progress = None
+if 'thread_id' not in st.session_state:
+    # Restore the thread of the last run after a page refresh or app restart
+    st.session_state.thread_id = st.query_params.get("thread")
+if 'job_id' not in st.session_state:
+    # Reattach to a job that is still running after a page refresh
+    st.session_state.job_id = st.query_params.get("job")
+if 'resumable_threads' not in st.session_state:
+    # Whether each thread has unfinished work, checked once instead of on every rerun
+    st.session_state.resumable_threads = {}
+
+@st.cache_resource
+def get_job_manager() -> ResearchJobManager:
+    """Job manager shared by every session of this deployment"""
+    return ResearchJobManager()
 
 # ===== UTILITY FUNCTIONS =====
 
@@ -71,32 +94,100 @@ def extract_clickable_links(text: str) -> str:
     
     return re.sub(url_pattern, replace_url, text)
 
-# ===== MAIN RESEARCH FUNCTION =====
+def format_stage_name(node: str) -> str:
+    """Turn a graph node name into a readable stage label"""
+    return node.replace("_", " ").capitalize()
 
-async def run_research(query: str):
-    """Run the research process"""
-    try:
-        st.session_state.research_in_progress = True
-        
-        # Create thread configuration
-        thread = {"configurable": {"thread_id": "streamlit_session", "recursion_limit": 50}}
-        
-        # Run the research
-        result = await full_agent.ainvoke(
-            {"messages": [HumanMessage(content=query)]}, 
-            config=thread
+def render_progress(progress_placeholder, progress: dict):
+    """Render live research progress: current node, counters and stage timings"""
+    with progress_placeholder.container():
+        st.markdown(
+            f"**{format_stage_name(progress['current_stage'])}** · "
+            f"`{progress['current_node'] or 'starting'}` · "
+            f"{progress['stage_elapsed_seconds']:.0f}s in stage, {progress['elapsed_seconds']:.0f}s total"
         )
-        
-        # Store results
-        st.session_state.research_results = result
-        st.session_state.research_in_progress = False
-        
-        return result
-        
-    except Exception as e:
-        st.error(f"Research failed: {str(e)}")
+        researchers, searches, sources = st.columns(3)
+        researchers.metric(
+            "Researchers", progress["researchers_spawned"],
+            help=f"{progress['researchers_active']} currently running",
+        )
+        searches.metric("Searches", progress["searches_issued"])
+        sources.metric("Sources", progress["sources_found"])
+        if progress["stage_timings"]:
+            st.caption(" · ".join(
+                f"{format_stage_name(stage)}: {seconds:.1f}s"
+                for stage, seconds in progress["stage_timings"].items()
+            ))
+
+# ===== MAIN RESEARCH FUNCTION =====
+
+def start_research(query: str, resume: bool = False):
+    """Submit a research run for this session to the background job manager.
+
+    A new run gets its own checkpointed thread; resuming continues the
+    interrupted thread of this session.
+    """
+    if not resume:
+        st.session_state.thread_id = f"streamlit-{uuid.uuid4().hex}"
+    job = get_job_manager().submit(query, thread_id=st.session_state.thread_id, resume=resume)
+    st.session_state.resumable_threads.pop(job.thread_id, None)
+
+    st.session_state.job_id = job.job_id
+    st.session_state.research_results = None
+    st.session_state.research_progress = None
+    st.session_state.research_in_progress = True
+    st.query_params["thread"] = job.thread_id
+    st.query_params["job"] = job.job_id
+
+def poll_research_job(report_placeholder, progress_placeholder):
+    """Show the state of this session's job, collecting its result once it has finished.
+
+    Returns True while the job is still queued or running.
+    """
+    job = get_job_manager().get(st.session_state.job_id)
+    if job is None:
+        # The job finished long ago or the server restarted; resuming is offered instead
+        st.session_state.job_id = None
         st.session_state.research_in_progress = False
-        return None
+        st.session_state.resumable_threads.pop(st.session_state.thread_id, None)
+        st.query_params.pop("job", None)
+        return False
+
+    if not job.done:
+        st.session_state.research_in_progress = True
+        if job.progress:
+            render_progress(progress_placeholder, job.progress)
+        if job.report:
+            report_placeholder.markdown(job.report + " ▌")
+        return True
+
+    # Store results
+    st.session_state.job_id = None
+    st.session_state.research_in_progress = False
+    st.session_state.resumable_threads.pop(job.thread_id, None)
+    st.query_params.pop("job", None)
+    if job.status == "failed":
+        st.error(f"Research failed: {job.error}")
+    else:
+        st.session_state.research_results = job.result
+        st.session_state.research_progress = job.progress
+    return False
+
+async def can_resume(thread_id: str) -> bool:
+    """Check whether a thread was interrupted before finishing"""
+    thread = {"configurable": {"thread_id": thread_id}}
+    async with open_full_agent() as full_agent:
+        return await has_pending_work(full_agent, thread)
+
+def thread_can_resume(thread_id: str) -> bool:
+    """Check whether a thread was interrupted, remembering the answer for this session.
+
+    The cached answer is dropped whenever a job of the thread starts or finishes.
+    """
+    resumable_threads = st.session_state.resumable_threads
+    if thread_id not in resumable_threads:
+        resumable_threads[thread_id] = asyncio.run(can_resume(thread_id))
+    return resumable_threads[thread_id]
 
 # ===== MAIN APP =====
 
@@ -111,6 +202,11 @@ def main():
     
     # Main layout: Left (Input) and Right (Output) in 1:3 ratio
     col1, col2 = st.columns([1, 3])
+
+    # The report streams into this placeholder while research is running
+    with col2:
+        progress_placeholder = st.empty()
+        report_placeholder = st.empty()
     
     # Left Column - Input Panel
     with col1:
@@ -122,13 +218,28 @@ def main():
             key="query_input"
         )
         
+        job_running = st.session_state.job_id is not None and poll_research_job(
+            report_placeholder, progress_placeholder
+        )
+
         # Button row
-        if st.button("Start Research", type="primary", use_container_width=True):
+        if st.button("Start Research", type="primary", use_container_width=True, disabled=job_running):
             if query.strip():
-                asyncio.run(run_research(query))
+                start_research(query)
                 st.rerun()
             else:
                 st.error("Please enter a research query first.")
+
+        # Offer to continue a run that was interrupted by an error or restart
+        thread_id = st.session_state.thread_id
+        if (
+            thread_id and not job_running and not st.session_state.research_results
+            and get_job_manager().active_job_for_thread(thread_id) is None
+            and thread_can_resume(thread_id)
+        ):
+            if st.button("Resume Interrupted Research", use_container_width=True):
+                start_research("", resume=True)
+                st.rerun()
         
         if st.session_state.research_results and 'final_report' in st.session_state.research_results:
             report = st.session_state.research_results['final_report']
@@ -146,6 +257,10 @@ def main():
             if st.button("New Research", use_container_width=True):
                 st.session_state.research_results = None
                 st.session_state.research_in_progress = False
+                st.session_state.research_progress = None
+                st.session_state.thread_id = None
+                st.session_state.job_id = None
+                st.query_params.clear()
                 st.rerun()
         else:
             st.button("New Research", disabled=True, use_container_width=True)
@@ -159,6 +274,28 @@ def main():
             report = st.session_state.research_results['final_report']
             report_with_links = extract_clickable_links(report)
             st.markdown(report_with_links, unsafe_allow_html=True)
+
+            progress = st.session_state.research_progress
+            if progress:
+                with st.expander("Run details"):
+                    st.write(
+                        f"{progress['researchers_spawned']} researchers, "
+                        f"{progress['searches_issued']} searches, "
+                        f"{progress['sources_found']} sources in {progress['elapsed_seconds']:.0f}s"
+                    )
+                    st.table({
+                        "Stage": [format_stage_name(stage) for stage in progress["stage_timings"]],
+                        "Seconds": list(progress["stage_timings"].values()),
+                    })
+                    cost_ledger = (st.session_state.research_results or {}).get("cost_ledger")
+                    if cost_ledger:
+                        st.write(
+                            f"Cost ${cost_ledger['cost_usd']:.4f}: "
+                            f"{cost_ledger['input_tokens'] + cost_ledger['output_tokens']:,} tokens, "
+                            f"{cost_ledger['search_credits']} search credits"
+                        )
+                        if cost_ledger["cap_reached"]:
+                            st.warning(f"Research stopped early: spend cap {cost_ledger['cap_reached']} reached.")
         elif st.session_state.research_in_progress:
             st.info("🔄 Research in progress...")
         else:
@@ -166,5 +303,10 @@ def main():
         
         st.markdown('</div>', unsafe_allow_html=True)
 
+    # Keep polling the background job until it finishes
+    if job_running:
+        time.sleep(job_poll_interval)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
@@ -4,11 +4,14 @@ from prompts import lead_researcher_prompt
 from typing_extensions import Literal
 from tools import ConductResearch, ResearchComplete, think_tool
 from utils_agent import get_today_str, get_notes_from_tool_calls
+from run_context import ensure_url_registry
+from ledger import spend_cap_reached
+from scheduler import ResearcherScheduler
 from state import SupervisorState
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Command
 
-from langchain.chat_models import init_chat_model
+from models import get_model_with_tools
 from langchain_core.messages import (
     HumanMessage,
     SystemMessage,
@@ -18,9 +21,7 @@ from langchain_core.messages import (
 
 # ===== CONFIGURATION =====
 
-supervisor_tools = [ConductResearch, ResearchComplete, think_tool]
-supervisor_model = init_chat_model(model="gemini-2.5-flash", model_provider="google-genai")
-supervisor_model_with_tools = supervisor_model.bind_tools(supervisor_tools)
+lead_researcher_tools = [ConductResearch, ResearchComplete, think_tool]
 
 # System constants
 # Maximum number of tool call iterations for individual researcher agents
@@ -29,8 +30,12 @@ max_researcher_iterations = 6 # Calls to think_tool + ConductResearch
 
 # Maximum number of concurrent research agents the supervisor can launch
 # This is passed to the lead_researcher_prompt to limit parallel research tasks
+# and enforced by the researcher scheduler, which queues any overflow
 max_concurrent_researchers = 2
 
+# Shared scheduler capping concurrently running researcher subgraphs
+researcher_scheduler = ResearcherScheduler(max_concurrent_researchers)
+
 # ===== SUPERVISOR NODES =====
 
 async def supervisor(state: SupervisorState) -> Command[Literal["supervisor_tools"]]:
@@ -58,7 +63,7 @@ async def supervisor(state: SupervisorState) -> Command[Literal["supervisor_tool
     messages = [SystemMessage(content=system_message)] + supervisor_messages
     
     # Make decision about next research steps
-    response = await supervisor_model_with_tools.ainvoke(messages)
+    response = await get_model_with_tools("supervisor", lead_researcher_tools).ainvoke(messages)
     
     return Command(
         goto="supervisor_tools",
@@ -75,7 +80,8 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
     - Executing think_tool calls for strategic reflection
     - Launching parallel research agents for different topics
     - Aggregating research results
-    - Determining when research is complete
+    - Determining when research is complete, or when the run's spend cap
+      stops further research (the report is then written from the notes so far)
     
     Args:
         state: Current supervisor state with messages and iteration count
@@ -90,6 +96,7 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
     # Initialize variables for single return pattern
     tool_messages = []
     all_raw_notes = []
+    researcher_runs = []
     next_step = "supervisor"  # Default next step
     should_end = False
     
@@ -101,7 +108,7 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
         for tool_call in most_recent_message.tool_calls
     )
     
-    if exceeded_iterations or no_tool_calls or research_complete:
+    if exceeded_iterations or no_tool_calls or research_complete or spend_cap_reached():
         should_end = True
         next_step = END
     
@@ -132,19 +139,35 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
 
             # Handle ConductResearch calls (asynchronous)
             if conduct_research_calls:
-                # Launch parallel research agents
+                # Launch research agents through the scheduler, which runs at most
+                # max_concurrent_researchers at once and queues the rest
                 coros = [
-                    researcher_agent.ainvoke({
-                        "researcher_messages": [
-                            HumanMessage(content=tool_call["args"]["research_topic"])
-                        ],
-                        "research_topic": tool_call["args"]["research_topic"]
-                    }) 
+                    researcher_scheduler.run(
+                        tool_call["args"]["research_topic"],
+                        lambda research_topic=tool_call["args"]["research_topic"]: researcher_agent.ainvoke({
+                            "researcher_messages": [
+                                HumanMessage(content=research_topic)
+                            ],
+                            "research_topic": research_topic
+                        })
+                    )
                     for tool_call in conduct_research_calls
                 ]
 
-                # Wait for all research to complete
-                tool_results = await asyncio.gather(*coros)
+                # Wait for all research to complete. Researchers share the run's
+                # URL registry so no page is summarized twice.
+                with ensure_url_registry():
+                    scheduled_results = await asyncio.gather(*coros)
+                tool_results = [result for result, _ in scheduled_results]
+                researcher_runs = [
+                    {
+                        **record,
+                        "stop_reason": result.get("stop_reason"),
+                        "search_count": result.get("search_count", 0),
+                        "tokens": result.get("prompt_tokens", 0) + result.get("completion_tokens", 0),
+                    }
+                    for result, record in scheduled_results
+                ]
 
                 # Format research results as tool messages
                 # Each sub-agent returns compressed research findings in result["compressed_research"]
@@ -160,11 +183,17 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
                 
                 tool_messages.extend(research_tool_messages)
 
-                # Aggregate raw notes from all research
+                # Aggregate raw notes from all research (blob store references,
+                # see blob_store.hydrate)
                 all_raw_notes = [
-                    "\n".join(result.get("raw_notes", [])) 
-                    for result in tool_results
+                    note for result in tool_results
+                    for note in result.get("raw_notes", [])
                 ]
+
+            # Stop delegating once the run has reached a spend cap
+            if spend_cap_reached():
+                should_end = True
+                next_step = END
                 
         except Exception as e:
             print(f"Error in supervisor tools: {e}")
@@ -173,11 +202,18 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
     
     # Single return point with appropriate state updates
     if should_end:
+        # Keep the findings of a round that ran before the spend cap stopped research
+        round_update = {
+            "supervisor_messages": tool_messages,
+            "raw_notes": all_raw_notes,
+            "researcher_runs": researcher_runs,
+        } if tool_messages else {}
         return Command(
             goto=next_step,
             update={
-                "notes": get_notes_from_tool_calls(supervisor_messages),
-                "research_brief": state.get("research_brief", "")
+                "notes": get_notes_from_tool_calls(list(supervisor_messages) + tool_messages),
+                "research_brief": state.get("research_brief", ""),
+                **round_update,
             }
         )
     else:
@@ -185,7 +221,8 @@ async def supervisor_tools(state: SupervisorState) -> Command[Literal["superviso
             goto=next_step,
             update={
                 "supervisor_messages": tool_messages,
-                "raw_notes": all_raw_notes
+                "raw_notes": all_raw_notes,
+                "researcher_runs": researcher_runs
             }
         )
 
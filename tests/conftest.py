@@ -0,0 +1,18 @@
+"""
+Shared setup for the offline tests.
+
+The agent modules read their cache, blob and checkpoint locations from the
+environment at import time, so they are pointed at a temporary directory
+before any test imports them. No test needs network access or API keys.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_test_dir = Path(tempfile.mkdtemp(prefix="market-research-tests-"))
+os.environ.setdefault("MARKET_RESEARCH_CACHE_DIR", str(_test_dir / "cache"))
+os.environ.setdefault("MARKET_RESEARCH_CHECKPOINT_DB", str(_test_dir / "checkpoints.sqlite"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,32 @@
+import asyncio
+from types import SimpleNamespace
+
+from batch import select_batch_thread
+
+class FakeAgent:
+    """Agent exposing only aget_state, over a fixed set of checkpointed threads."""
+
+    def __init__(self, threads: dict[str, SimpleNamespace]):
+        self.threads = threads
+        self.requested: list[str] = []
+
+    async def aget_state(self, config: dict) -> SimpleNamespace:
+        thread_id = config["configurable"]["thread_id"]
+        self.requested.append(thread_id)
+        return self.threads.get(thread_id, SimpleNamespace(next=(), values={}))
+
+finished = SimpleNamespace(next=(), values={"messages": ["finished without a report"]})
+interrupted = SimpleNamespace(next=("research_supervisor",), values={"messages": ["interrupted"]})
+
+def test_first_attempt_uses_the_item_thread():
+    agent = FakeAgent({})
+    assert asyncio.run(select_batch_thread(agent, "itc")) == ("batch-itc", False)
+
+def test_interrupted_attempt_is_resumed():
+    agent = FakeAgent({"batch-itc": finished, "batch-itc.2": interrupted})
+    assert asyncio.run(select_batch_thread(agent, "itc")) == ("batch-itc.2", True)
+
+def test_finished_attempts_are_left_alone():
+    agent = FakeAgent({"batch-itc": finished, "batch-itc.2": finished})
+    assert asyncio.run(select_batch_thread(agent, "itc")) == ("batch-itc.3", False)
+    assert agent.requested == ["batch-itc", "batch-itc.2", "batch-itc.3"]
@@ -0,0 +1,73 @@
+import os
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+import blob_store
+from blob_store import (
+    blob_threshold_chars,
+    get_blob,
+    hydrate,
+    hydrate_messages,
+    is_blob_reference,
+    offload_message,
+    prune_blobs,
+    put_blob,
+)
+
+@pytest.fixture(autouse=True)
+def temporary_blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "blob_dir", tmp_path / "blobs")
+    monkeypatch.setattr(blob_store, "blob_store_enabled", True)
+    return tmp_path / "blobs"
+
+def stored_files(blob_dir):
+    return sorted(path for path in blob_dir.glob("*/*") if path.is_file())
+
+def test_large_tool_outputs_are_offloaded_and_hydrated(temporary_blob_dir):
+    content = "search result " * blob_threshold_chars
+    message = ToolMessage(content=content, tool_call_id="call-1", name="tavily_search")
+
+    offloaded = offload_message(message)
+    assert is_blob_reference(offloaded.content)
+    assert offloaded.content.endswith(f":{len(content)}")
+    assert offloaded.tool_call_id == "call-1"
+
+    hydrated = hydrate_messages([AIMessage(content="thinking"), offloaded])
+    assert hydrated[0].content == "thinking"
+    assert hydrated[1].content == content
+    assert len(stored_files(temporary_blob_dir)) == 1
+
+def test_small_outputs_and_disabled_store_keep_content(monkeypatch):
+    small = ToolMessage(content="short", tool_call_id="call-1")
+    assert offload_message(small) is small
+
+    monkeypatch.setattr(blob_store, "blob_store_enabled", False)
+    large = ToolMessage(content="x" * (blob_threshold_chars + 1), tool_call_id="call-2")
+    assert offload_message(large) is large
+
+def test_identical_texts_share_one_blob(temporary_blob_dir):
+    assert put_blob("same text") == put_blob("same text")
+    assert put_blob("other text") != put_blob("same text")
+    assert len(stored_files(temporary_blob_dir)) == 2
+    assert hydrate("plain note") == "plain note"
+
+def test_missing_blob_is_replaced_by_a_notice(temporary_blob_dir):
+    reference = put_blob("note that will be pruned")
+    for path in stored_files(temporary_blob_dir):
+        path.unlink()
+    assert get_blob(reference) == f"[Content no longer available: {len('note that will be pruned')} characters pruned from the blob store]"
+
+def test_pruning_removes_expired_then_least_recently_used_blobs(temporary_blob_dir):
+    references = [put_blob(f"blob {i} " + "x" * 1000) for i in range(4)]
+    paths = {reference: blob_store.blob_path(reference.split(":")[2]) for reference in references}
+    now = time.time()
+    # Oldest first: blob 0 is past retention, blobs 1-3 are recent
+    for i, reference in enumerate(references):
+        age = 10 * 24 * 3600 if i == 0 else (4 - i) * 60
+        os.utime(paths[reference], (now - age, now - age))
+
+    size = paths[references[3]].stat().st_size
+    assert prune_blobs(retention_days=7, max_bytes=2 * size) == 2
+    assert [paths[reference].exists() for reference in references] == [False, False, True, True]
@@ -0,0 +1,56 @@
+import time
+
+from cache import SQLiteCache
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.sqlite", max_entries=2, touch_batch_size=100)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    # The hit on "a" is only buffered, but set writes it before evicting
+    assert cache.get("a") == 1
+    time.sleep(0.01)
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["entries"] == 2
+    cache.close()
+
+def test_expired_entries_are_misses_and_removed(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.sqlite", ttl_seconds=60)
+    cache.set("short", "value", ttl_seconds=0.05)
+    cache.set("long", "value")
+    time.sleep(0.1)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == "value"
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+def test_hits_are_buffered_until_the_batch_is_full(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.sqlite", touch_batch_size=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    accessed_before = dict(cache._connect().execute("SELECT key, accessed_at FROM cache").fetchall())
+
+    cache.get("a")
+    cache.get("b")
+    assert dict(cache._connect().execute("SELECT key, accessed_at FROM cache").fetchall()) == accessed_before
+    cache.get("c")
+    accessed_after = dict(cache._connect().execute("SELECT key, accessed_at FROM cache").fetchall())
+    assert all(accessed_after[key] > accessed_before[key] for key in "abc")
+    cache.close()
+
+def test_values_and_counters_survive_reopening(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.sqlite")
+    cache.set(SQLiteCache.make_key("page", 1), {"summary": "text"})
+    assert cache.get(SQLiteCache.make_key("page", 2)) is None
+    cache.close()
+
+    reopened = SQLiteCache(tmp_path / "cache.sqlite")
+    assert reopened.get(SQLiteCache.make_key("page", 1)) == {"summary": "text"}
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 0
+    reopened.close()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import TypedDict
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, START, StateGraph
+
+from checkpointing import checkpoint_timestamp, compact_thread, open_checkpointer, prune_checkpoints
+
+class CounterState(TypedDict):
+    count: int
+
+def build_graph(checkpointer):
+    builder = StateGraph(CounterState)
+    builder.add_node("first", lambda state: {"count": state["count"] + 1})
+    builder.add_node("second", lambda state: {"count": state["count"] + 1})
+    builder.add_edge(START, "first")
+    builder.add_edge("first", "second")
+    builder.add_edge("second", END)
+    return builder.compile(checkpointer=checkpointer)
+
+async def run_threads(checkpointer, thread_ids):
+    graph = build_graph(checkpointer)
+    for thread_id in thread_ids:
+        await graph.ainvoke({"count": 0}, {"configurable": {"thread_id": thread_id}})
+    return graph
+
+async def stored_threads(checkpointer) -> dict[str, int]:
+    async with checkpointer.conn.execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id") as cursor:
+        return dict(await cursor.fetchall())
+
+def test_checkpoint_ids_encode_their_creation_time(tmp_path):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite")) as checkpointer:
+            graph = await run_threads(checkpointer, ["thread"])
+            snapshot = await graph.aget_state({"configurable": {"thread_id": "thread"}})
+            return snapshot.config["configurable"]["checkpoint_id"]
+
+    assert abs(checkpoint_timestamp(asyncio.run(run())) - time.time()) < 60
+
+def test_threads_beyond_the_most_recent_are_pruned(tmp_path):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite")) as checkpointer:
+            await run_threads(checkpointer, ["oldest", "middle", "newest"])
+            deleted = await prune_checkpoints(checkpointer, max_threads=2)
+            return deleted, await stored_threads(checkpointer)
+
+    deleted, threads = asyncio.run(run())
+    assert deleted == ["oldest"]
+    assert set(threads) == {"middle", "newest"}
+
+def test_threads_past_retention_are_pruned(tmp_path, monkeypatch):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite")) as checkpointer:
+            await run_threads(checkpointer, ["a", "b"])
+            assert await prune_checkpoints(checkpointer, retention_days=1) == []
+            two_days_later = time.time() + 2 * 24 * 3600
+            monkeypatch.setattr("checkpointing.time.time", lambda: two_days_later)
+            deleted = await prune_checkpoints(checkpointer, retention_days=1)
+            return deleted, await stored_threads(checkpointer)
+
+    deleted, threads = asyncio.run(run())
+    assert sorted(deleted) == ["a", "b"]
+    assert threads == {}
+
+def test_compaction_keeps_only_the_latest_checkpoint(tmp_path):
+    async def run():
+        async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite")) as checkpointer:
+            graph = await run_threads(checkpointer, ["done", "other"])
+            before = await stored_threads(checkpointer)
+            await compact_thread(checkpointer, "done")
+            after = await stored_threads(checkpointer)
+            snapshot = await graph.aget_state({"configurable": {"thread_id": "done"}})
+            return before, after, snapshot
+
+    before, after, snapshot = asyncio.run(run())
+    assert before["done"] > 1
+    assert after == {"done": 1, "other": before["other"]}
+    assert snapshot.values == {"count": 2} and not snapshot.next
+
+def test_opening_prunes_each_file_once(tmp_path, monkeypatch):
+    path = tmp_path / "checkpoints.sqlite"
+    pruned = []
+
+    async def record_prune(checkpointer, **kwargs):
+        pruned.append(kwargs["vacuum"]())
+        return []
+
+    monkeypatch.setattr("checkpointing.prune_checkpoints", record_prune)
+
+    async def run():
+        async with open_checkpointer(path):
+            async with open_checkpointer(path):
+                pass
+        async with open_checkpointer(path):
+            pass
+
+    asyncio.run(run())
+    # Pruned on the first open only, when it was the only connection (so it may vacuum)
+    assert pruned == [True]
@@ -0,0 +1,55 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import assemble_compression, number_sources, researcher_agent
+from fakes import CorpusSearchClient, fake_models
+from models import override_models
+from run_context import research_run_scope
+from utils_agent import format_search_output, isolated_caches
+
+def search_output(*urls: str) -> ToolMessage:
+    results = {url: {"title": f"Page {url[-1]}", "url": url, "content": "text"} for url in urls}
+    return ToolMessage(content=format_search_output(results), name="tavily_search", tool_call_id="call_1")
+
+def test_new_sources_are_numbered_after_known_ones():
+    known = {"https://a.example/1": "Page 1"}
+    sources, cited = number_sources([search_output("https://a.example/1", "https://b.example/2")], known)
+    assert list(sources) == ["https://a.example/1", "https://b.example/2"]
+    assert cited == {"https://a.example/1": 1, "https://b.example/2": 2}
+
+def test_assembled_document_lists_queries_findings_sources_and_answer():
+    document = assemble_compression(
+        {
+            "rolling_queries": ['tavily_search: "q1"', 'tavily_search: "q2"'],
+            "rolling_findings": ["First step [1].", "Second step [2]."],
+            "rolling_sources": {"https://a.example/1": "Page 1", "https://b.example/2": "Page 2"},
+        },
+        final_answer="Done.",
+    )
+    assert '- tavily_search: "q2"' in document
+    assert "First step [1].\n\nSecond step [2]." in document
+    assert "[2] Page 2: https://b.example/2" in document
+    assert document.endswith("Done.")
+
+def test_rolling_updates_see_only_new_messages_and_completion_needs_no_compressor_call():
+    models = fake_models(researcher_iterations=3, latency_seconds=0)
+    prompts = []
+    compressor_script = models["compressor"].script
+    models["compressor"].script = lambda messages: prompts.append(str(messages[-1].content)) or compressor_script(messages)
+
+    async def run():
+        with override_models(models, search_client=CorpusSearchClient(latency_seconds=0)), isolated_caches():
+            with research_run_scope():
+                return await researcher_agent.ainvoke({
+                    "researcher_messages": [HumanMessage(content="Topic: ITC hotels")],
+                    "research_topic": "ITC hotels",
+                })
+
+    result = asyncio.run(run())
+    # One update per tool step, none when the researcher finishes
+    assert models["compressor"].call_count == 3
+    # Each update carries only its own tool call, not the earlier ones
+    assert all(prompt.count("tavily_search") == 1 for prompt in prompts)
+    assert result["compressed_research"].count("Compressed research over") == 3
+    assert "research complete" in result["compressed_research"]
@@ -0,0 +1,60 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from agent import researcher_agent
+from fakes import CorpusSearchClient, fake_models
+from ledger import CostLedger, get_ledger, ledger_scope, model_cost, spend_cap_reached, tavily_credit_usd
+from models import override_models
+from run_context import research_run_scope
+from utils_agent import isolated_caches
+
+def test_usage_is_priced_and_broken_down():
+    ledger = CostLedger(spend_caps={"max_cost_usd": None, "max_tokens": None, "max_search_credits": None})
+    ledger.record_model_call("gemini-2.5-flash", 1000, 200, role="researcher", node="llm_call", researcher_id="r1")
+    ledger.record_search(node="tool_node", researcher_id="r1")
+
+    snapshot = ledger.snapshot()
+    expected_cost = model_cost("gemini-2.5-flash", 1000, 200) + tavily_credit_usd
+    assert snapshot["cost_usd"] == round(expected_cost, 6)
+    assert snapshot["by_researcher"]["r1"]["input_tokens"] == 1000
+    assert snapshot["by_node"]["tool_node"]["searches"] == 1
+    # Searches have no model role
+    assert snapshot["by_role"] == {"researcher": {"model_calls": 1, "input_tokens": 1000, "output_tokens": 200, "cost_usd": round(model_cost("gemini-2.5-flash", 1000, 200), 6)}}
+    assert snapshot["cap_reached"] is None
+
+def test_first_cap_reached_is_kept():
+    ledger = CostLedger(spend_caps={"max_tokens": 1000, "max_search_credits": 1, "max_cost_usd": None})
+    ledger.record_model_call("gemini-2.5-flash", 900, 50)
+    assert ledger.cap_reached is None
+    ledger.record_model_call("gemini-2.5-flash", 40, 10)
+    assert ledger.cap_reached == "max_tokens"
+    ledger.record_search()
+    assert ledger.cap_reached == "max_tokens"
+
+def test_nested_scopes_share_one_ledger():
+    with ledger_scope({"max_search_credits": 1}) as outer:
+        with ledger_scope() as inner:
+            assert inner is outer
+            inner.record_search()
+        assert spend_cap_reached() == "max_search_credits"
+    assert get_ledger() is None and spend_cap_reached() is None
+
+def test_search_credit_cap_stops_the_researcher():
+    models = fake_models(researcher_iterations=6, latency_seconds=0)
+    search_client = CorpusSearchClient(latency_seconds=0)
+
+    async def run():
+        with override_models(models, search_client=search_client), isolated_caches(), \
+                research_run_scope(spend_caps={"max_search_credits": 2}):
+            result = await researcher_agent.ainvoke(
+                {"researcher_messages": [HumanMessage(content="Topic: ITC hotels")], "research_topic": "ITC hotels"}
+            )
+            return result, get_ledger().snapshot()
+
+    result, snapshot = asyncio.run(run())
+    assert result["stop_reason"] == "run_max_search_credits"
+    assert search_client.call_count == 2
+    assert snapshot["search_credits"] == 2
+    # Model calls made through the fakes are charged to their roles
+    assert snapshot["by_role"]["researcher"]["model_calls"] >= 2
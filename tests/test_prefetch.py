@@ -0,0 +1,62 @@
+import asyncio
+
+from prefetch import derive_prefetch_queries, extract_subject
+from rate_limits import AdaptiveRateLimiter, background_priority
+
+def test_subject_does_not_run_across_sentences():
+    assert extract_subject("We need to study Tesla. Research Tesla and its competitors.") == "Tesla"
+    assert extract_subject("Apple. Apple products and services in Europe.") == "Apple"
+
+def test_subject_prefers_company_over_market():
+    brief = (
+        "I want to understand Tata Motors' electric vehicle strategy in India. "
+        "Identify AI use cases for its plants in India and compare it with competitors in India."
+    )
+    assert extract_subject(brief) == "Tata Motors"
+
+def test_subject_prefers_fullest_repeated_form():
+    brief = "Conduct market research for ITC Limited. Research ITC's segments on Kaggle. ITC Limited is listed."
+    assert extract_subject(brief) == "ITC Limited"
+
+def test_subject_keeps_ampersand_names_and_skips_abbreviation_dots():
+    assert extract_subject("Study the U.S. market for Procter & Gamble products.") == "Procter & Gamble"
+
+def test_place_is_used_when_nothing_else_is_named():
+    assert extract_subject("Research the retail market in India.") == "India"
+
+def test_no_queries_without_a_subject():
+    assert derive_prefetch_queries("Research brief: market research for a diversified FMCG company.") == []
+
+def test_queries_name_the_subject():
+    queries = derive_prefetch_queries("Research brief: AI use cases for ITC Limited.")
+    assert queries and all(query.startswith("ITC Limited ") for query, _ in queries)
+
+def test_background_requests_yield_to_waiting_requests():
+    limiter = AdaptiveRateLimiter(requests_per_second=20, max_bucket_size=1, check_every_n_seconds=0.005)
+    order = []
+
+    async def request(name: str, background: bool) -> None:
+        if background:
+            with background_priority():
+                await limiter.aacquire()
+        else:
+            await limiter.aacquire()
+        order.append(name)
+
+    async def main():
+        limiter.available_tokens = 0
+        # The background request starts waiting first, but is served last
+        background = asyncio.create_task(request("prefetch", True))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(request("supervisor", False), request("researcher", False), background)
+
+    asyncio.run(main())
+    assert order[-1] == "prefetch"
+
+def test_background_requests_leave_reserved_tokens():
+    limiter = AdaptiveRateLimiter(requests_per_second=0.001, max_bucket_size=2)
+    limiter.available_tokens = 2
+    with background_priority():
+        assert limiter.acquire(blocking=False)
+        assert not limiter.acquire(blocking=False)
+    assert limiter.acquire(blocking=False)
@@ -0,0 +1,50 @@
+from relevance import max_relevant_words, select_relevant_pages, select_relevant_passages, split_passages
+
+def filler(paragraph: int, words: int = 100) -> str:
+    return " ".join(f"filler{paragraph}x{i % 40}" for i in range(words))
+
+def test_pages_unrelated_to_the_query_are_dropped():
+    pages = {
+        "https://example.com/hotels": "ITC hotels revenue grew as occupancy rose across luxury hotels.\n\n" + filler(1),
+        "https://example.com/results": "Quarterly revenue of ITC hotels and the paperboards segment.\n\n" + filler(2),
+        "https://example.com/weather": "Heavy rain and storms are expected across the coast this weekend.\n\n" + filler(3),
+    }
+    kept = select_relevant_pages("ITC hotels revenue", pages)
+    assert set(kept) == {"https://example.com/hotels", "https://example.com/results"}
+    assert kept["https://example.com/hotels"] == pages["https://example.com/hotels"]
+
+def test_all_pages_are_kept_when_nothing_matches():
+    pages = {"https://example.com/a": filler(1), "https://example.com/b": filler(2)}
+    assert select_relevant_pages("ITC hotels revenue", pages) == pages
+    assert select_relevant_pages("", pages) == pages
+
+def test_long_page_is_reduced_to_its_relevant_passages_in_order():
+    relevant = {
+        20: "ITC hotels revenue rose sharply on strong occupancy in its luxury hotels.",
+        90: "Hotels revenue per available room at ITC improved for a third year.",
+        170: "ITC plans to demerge the hotels business and list it separately.",
+    }
+    paragraphs = [
+        relevant[i] + " " + filler(i, 80) if i in relevant else filler(i)
+        for i in range(200)
+    ]
+    page = "\n\n".join(paragraphs)
+    assert len(page.split()) > 19000
+
+    reduced = select_relevant_passages("ITC hotels revenue", page)
+    # Kept passages are joined with "..." separators, which are not page words
+    assert len([word for word in reduced.split() if word != "..."]) <= max_relevant_words
+    positions = [reduced.index(sentence) for sentence in relevant.values()]
+    assert positions == sorted(positions)
+
+def test_short_or_unmatched_pages_are_unchanged():
+    short_page = "ITC hotels revenue.\n\n" + filler(1)
+    assert select_relevant_passages("ITC hotels revenue", short_page) == short_page
+    long_page = "\n\n".join(filler(i) for i in range(60))
+    assert select_relevant_passages("ITC hotels revenue", long_page) == long_page
+
+def test_passages_merge_short_paragraphs_and_cut_long_ones():
+    passages = split_passages("one two\n\nthree four\n\n" + filler(1, 400), words_per_passage=150)
+    assert passages[0].startswith("one two three four")
+    assert all(len(passage.split()) <= 150 for passage in passages)
+    assert sum(len(passage.split()) for passage in passages) == 404
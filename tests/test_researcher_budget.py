@@ -0,0 +1,45 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import researcher_agent, skipped_search_output
+from fakes import CorpusSearchClient, fake_models, tool_call
+from models import override_models
+from run_context import research_run_scope
+from utils_agent import isolated_caches
+
+def run_researcher(researcher_script, **budget) -> tuple[dict, CorpusSearchClient]:
+    models = fake_models(latency_seconds=0)
+    models["researcher"].script = researcher_script
+    search_client = CorpusSearchClient(latency_seconds=0)
+    config = {"configurable": {f"researcher_{name}": limit for name, limit in budget.items()}}
+
+    async def run():
+        with override_models(models, search_client=search_client), isolated_caches(), research_run_scope():
+            return await researcher_agent.ainvoke(
+                {"researcher_messages": [HumanMessage(content="Topic: ITC hotels")], "research_topic": "ITC hotels"},
+                config=config,
+            )
+
+    return asyncio.run(run()), search_client
+
+def test_searches_beyond_the_budget_are_refused_before_they_run():
+    def researcher_script(messages):
+        if any(isinstance(message, ToolMessage) for message in messages):
+            return AIMessage(content="done")
+        return AIMessage(content="", tool_calls=[tool_call("tavily_search", query=f"ITC hotels {i}") for i in range(5)])
+
+    result, search_client = run_researcher(researcher_script, max_searches=3)
+    assert search_client.call_count == 3
+    assert result["search_count"] == 3
+    assert result["stop_reason"] == "max_searches"
+    refused = [message for message in result["researcher_messages"] if message.content == skipped_search_output]
+    assert len(refused) == 2
+
+def test_iteration_limit_ends_the_loop():
+    def researcher_script(messages):
+        return AIMessage(content="", tool_calls=[tool_call("think_tool", reflection="keep thinking")])
+
+    result, _ = run_researcher(researcher_script, max_iterations=3)
+    assert result["stop_reason"] == "max_iterations"
+    assert sum(1 for message in result["researcher_messages"] if isinstance(message, ToolMessage)) == 3
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from scheduler import ResearcherScheduler
+
+def test_at_most_max_concurrent_researchers_run():
+    scheduler = ResearcherScheduler(max_concurrent=2)
+    running = 0
+    peak = 0
+
+    async def researcher() -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return "notes"
+
+    async def run():
+        return await asyncio.gather(*(scheduler.run(f"topic {i}", researcher) for i in range(5)))
+
+    results = asyncio.run(run())
+    assert [result for result, _ in results] == ["notes"] * 5
+    assert peak == 2
+    records = [record for _, record in results]
+    # The last two researchers waited for two earlier rounds of slots to free up
+    assert records[4]["queued_seconds"] >= 0.03
+    assert [record["queue_depth_at_submit"] for record in records] == [0, 0, 0, 1, 2]
+    assert scheduler.stats()["running"] == 0 and scheduler.stats()["queued"] == 0
+
+def test_failed_researchers_release_their_slot():
+    scheduler = ResearcherScheduler(max_concurrent=1)
+
+    async def failing() -> str:
+        raise RuntimeError("researcher failed")
+
+    async def succeeding() -> str:
+        return "notes"
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await scheduler.run("failing", failing)
+        return await asyncio.wait_for(scheduler.run("succeeding", succeeding), timeout=1)
+
+    result, record = asyncio.run(run())
+    assert result == "notes"
+    assert [run["status"] for run in scheduler.stats()["recent_runs"]] == ["failed", "completed"]
+
+def test_capacity_can_be_set_per_event_loop():
+    scheduler = ResearcherScheduler(max_concurrent=1)
+    running = 0
+    peak = 0
+
+    async def researcher() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def run():
+        scheduler.set_capacity(3)
+        await asyncio.gather(*(scheduler.run(f"topic {i}", researcher) for i in range(6)))
+
+    asyncio.run(run())
+    assert peak == 3
@@ -0,0 +1,83 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from fakes import fake_models, summarizer_script
+from models import override_models
+from relevance import max_relevant_words
+from schema import Summary
+from utils_agent import (
+    asummarize_in_chunks,
+    asummarize_webpage_content,
+    estimate_tokens,
+    isolated_caches,
+    split_webpage_content,
+    summary_chunk_tokens,
+)
+
+def page(paragraphs: int, words: int = 200, marker: str = "word") -> str:
+    return "\n\n".join(" ".join(f"{marker}{p}x{i}" for i in range(words)) for p in range(paragraphs))
+
+def summarize_with(script, coroutine_factory):
+    models = fake_models(latency_seconds=0)
+    models["summarizer"].script = script
+
+    async def run():
+        with override_models(models), isolated_caches():
+            return await coroutine_factory()
+
+    return asyncio.run(run()), models["summarizer"]
+
+def test_chunks_cover_the_page_within_the_token_budget():
+    content = page(60)
+    chunks = split_webpage_content(content, chunk_tokens=1000)
+    assert len(chunks) > 1
+    assert "\n\n".join(chunks) == content
+    assert all(estimate_tokens(chunk) <= 1000 for chunk in chunks)
+
+def test_a_paragraph_longer_than_a_chunk_is_cut():
+    content = "x" * 10000
+    chunks = split_webpage_content(content, chunk_tokens=1000)
+    assert [len(chunk) for chunk in chunks] == [4000, 4000, 2000]
+
+def test_chunk_summaries_are_merged_into_one():
+    content = page(200, words=300)
+    chunks = split_webpage_content(content, summary_chunk_tokens)
+    summary, summarizer = summarize_with(summarizer_script, lambda: asummarize_in_chunks(content))
+    assert len(chunks) > 1
+    assert summarizer.call_count == len(chunks) + 1
+    assert isinstance(summary, Summary)
+
+def test_failed_chunks_are_skipped_and_a_failed_merge_concatenates():
+    content = page(200, words=300)
+    chunks = split_webpage_content(content, summary_chunk_tokens)
+
+    def script(messages, schema=None):
+        text = str(messages[-1].content)
+        if "<section_1>" in text or chunks[0][-50:] in text:
+            raise RuntimeError("summarizer failed")
+        return Summary(summary=f"part of {len(text)}", key_excerpts="quote")
+
+    summary, summarizer = summarize_with(script, lambda: asummarize_in_chunks(content))
+    assert summarizer.call_count == len(chunks) + 1
+    assert summary.summary.count("part of") == len(chunks) - 1
+    assert summary.key_excerpts.split("\n") == ["quote"] * (len(chunks) - 1)
+
+def test_long_pages_are_summarized_from_their_relevant_passages_in_one_call():
+    content = page(100, marker="filler") + "\n\n" + "ITC hotels revenue grew strongly this year. " * 10
+    prompts = []
+
+    def script(messages, schema=None):
+        prompts.append(str(messages[-1].content))
+        return summarizer_script(messages, schema)
+
+    async def summarize_twice():
+        first = await asummarize_webpage_content(content, query="ITC hotels revenue")
+        second = await asummarize_webpage_content(content, query="ITC hotels revenue")
+        return first, second
+
+    (first, second), summarizer = summarize_with(script, summarize_twice)
+    assert summarizer.call_count == 1
+    assert first == second
+    assert "ITC hotels revenue" in prompts[0]
+    assert len(prompts[0].split()) < max_relevant_words + 1000
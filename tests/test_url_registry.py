@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from run_context import UrlRegistry
+
+def test_concurrent_requests_summarize_a_page_once():
+    calls = 0
+
+    async def summarize() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "summary"
+
+    async def run():
+        registry = UrlRegistry()
+        results = await asyncio.gather(*(registry.get_or_summarize("https://example.com", summarize) for _ in range(5)))
+        return registry, results
+
+    registry, results = asyncio.run(run())
+    assert results == ["summary"] * 5
+    assert calls == 1
+    assert registry.stats() == {"pages": 1, "hits": 4, "misses": 1}
+
+def test_cancelled_waiter_does_not_cancel_the_shared_summary():
+    async def run():
+        registry = UrlRegistry()
+        release = asyncio.Event()
+
+        async def summarize() -> str:
+            await release.wait()
+            return "summary"
+
+        summarizer = asyncio.create_task(registry.get_or_summarize("https://example.com", summarize))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(registry.get_or_summarize("https://example.com", summarize))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        return await summarizer, waiter
+
+    result, waiter = asyncio.run(run())
+    assert result == "summary"
+    assert waiter.cancelled()
+
+def test_waiter_takes_over_when_the_summarizer_is_cancelled():
+    calls = []
+
+    async def run():
+        registry = UrlRegistry()
+
+        async def first() -> str:
+            calls.append("first")
+            await asyncio.sleep(10)
+            return "first"
+
+        async def second() -> str:
+            calls.append("second")
+            return "second"
+
+        summarizer = asyncio.create_task(registry.get_or_summarize("https://example.com", first))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(registry.get_or_summarize("https://example.com", second))
+        await asyncio.sleep(0)
+        summarizer.cancel()
+        return await waiter, registry
+
+    result, registry = asyncio.run(run())
+    assert result == "second"
+    assert calls == ["first", "second"]
+    assert "https://example.com" in registry
+
+def test_errors_reach_waiters_and_the_page_can_be_retried():
+    async def run():
+        registry = UrlRegistry()
+
+        async def failing() -> str:
+            await asyncio.sleep(0.01)
+            raise ValueError("summarizer down")
+
+        async def succeeding() -> str:
+            return "summary"
+
+        results = await asyncio.gather(
+            registry.get_or_summarize("https://example.com", failing),
+            registry.get_or_summarize("https://example.com", failing),
+            return_exceptions=True,
+        )
+        return results, await registry.get_or_summarize("https://example.com", succeeding)
+
+    results, retried = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == "summary"
+
+def test_errors_without_waiters_are_raised_to_the_summarizer():
+    async def failing() -> str:
+        raise ValueError("summarizer down")
+
+    with pytest.raises(ValueError):
+        asyncio.run(UrlRegistry().get_or_summarize("https://example.com", failing))
@@ -1,17 +1,12 @@
 from typing_extensions import Annotated, Literal
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool, InjectedToolArg
-from utils_agent import (
-    tavily_search_multiple,
-    deduplicate_search_results,
-    process_search_results,
-    format_search_output,
-)
+from utils_agent import asearch_and_summarize, format_search_output
 
 # ===== RESEARCH TOOLS =====
 
 @tool(parse_docstring=True)
-def tavily_search(
+async def tavily_search(
     query: str,
     max_results: Annotated[int, InjectedToolArg] = 3,
     topic: Annotated[Literal["general", "news", "finance"], InjectedToolArg] = "general",
@@ -24,20 +19,14 @@ def tavily_search(
         topic: Topic to filter results by ('general', 'news', 'finance')
 
     """
-    # Execute search for single query
-    search_results = tavily_search_multiple(
+    # Search, deduplicate by URL, filter by relevance and summarize
+    summarized_results = await asearch_and_summarize(
         [query],  # Convert single query to list for the internal function
+        relevance_query=query,
         max_results=max_results,
         topic=topic,
-        include_raw_content=True,
     )
 
-    # Deduplicate results by URL to avoid processing duplicate content
-    unique_results = deduplicate_search_results(search_results)
-
-    # Process results with summarization
-    summarized_results = process_search_results(unique_results)
-
     # Format output for consumption
     return format_search_output(summarized_results)
 
@@ -111,7 +100,7 @@ class FinalProposal(BaseModel):
     )
 
 @tool(parse_docstring=True)
-def search_datasets(
+async def search_datasets(
     query: str,
     platforms: Annotated[list[str], InjectedToolArg] = ["kaggle", "huggingface", "github"],
 ) -> str:
@@ -122,34 +111,25 @@ def search_datasets(
         platforms: List of platforms to search on ('kaggle', 'huggingface', 'github')
 
     """
-    results = []
+    search_queries = []
     
     for platform in platforms:
         if platform.lower() == "kaggle":
             # Search Kaggle datasets
-            search_query = f"site:kaggle.com/datasets {query} machine learning dataset"
+            search_queries.append(f"site:kaggle.com/datasets {query} machine learning dataset")
         elif platform.lower() == "huggingface":
             # Search HuggingFace datasets
-            search_query = f"site:huggingface.co/datasets {query} dataset"
+            search_queries.append(f"site:huggingface.co/datasets {query} dataset")
         elif platform.lower() == "github":
             # Search GitHub repositories
-            search_query = f"site:github.com {query} dataset machine learning data"
-        else:
-            continue
+            search_queries.append(f"site:github.com {query} dataset machine learning data")
             
-        # Use existing tavily search with the constructed query
-        platform_results = tavily_search_multiple(
-            [search_query],
-            max_results=3,
-            topic="general",
-            include_raw_content=True,
-        )
-        
-        if platform_results:
-            results.extend(platform_results)
-    
-    # Process and format results
-    unique_results = deduplicate_search_results(results)
-    summarized_results = process_search_results(unique_results)
+    # Search all platforms concurrently, then summarize the unique results
+    summarized_results = await asearch_and_summarize(
+        search_queries,
+        relevance_query=query,
+        max_results=3,
+        topic="general",
+    )
     
     return f"Dataset Search Results for '{query}':\n{format_search_output(summarized_results)}"
\ No newline at end of file
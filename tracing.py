@@ -0,0 +1,492 @@
+"""
+Tracing for Research Agent
+
+This module records a span for every graph node, model call, researcher,
+search and webpage summary of a research run. Each span carries its wall
+time, time spent queued (researcher slots, search slots and rate limiters),
+token counts, cache hit flags and the id of the researcher it belongs to.
+A run's spans can be written as a JSON trace (which also loads in Perfetto
+or chrome://tracing) and as Prometheus text metrics.
+
+Tracing is active inside tracing_scope(), which research_run_scope() enters
+for every run. Node and model spans come from a callback handler that is
+attached to every graph and model invoked in the scope; researcher, search
+and summary spans are opened explicitly with trace_span().
+"""
+
+import itertools
+import json
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing_extensions import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tracers.context import register_configure_hook
+
+# ===== CONFIGURATION =====
+
+# Quantiles of span wall time exported as Prometheus summaries
+exported_quantiles = (0.5, 0.95, 0.99)
+# Prefix of every exported metric name
+metric_prefix = "market_research"
+# Longest attribute string kept on a span (queries, research topics)
+max_attribute_length = 200
+
+# ===== SPANS =====
+
+@dataclass
+class Span:
+    """
+    One timed operation of a research run.
+
+    kind is "node", "llm", "researcher", "search" or "summarize". Spans link
+    to their parent by parent_id, so a trace can be rebuilt as a tree.
+    """
+    kind: str
+    name: str
+    span_id: str
+    parent: Optional["Span"] = field(default=None, repr=False)
+    researcher_id: Optional[str] = None
+    start_time: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    wall_seconds: Optional[float] = None
+    queue_wait_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_hit: Optional[bool] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.wall_seconds is not None
+
+    @property
+    def parent_id(self) -> Optional[str]:
+        return self.parent.span_id if self.parent else None
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Close the span, recording its wall time and error if any."""
+        if self.finished:
+            return
+        self.wall_seconds = time.perf_counter() - self.started
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"[:max_attribute_length]
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "researcher_id": self.researcher_id,
+            "start_time": self.start_time,
+            "wall_seconds": round(self.wall_seconds, 6) if self.finished else None,
+            "queue_wait_seconds": round(self.queue_wait_seconds, 6),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hit": self.cache_hit,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+def quantile(values: List[float], q: float) -> float:
+    """Return the nearest-rank quantile of values (which must not be empty)."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def clip_attribute(value: Any) -> Any:
+    """Shorten long string attributes so traces stay small."""
+    if isinstance(value, str) and len(value) > max_attribute_length:
+        return value[:max_attribute_length] + "..."
+    return value
+
+# ===== TRACER =====
+
+class Tracer:
+    """
+    Collects the spans of one research run.
+
+    Spans opened by the callback handler are tracked by LangChain run id so
+    that explicit spans (searches, summaries) find the node or model call
+    they run under. Safe to use from several threads and event loops.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._researcher_ids = itertools.count(1)
+        self._run_spans: dict[Any, Span] = {}
+        self._run_parents: dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def start_span(self, kind: str, name: str, parent: Optional[Span] = None, researcher_id: Optional[str] = None, **attributes: Any) -> Span:
+        """Open a span and add it to the trace."""
+        with self._lock:
+            span = Span(
+                kind=kind,
+                name=name,
+                span_id=f"{next(self._ids):x}",
+                parent=parent,
+                researcher_id=researcher_id or (parent.researcher_id if parent else None),
+                attributes={key: clip_attribute(value) for key, value in attributes.items() if value is not None},
+            )
+            self.spans.append(span)
+        return span
+
+    def next_researcher_id(self) -> str:
+        with self._lock:
+            return f"researcher-{next(self._researcher_ids)}"
+
+    # ----- LangChain run tracking -----
+
+    def track_run(self, run_id: Any, parent_run_id: Any, span: Optional[Span] = None) -> None:
+        with self._lock:
+            self._run_parents[run_id] = parent_run_id
+            if span is not None:
+                self._run_spans[run_id] = span
+
+    def release_run(self, run_id: Any) -> Optional[Span]:
+        with self._lock:
+            self._run_parents.pop(run_id, None)
+            return self._run_spans.pop(run_id, None)
+
+    def span_for_run(self, run_id: Any) -> Optional[Span]:
+        """Return the span of a run or of its nearest traced ancestor."""
+        with self._lock:
+            while run_id is not None:
+                span = self._run_spans.get(run_id)
+                if span is not None:
+                    return span
+                run_id = self._run_parents.get(run_id)
+        return None
+
+    # ----- Export -----
+
+    def summary(self) -> dict:
+        """Aggregate the finished spans by kind and name.
+
+        Returns:
+            Dictionary mapping "kind/name" to count, wall time quantiles, queue
+            wait, tokens, cache hits and misses and errors
+        """
+        with self._lock:
+            spans = [span for span in self.spans if span.finished]
+
+        groups: dict[tuple, List[Span]] = {}
+        for span in spans:
+            groups.setdefault((span.kind, span.name), []).append(span)
+
+        summary = {}
+        for (kind, name), group in sorted(groups.items(), key=lambda item: -sum(s.wall_seconds for s in item[1])):
+            walls = [span.wall_seconds for span in group]
+            summary[f"{kind}/{name}"] = {
+                "kind": kind,
+                "name": name,
+                "count": len(group),
+                "total_seconds": round(sum(walls), 3),
+                "max_seconds": round(max(walls), 3),
+                **{f"p{int(q * 100)}_seconds": round(quantile(walls, q), 3) for q in exported_quantiles},
+                "queue_wait_seconds": round(sum(span.queue_wait_seconds for span in group), 3),
+                "input_tokens": sum(span.input_tokens for span in group),
+                "output_tokens": sum(span.output_tokens for span in group),
+                "cache_hits": sum(1 for span in group if span.cache_hit is True),
+                "cache_misses": sum(1 for span in group if span.cache_hit is False),
+                "errors": sum(1 for span in group if span.status == "error"),
+            }
+        return summary
+
+    def to_json(self) -> dict:
+        """Return the trace as a dictionary.
+
+        Besides the spans and their summary, the trace holds the spans as
+        Chrome trace events (one row per researcher), so the file can be
+        opened directly in Perfetto or chrome://tracing.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "summary": self.summary(),
+            "spans": [span.to_dict() for span in spans],
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.kind,
+                    "ph": "X",
+                    "ts": round((span.start_time - self.started_at) * 1e6),
+                    "dur": round(span.wall_seconds * 1e6),
+                    "pid": 1,
+                    "tid": span.researcher_id or "run",
+                    "args": {key: value for key, value in span.to_dict().items() if key not in ("name", "kind")},
+                }
+                for span in spans if span.finished
+            ],
+        }
+
+    def write_json(self, path: Path) -> Path:
+        """Write the JSON trace to path."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_json(), indent=2, default=str), encoding="utf-8")
+        return path
+
+    def prometheus_text(self) -> str:
+        """Return the span summary in the Prometheus text exposition format."""
+        summary = self.summary()
+        seconds = f"{metric_prefix}_span_seconds"
+        lines = [
+            f"# HELP {seconds} Wall time of research spans by kind and name.",
+            f"# TYPE {seconds} summary",
+        ]
+        for group in summary.values():
+            labels = f'kind="{group["kind"]}",name="{escape_label(group["name"])}"'
+            for q in exported_quantiles:
+                lines.append(f'{seconds}{{{labels},quantile="{q}"}} {group[f"p{int(q * 100)}_seconds"]}')
+            lines.append(f"{seconds}_sum{{{labels}}} {group['total_seconds']}")
+            lines.append(f"{seconds}_count{{{labels}}} {group['count']}")
+
+        counters = [
+            ("span_queue_wait_seconds_total", "Time research spans spent queued for a slot or rate limiter.", "queue_wait_seconds", None),
+            ("tokens_total", "Model tokens by span and direction.", "input_tokens", 'direction="input"'),
+            ("tokens_total", "Model tokens by span and direction.", "output_tokens", 'direction="output"'),
+            ("cache_lookups_total", "Cache lookups of searches and summaries by result.", "cache_hits", 'result="hit"'),
+            ("cache_lookups_total", "Cache lookups of searches and summaries by result.", "cache_misses", 'result="miss"'),
+            ("span_errors_total", "Research spans that ended with an error.", "errors", None),
+        ]
+        declared = set()
+        for metric, help_text, key, extra_label in counters:
+            name = f"{metric_prefix}_{metric}"
+            if name not in declared:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                declared.add(name)
+            for group in summary.values():
+                if not group[key] and key != "errors":
+                    continue
+                labels = f'kind="{group["kind"]}",name="{escape_label(group["name"])}"' + (f",{extra_label}" if extra_label else "")
+                lines.append(f"{name}{{{labels}}} {group[key]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> Path:
+        """Write the Prometheus text metrics to path (e.g. for a textfile collector)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.prometheus_text(), encoding="utf-8")
+        return path
+
+def escape_label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# ===== CALLBACK HANDLER =====
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Callback handler opening a span for every graph node and model call.
+
+    Runs inline, so spans are opened in the context of the node or model
+    call itself and see its researcher id.
+    """
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+
+    def on_chain_start(self, serialized: Any, inputs: Any, *, run_id: Any, parent_run_id: Any = None, metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        span = None
+        # Only the node's own run, not the runnables nested inside it
+        if node and kwargs.get("name") == node:
+            span = self.tracer.start_span(
+                "node", node,
+                parent=current_parent_span(self.tracer, parent_run_id),
+                researcher_id=_current_researcher_id.get(),
+            )
+        self.tracer.track_run(run_id, parent_run_id, span)
+
+    def on_chain_end(self, outputs: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id, error)
+
+    def on_tool_start(self, serialized: Any, input_str: str, *, run_id: Any, parent_run_id: Any = None, **kwargs: Any) -> None:
+        self.tracer.track_run(run_id, parent_run_id)
+
+    def on_tool_end(self, output: Any, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id, error)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: Any, parent_run_id: Any = None, metadata: Optional[dict] = None, **kwargs: Any) -> None:
+        metadata = metadata or {}
+        span = self.tracer.start_span(
+            "llm", metadata.get("model_role") or metadata.get("ls_model_name") or kwargs.get("name") or "chat_model",
+            parent=current_parent_span(self.tracer, parent_run_id),
+            researcher_id=_current_researcher_id.get(),
+            model=metadata.get("ls_model_name"),
+            node=metadata.get("langgraph_node"),
+        )
+        self.tracer.track_run(run_id, parent_run_id, span)
+        # The model waits for its rate limiter right after this callback, in
+        # this same context, so the wait is recorded on this span
+        _current_span.set(span)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        span = self.tracer.span_for_run(run_id)
+        if span is not None and span.kind == "llm":
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    span.input_tokens += usage.get("input_tokens", 0)
+                    span.output_tokens += usage.get("output_tokens", 0)
+        self._finish(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._finish(run_id, error)
+
+    def _finish(self, run_id: Any, error: Optional[BaseException] = None) -> None:
+        span = self.tracer.release_run(run_id)
+        if span is not None:
+            span.finish(error)
+
+# ===== CONTEXT =====
+
+_current_tracer: ContextVar[Optional[Tracer]] = ContextVar("tracer", default=None)
+_current_handler: ContextVar[Optional[TracingCallbackHandler]] = ContextVar("tracing_handler", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+_current_researcher_id: ContextVar[Optional[str]] = ContextVar("researcher_id", default=None)
+
+# Attach the scope's handler to every graph and model run started inside it
+register_configure_hook(_current_handler, inheritable=True)
+
+def get_tracer() -> Optional[Tracer]:
+    """Return the tracer of the current run, if tracing is active."""
+    return _current_tracer.get()
+
+def get_researcher_id() -> Optional[str]:
+    """Return the id of the researcher the current code runs for, if any."""
+    return _current_researcher_id.get()
+
+def current_run_id() -> Any:
+    """Return the id of the LangChain run (node, tool) the current code runs in."""
+    config = var_child_runnable_config.get() or {}
+    return getattr(config.get("callbacks"), "parent_run_id", None)
+
+def current_parent_span(tracer: Tracer, run_id: Any = None) -> Optional[Span]:
+    """Return the innermost open span enclosing the current code.
+
+    This is the deeper of the innermost explicit span of this context and
+    the span of the enclosing LangChain run.
+    """
+    span = _current_span.get()
+    while span is not None and span.finished:
+        span = span.parent
+    run_span = tracer.span_for_run(run_id if run_id is not None else current_run_id())
+    candidates = [candidate for candidate in (span, run_span) if candidate is not None]
+    return max(candidates, key=lambda candidate: candidate.started, default=None)
+
+@contextmanager
+def tracing_scope(trace_id: Optional[str] = None) -> Iterator[Tracer]:
+    """Trace every node, model call, search and summary in the enclosed block.
+
+    Reuses the tracer of an enclosing scope, so nested scopes add to the same
+    trace.
+
+    Yields:
+        Tracer collecting the spans
+    """
+    tracer = _current_tracer.get()
+    if tracer is not None:
+        yield tracer
+        return
+
+    tracer = Tracer(trace_id)
+    tracer_token = _current_tracer.set(tracer)
+    handler_token = _current_handler.set(TracingCallbackHandler(tracer))
+    try:
+        yield tracer
+    finally:
+        _current_handler.reset(handler_token)
+        _current_tracer.reset(tracer_token)
+
+@contextmanager
+def trace_span(kind: str, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record the enclosed block as a span of the current trace.
+
+    Yields None when tracing is not active, so callers must check before
+    annotating the span directly (record_queue_wait and record_cache_lookup
+    do that for them).
+
+    Args:
+        kind: Span kind, e.g. "search" or "summarize"
+        name: Span name
+        **attributes: Extra attributes stored with the span
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+
+    span = tracer.start_span(
+        kind, name,
+        parent=current_parent_span(tracer),
+        researcher_id=_current_researcher_id.get(),
+        **attributes,
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.finish(e)
+        raise
+    finally:
+        span.finish()
+        _current_span.reset(token)
+
+@contextmanager
+def trace_researcher(research_topic: str) -> Iterator[Optional[Span]]:
+    """Record a researcher as a span and tag everything it runs with its id."""
+    tracer = _current_tracer.get()
+    researcher_id = tracer.next_researcher_id() if tracer else None
+    token = _current_researcher_id.set(researcher_id)
+    try:
+        with trace_span("researcher", "researcher", research_topic=research_topic) as span:
+            yield span
+    finally:
+        _current_researcher_id.reset(token)
+
+def record_queue_wait(seconds: float) -> None:
+    """Add time spent waiting for a slot or rate limiter to the current span."""
+    tracer = _current_tracer.get()
+    if tracer is None or seconds <= 0:
+        return
+    span = current_parent_span(tracer)
+    if span is not None:
+        span.queue_wait_seconds += seconds
+
+def record_cache_lookup(hit: bool) -> None:
+    """Mark the current search or summarize span as a cache hit or miss."""
+    span = _current_span.get()
+    if span is not None and not span.finished and span.kind in ("search", "summarize"):
+        span.cache_hit = hit
+
+def write_trace(tracer: Tracer, path: Path) -> tuple[Path, Path]:
+    """Write a run's JSON trace to path and its Prometheus metrics next to it (.prom)."""
+    path = Path(path)
+    return tracer.write_json(path), tracer.write_prometheus(path.with_suffix(".prom"))
@@ -1,17 +1,27 @@
+import os
+import re
+import asyncio
+import hashlib
+import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing_extensions import Annotated, List, Literal
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing_extensions import Annotated, Iterator, List, Literal, Optional
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, BaseMessage, filter_messages
-from prompts import summarize_webpage_prompt
+from prompts import summarize_webpage_prompt, merge_webpage_summaries_prompt
 from schema import Summary
-from tavily import TavilyClient
+from cache import SQLiteCache
+from run_context import get_url_registry
+from relevance import select_relevant_pages, select_relevant_passages
+from rate_limits import tavily_rate_limiter, arun_with_rate_limit
+from models import get_structured_model, get_search_client, model_name
+from tracing import record_cache_lookup, record_queue_wait, trace_span
+from ledger import record_search_cost, spend_cap_reached
 # from portkey import gateway
 
-from dotenv import load_dotenv
-load_dotenv()
-
 # ===== UTILITY FUNCTIONS =====
 
 def get_today_str() -> str:
@@ -31,86 +41,378 @@ def get_current_dir() -> Path:
     except NameError:  # __file__ is not defined
         return Path.cwd()
 
+def canonicalize_url(url: str) -> str:
+    """Canonicalize a URL so trivially different links to one page compare equal.
+
+    Unifies http and https, lowercases the host, drops fragments, tracking
+    query parameters and trailing slashes, and sorts the remaining parameters.
+
+    Args:
+        url: URL as returned by the search API
+
+    Returns:
+        Canonical form of the URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = "https" if parts.scheme.lower() in ("http", "https", "") else parts.scheme.lower()
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in tracking_query_params
+        and not key.lower().startswith(tracking_query_prefixes)
+    ))
+    path = parts.path.rstrip("/")
+    return urlunsplit((scheme, parts.netloc.lower(), path, query, ""))
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens in text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
 # ===== CONFIGURATION =====
 
-summarization_model = init_chat_model(model="gemini-1.5-flash", model_provider="google-genai")
-#summarization_model = init_chat_model(model="openai/gpt-oss-20b", model_provider="groq")
-# summarization_model = gateway
-tavily_client = TavilyClient()
+# Tavily rejects queries longer than this many characters
+max_query_length = 400
+# Separators used to break an over-long compound query into sub-queries
+query_separators = [' AND ', ' OR ', ', ', '; ', ' | ']
+# Maximum number of Tavily requests in flight for a single multi-query search
+max_concurrent_searches = 4
+# Maximum number of webpages summarized at the same time for one search
+max_concurrent_summaries = 4
+# Seconds to wait for a single webpage summary before falling back to truncation
+summarization_timeout = 60
+# Pages estimated above this many tokens are summarized in chunks (map-reduce)
+summary_chunk_threshold_tokens = 24000
+# Target size in tokens of each chunk of an oversized page
+summary_chunk_tokens = 8000
+
+# Query parameters that only track the visitor and never change page content
+tracking_query_params = {"gclid", "fbclid", "msclkid", "dclid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid", "_ga"}
+tracking_query_prefixes = ("utm_",)
+
+# Directory holding the on-disk caches (override with MARKET_RESEARCH_CACHE_DIR)
+cache_dir = Path(os.getenv("MARKET_RESEARCH_CACHE_DIR", get_current_dir() / ".cache"))
+# Version of the summarization prompt, so editing the prompt invalidates cached summaries
+summarize_prompt_version = hashlib.sha256(
+    (summarize_webpage_prompt + merge_webpage_summaries_prompt).encode("utf-8")
+).hexdigest()[:12]
+# Webpage summaries keyed by page content, prompt version and model (no expiry by default)
+summary_cache = SQLiteCache(cache_dir / "summaries.sqlite", max_entries=5000, ttl_seconds=None)
+# Search responses keyed by normalized query and search options
+search_cache = SQLiteCache(cache_dir / "searches.sqlite", max_entries=2000)
+# Seconds a cached search stays fresh, by Tavily topic
+search_cache_ttls = {
+    "general": 7 * 24 * 3600,
+    "news": 3600,
+    "finance": 3600,
+}
+# Set MARKET_RESEARCH_SEARCH_CACHE=0 to bypass the search cache for every call
+search_cache_enabled = os.getenv("MARKET_RESEARCH_SEARCH_CACHE", "1") != "0"
+
+@contextmanager
+def isolated_caches() -> Iterator[None]:
+    """Use empty summary and search caches in a temporary directory for the enclosed block.
+
+    Used by benchmarks and record/replay, whose runs must not depend on what
+    earlier runs left in the caches.
+    """
+    global summary_cache, search_cache
+    previous = summary_cache, search_cache
+    with tempfile.TemporaryDirectory(prefix="market-research-cache-") as temp_dir:
+        summary_cache = SQLiteCache(Path(temp_dir) / "summaries.sqlite")
+        search_cache = SQLiteCache(Path(temp_dir) / "searches.sqlite")
+        try:
+            yield
+        finally:
+            summary_cache.close()
+            search_cache.close()
+            summary_cache, search_cache = previous
+
+def cache_stats() -> dict:
+    """Return the hit/miss counters and sizes of the summary and search caches."""
+    return {"summaries": summary_cache.stats(), "searches": search_cache.stats()}
 
 # ===== SEARCH FUNCTIONS =====
 
-def tavily_search_multiple(
+def split_search_queries(search_queries: List[str]) -> List[str]:
+    """Break over-long compound queries into sub-queries Tavily will accept.
+
+    Queries within the length limit are kept as they are. Longer queries are
+    split on the first separator they contain, and any part that is still too
+    long is truncated to the limit.
+
+    Args:
+        search_queries: List of search queries to execute
+
+    Returns:
+        List of search queries, each within the Tavily length limit
+    """
+    split_queries = []
+    for query in search_queries:
+        parts = [query]
+        if len(query) > max_query_length:
+            for sep in query_separators:
+                if sep in query:
+                    parts = [part.strip() for part in query.split(sep) if part.strip()]
+                    break
+        split_queries.extend(part[:max_query_length] for part in parts)
+
+    return split_queries
+
+def normalize_search_query(query: str) -> str:
+    """Normalize a query so trivially different queries share a cache entry.
+
+    Lowercases the query, collapses whitespace and sorts site: filters, so
+    differences in case, spacing or filter order do not matter.
+    """
+    tokens = query.lower().split()
+    site_filters = sorted(token for token in tokens if token.startswith("site:"))
+    terms = [token for token in tokens if not token.startswith("site:")]
+    return " ".join(site_filters + terms)
+
+def search_cache_key(query: str, max_results: int, topic: str, include_raw_content: bool) -> str:
+    """Build the search cache key from the normalized query and search options."""
+    return SQLiteCache.make_key(
+        normalize_search_query(query), topic, max_results, include_raw_content
+    )
+
+async def atavily_search_multiple(
     search_queries: List[str], 
     max_results: int = 3, 
     topic: Literal["general", "news", "finance"] = "general", 
     include_raw_content: bool = True, 
+    use_cache: Optional[bool] = None,
 ) -> List[dict]:
-    """Perform search using Tavily API for multiple queries.
+    """Perform search using Tavily API for multiple queries concurrently.
+
+    Queries are sent through the AsyncTavilyClient with at most
+    max_concurrent_searches requests in flight, so the wall time is roughly
+    that of the slowest query rather than the sum of all of them. Queries
+    found in search_cache are answered without a request.
 
     Args:
         search_queries: List of search queries to execute
         max_results: Maximum number of results per query
         topic: Topic filter for search results
         include_raw_content: Whether to include raw webpage content
+        use_cache: Whether to read and write search_cache, defaults to search_cache_enabled
 
     Returns:
-        List of search result dictionaries
+        List of search result dictionaries, in the same order as the queries
     """
+    use_cache = search_cache_enabled if use_cache is None else use_cache
 
     # Handle query length limit (Tavily max is 400 characters)
-    
-    separators = [' AND ', ' OR ', ', ', '; ', ' | ']
-    for sep in separators:
-        if sep in search_queries:
-            search_queries = search_queries.split(sep)
-            break
-
-    # Execute searches sequentially. Note: yon can use AsyncTavilyClient to parallelize this step.
-    search_docs = []
-    for query in search_queries:
-        result = tavily_client.search(
-            query,
-            max_results=max_results,
-            include_raw_content=include_raw_content,
-            topic=topic
+    search_queries = split_search_queries(search_queries)
+
+    semaphore = asyncio.Semaphore(max_concurrent_searches)
+
+    async def search(query: str) -> dict:
+        with trace_span("search", "tavily_search", query=query, topic=topic):
+            cache_key = search_cache_key(query, max_results, topic, include_raw_content)
+            if use_cache:
+                cached_result = search_cache.get(cache_key)
+                record_cache_lookup(cached_result is not None)
+                if cached_result is not None:
+                    return cached_result
+
+            waiting_since = time.perf_counter()
+            async with semaphore:
+                record_queue_wait(time.perf_counter() - waiting_since)
+                # Shared limiter across researchers, retried with backoff on 429
+                result = await arun_with_rate_limit(tavily_rate_limiter, lambda: get_search_client().search(
+                    query,
+                    max_results=max_results,
+                    include_raw_content=include_raw_content,
+                    topic=topic
+                ))
+            record_search_cost()
+
+            if use_cache:
+                search_cache.set(cache_key, result, ttl_seconds=search_cache_ttls.get(topic))
+            return result
+
+    # gather preserves the order of the queries
+    return list(await asyncio.gather(*(search(query) for query in search_queries)))
+
+def format_summary(summary: Summary) -> str:
+    """Format a structured webpage summary for the researcher.
+
+    Args:
+        summary: Structured summary returned by the summarization model
+
+    Returns:
+        Formatted summary with key excerpts
+    """
+    return (
+        f"<summary>\n{summary.summary}\n</summary>\n\n"
+        f"<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
+    )
+
+def truncate_webpage_content(webpage_content: str) -> str:
+    """Fallback used when a webpage could not be summarized."""
+    return webpage_content[:1000] + "..." if len(webpage_content) > 1000 else webpage_content
+
+def build_summarization_messages(webpage_content: str) -> list[HumanMessage]:
+    """Build the prompt messages for summarizing a single webpage."""
+    return [
+        HumanMessage(content=summarize_webpage_prompt.format(
+            webpage_content=webpage_content, 
+            date=get_today_str()
+        ))
+    ]
+
+def split_webpage_content(webpage_content: str, chunk_tokens: int) -> List[str]:
+    """Split webpage content into chunks of roughly chunk_tokens tokens.
+
+    Chunks break on paragraph boundaries where possible; a single paragraph
+    longer than a chunk is cut into fixed-size pieces.
+
+    Args:
+        webpage_content: Raw webpage content to split
+        chunk_tokens: Target size of each chunk in estimated tokens
+
+    Returns:
+        List of consecutive chunks covering the whole content
+    """
+    chunk_chars = chunk_tokens * 4
+    chunks = []
+    current = ""
+
+    for paragraph in webpage_content.split("\n\n"):
+        pieces = [paragraph[i:i + chunk_chars] for i in range(0, len(paragraph), chunk_chars)] or [""]
+        for piece in pieces:
+            if current and estimate_tokens(current) + estimate_tokens(piece) > chunk_tokens:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+async def asummarize_in_chunks(webpage_content: str) -> Summary:
+    """Summarize an oversized webpage with a map-reduce over its chunks.
+
+    Chunks are summarized concurrently (at most max_concurrent_summaries at a
+    time) and the partial summaries are merged into one Summary by the
+    summarization model. Chunks that fail are skipped; if the merge fails, the
+    partial summaries are concatenated instead.
+
+    Args:
+        webpage_content: Raw webpage content to summarize
+
+    Returns:
+        Summary of the whole webpage
+    """
+    chunks = split_webpage_content(webpage_content, summary_chunk_tokens)
+    semaphore = asyncio.Semaphore(max_concurrent_summaries)
+
+    async def summarize_chunk(chunk: str) -> Optional[Summary]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    get_structured_model("summarizer", Summary).ainvoke(build_summarization_messages(chunk)),
+                    timeout=summarization_timeout,
+                )
+            except Exception as e:
+                print(f"Failed to summarize webpage chunk: {str(e) or type(e).__name__}")
+                return None
+
+    partial_summaries = [
+        summary for summary in await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+        if summary is not None
+    ]
+    if not partial_summaries:
+        raise RuntimeError("All chunks of the webpage failed to summarize")
+    if len(partial_summaries) == 1:
+        return partial_summaries[0]
+
+    section_summaries = "\n\n".join(
+        f"<section_{i}>\n{format_summary(summary)}\n</section_{i}>"
+        for i, summary in enumerate(partial_summaries, 1)
+    )
+    try:
+        return await asyncio.wait_for(
+            get_structured_model("summarizer", Summary).ainvoke([
+                HumanMessage(content=merge_webpage_summaries_prompt.format(
+                    section_summaries=section_summaries,
+                    date=get_today_str()
+                ))
+            ]),
+            timeout=summarization_timeout,
+        )
+    except Exception as e:
+        print(f"Failed to merge webpage summaries: {str(e) or type(e).__name__}")
+        return Summary(
+            summary="\n\n".join(summary.summary for summary in partial_summaries),
+            key_excerpts="\n".join(summary.key_excerpts for summary in partial_summaries),
         )
-        search_docs.append(result)
 
-    return search_docs
+def summary_cache_key(webpage_content: str) -> str:
+    """Build the summary cache key for a webpage.
+
+    The key covers a hash of the page content, the summarization prompt
+    version and the summarization model name.
+    """
+    content_hash = hashlib.sha256(webpage_content.encode("utf-8")).hexdigest()
+    return SQLiteCache.make_key(content_hash, summarize_prompt_version, model_name("summarizer"))
+
+async def asummarize_webpage_content(webpage_content: str, query: Optional[str] = None) -> str:
+    """Summarize webpage content asynchronously, bounded by summarization_timeout.
+
+    A page that fails or takes too long falls back to truncation, so it never
+    holds up the other pages of the same search. Cached summaries are returned
+    without calling the model, and fallbacks are never cached. With a query,
+    pages beyond relevance.max_relevant_words are first reduced to their
+    passages most relevant to it (see reduce_to_relevant_passages); the cache
+    is keyed by the text actually summarized, so pages within the budget share
+    one entry whatever query found them. Text larger than
+    summary_chunk_threshold_tokens is summarized in chunks (asummarize_in_chunks).
+    Once the run has reached a spend cap, pages are truncated instead.
 
-def summarize_webpage_content(webpage_content: str) -> str:
-    """Summarize webpage content using the configured summarization model.
-    
     Args:
         webpage_content: Raw webpage content to summarize
-        
+        query: Search query that found the page, used to reduce long pages
+
     Returns:
         Formatted summary with key excerpts
     """
+    content = reduce_to_relevant_passages(webpage_content, query)
+    cache_key = summary_cache_key(content)
+    cached_summary = summary_cache.get(cache_key)
+    record_cache_lookup(cached_summary is not None)
+    if cached_summary is not None:
+        return cached_summary
+    # Past the run's spend cap pages are no longer summarized, only truncated
+    if spend_cap_reached():
+        return truncate_webpage_content(content)
+
     try:
-        # Set up structured output model for summarization
-        structured_model = summarization_model.with_structured_output(Summary)
-        
-        # Generate summary
-        summary = structured_model.invoke([
-            HumanMessage(content=summarize_webpage_prompt.format(
-                webpage_content=webpage_content, 
-                date=get_today_str()
-            ))
-        ])
-        
-        # Format summary with clear structure
-        formatted_summary = (
-            f"<summary>\n{summary.summary}\n</summary>\n\n"
-            f"<key_excerpts>\n{summary.key_excerpts}\n</key_excerpts>"
-        )
-        
+        if estimate_tokens(content) > summary_chunk_threshold_tokens:
+            summary = await asummarize_in_chunks(content)
+        else:
+            summary = await asyncio.wait_for(
+                get_structured_model("summarizer", Summary).ainvoke(
+                    build_summarization_messages(content)
+                ),
+                timeout=summarization_timeout,
+            )
+        formatted_summary = format_summary(summary)
+        summary_cache.set(cache_key, formatted_summary)
         return formatted_summary
-        
+
     except Exception as e:
-        print(f"Failed to summarize webpage: {str(e)}")
-        return webpage_content[:1000] + "..." if len(webpage_content) > 1000 else webpage_content
+        print(f"Failed to summarize webpage: {str(e) or type(e).__name__}")
+        return truncate_webpage_content(content)
+
+def reduce_to_relevant_passages(webpage_content: str, query: Optional[str]) -> str:
+    """Return the text of a page to summarize for a query.
+
+    Pages beyond relevance.max_relevant_words are reduced to their passages
+    most relevant to the query; other pages, and any page without a query,
+    are returned unchanged.
+    """
+    return select_relevant_passages(query, webpage_content) if query else webpage_content
 
 def deduplicate_search_results(search_results: List[dict]) -> dict:
     """Deduplicate search results by URL to avoid processing duplicate content.
@@ -119,44 +421,122 @@ def deduplicate_search_results(search_results: List[dict]) -> dict:
         search_results: List of search result dictionaries
         
     Returns:
-        Dictionary mapping URLs to unique results
+        Dictionary mapping canonical URLs to unique results
     """
     unique_results = {}
     
     for response in search_results:
         for result in response['results']:
-            url = result['url']
+            url = canonicalize_url(result['url'])
             if url not in unique_results:
                 unique_results[url] = result
     
     return unique_results
 
-def process_search_results(unique_results: dict) -> dict:
+async def process_search_results(unique_results: dict, query: Optional[str] = None) -> dict:
     """Process search results by summarizing content where available.
+
+    When a query is given, pages unrelated to it are first dropped locally
+    with BM25 (relevance.select_relevant_pages). All remaining pages with raw
+    content are summarized concurrently, with at most
+    max_concurrent_summaries summarization calls in flight. Inside a research
+    run, pages already summarized by any researcher are served from the run's
+    URL registry instead of being summarized again. Long pages are reduced to
+    their passages relevant to the query before the lookups, and the registry
+    and summary cache are keyed by the text actually summarized: the canonical
+    URL for a page summarized whole, the URL plus a hash of the passages for a
+    reduced one (see asummarize_webpage_content).
     
     Args:
-        unique_results: Dictionary of unique search results
+        unique_results: Dictionary of unique search results keyed by canonical URL
+        query: Search query used to filter raw content before summarization
         
     Returns:
         Dictionary of processed results with summaries
     """
-    summarized_results = {}
-    
-    for url, result in unique_results.items():
+    if query:
+        raw_contents = {
+            url: result["raw_content"]
+            for url, result in unique_results.items() if result.get("raw_content")
+        }
+        relevant_pages = select_relevant_pages(query, raw_contents)
+        unique_results = {
+            url: result for url, result in unique_results.items()
+            if url not in raw_contents or url in relevant_pages
+        }
+
+    semaphore = asyncio.Semaphore(max_concurrent_summaries)
+    url_registry = get_url_registry()
+
+    async def summarize(url: str, content: str) -> str:
+        with trace_span("summarize", "summarize_webpage", url=url, characters=len(content)):
+            waiting_since = time.perf_counter()
+            async with semaphore:
+                record_queue_wait(time.perf_counter() - waiting_since)
+                # Already reduced to the passages relevant to the query
+                return await asummarize_webpage_content(content)
+
+    async def process(url: str, result: dict) -> str:
         # Use existing content if no raw content for summarization
         if not result.get("raw_content"):
-            content = result['content']
-        else:
-            # Summarize raw content for better processing
-            content = summarize_webpage_content(result['raw_content'])
-        
+            return result['content']
+        # Summarize raw content for better processing
+        content = reduce_to_relevant_passages(result['raw_content'], query)
+        if url_registry is None:
+            return await summarize(url, content)
+        registry_key = url
+        if content is not result['raw_content']:
+            registry_key = f"{url}#{hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]}"
+        return await url_registry.get_or_summarize(registry_key, lambda: summarize(url, content))
+
+    contents = await asyncio.gather(
+        *(process(url, result) for url, result in unique_results.items())
+    )
+
+    summarized_results = {}
+    
+    for (url, result), content in zip(unique_results.items(), contents):
         summarized_results[url] = {
             'title': result['title'],
+            'url': result['url'],
             'content': content
         }
     
     return summarized_results
 
+async def asearch_and_summarize(
+    search_queries: List[str],
+    relevance_query: Optional[str] = None,
+    max_results: int = 3,
+    topic: Literal["general", "news", "finance"] = "general",
+) -> dict:
+    """Search for queries, deduplicate the results and summarize the pages.
+
+    Shared by the search tools and the speculative prefetch (prefetch.py),
+    so both warm the same caches and URL registry.
+
+    Args:
+        search_queries: Search queries to execute concurrently
+        relevance_query: Query used to filter raw content before summarization
+        max_results: Maximum number of results per query
+        topic: Topic filter for search results
+
+    Returns:
+        Dictionary of summarized results keyed by canonical URL
+    """
+    search_results = await atavily_search_multiple(
+        search_queries,
+        max_results=max_results,
+        topic=topic,
+        include_raw_content=True,
+    )
+
+    # Deduplicate results by URL to avoid processing duplicate content
+    unique_results = deduplicate_search_results(search_results)
+
+    # Process results with relevance filtering and summarization
+    return await process_search_results(unique_results, query=relevance_query)
+
 def format_search_output(summarized_results: dict) -> str:
     """Format search results into a well-structured string output.
     
@@ -173,12 +553,46 @@ def format_search_output(summarized_results: dict) -> str:
     
     for i, (url, result) in enumerate(summarized_results.items(), 1):
         formatted_output += f"\n\n--- SOURCE {i}: {result['title']} ---\n"
-        formatted_output += f"URL: {url}\n\n"
+        # Show the URL as returned by the search; the canonical form is only a key
+        formatted_output += f"URL: {result.get('url', url)}\n\n"
         formatted_output += f"SUMMARY:\n{result['content']}\n\n"
         formatted_output += "-" * 80 + "\n"
     
     return formatted_output
 
+# --- Researcher Context Utils ---
+
+# Maximum characters of each source summary kept in the research digest
+digest_summary_chars = 600
+
+def digest_tool_output(tool_name: str, content: str) -> str:
+    """Condense a tool output into a short entry for the research digest.
+
+    Search outputs keep each source's title, URL and summary (without the key
+    excerpts); other tool outputs are truncated.
+
+    Args:
+        tool_name: Name of the tool that produced the output
+        content: Full content of the ToolMessage
+
+    Returns:
+        Condensed digest entry
+    """
+    sources = re.findall(
+        r"--- SOURCE \d+: (.*?) ---\nURL: (.*?)\n\nSUMMARY:\n(.*?)\n\n-{80}",
+        content,
+        flags=re.DOTALL,
+    )
+    if not sources:
+        return f"[{tool_name}] {content[:digest_summary_chars]}"
+
+    entries = []
+    for title, url, summary in sources:
+        match = re.search(r"<summary>\n?(.*?)\n?</summary>", summary, flags=re.DOTALL)
+        summary_text = (match.group(1) if match else summary).strip()
+        entries.append(f"- {title} ({url}): {summary_text[:digest_summary_chars]}")
+    return f"[{tool_name}]\n" + "\n".join(entries)
+
 # --- Supervisor Layer Utils ---
 
 def get_notes_from_tool_calls(messages: list[BaseMessage]) -> list[str]: